@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Batch Demodulator Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# Demodulates the same recording with blks2.ofdm_demod (a flow graph run as
+# fast as the scheduler goes) and with batch_demod (ofdm_batch.py), and
+# compares what each passes up: the packets both got right, the ones only one
+# of them got right, CRC failures, and samples per second (and how many times
+# faster than real time at --samp-rate). The recording is --count numbered
+# packets of each of --sizes made by batch_mod, with random idle gaps between
+# them, through the channel benchmark_ofdm.py simulates (--snr,
+# --frequency-offset, --multipath-on, ..., --numpy-channel for fading and the
+# rest of channel_emulator.py), or with --capture a recorded capture.
+#
+# python benchmark_batch_demod.py --sizes=100,400 --count=500 --snr=20
+# python benchmark_batch_demod.py --capture=field.dat
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr, blks2
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+
+import random
+import time
+
+import numpy
+
+# from current dir
+from benchmark_ofdm import make_channel, make_emulator, add_channel_options
+from transmit_path import transmit_path
+import ofdm_batch
+import ofdm_framing
+import iq_capture
+
+
+def make_recording(options, rng):
+    """
+    Numbered packets with idle gaps, through the simulated channel
+    """
+    mod = ofdm_batch.batch_mod(options, options.seed)
+    parts = []
+    pktno = 0
+    for size in [int(s) for s in options.sizes.split(",")]:
+        payloads = ofdm_framing.numbered_payloads(size, options.count, pktno)
+        pktno += options.count
+        for frames in mod.modulate(payloads):
+            for frame in frames:
+                gap = mod.symbol_len * rng.randint(options.min_gap, options.max_gap)
+                parts.append(numpy.zeros(gap, numpy.complex64))
+                parts.append(frame * options.tx_amplitude)
+    parts.append(numpy.zeros(mod.symbol_len * options.max_gap, numpy.complex64))
+    if options.numpy_channel:
+        return make_emulator(options).process(numpy.concatenate(parts))
+    tb = gr.top_block()
+    sink = gr.vector_sink_c()
+    tb.connect(gr.vector_source_c(numpy.concatenate(parts).tolist()), make_channel(options), sink)
+    tb.run()
+    return numpy.array(sink.data(), numpy.complex64)
+
+def flow_graph(options, samples):
+    """
+    @returns ([(ok, payload)], seconds) from blks2.ofdm_demod
+    """
+    packets = []
+    def callback(ok, payload):
+        packets.append((ok, payload))
+    tb = gr.top_block()
+    demod = blks2.ofdm_demod(options, callback=callback)
+    tb.connect(gr.vector_source_c(samples.tolist()), demod)
+    started = time.time()
+    tb.run()
+    # the callback runs from a thread of its own
+    while demod._rcvd_pktq.count() > 0:
+        time.sleep(.01)
+    elapsed = time.time() - started
+    return (packets, elapsed)
+
+def batch(options, samples):
+    """
+    @returns ([(ok, payload)], seconds) from batch_demod
+    """
+    demod = ofdm_batch.batch_demod(options)
+    started = time.time()
+    frames = demod.demodulate(samples)
+    elapsed = time.time() - started
+    return ([(ok, payload) for (start, ok, payload) in frames], elapsed)
+
+def main():
+    parser = OptionParser(option_class=eng_option, conflict_handler="resolve")
+    expert_grp = parser.add_option_group("Expert")
+    parser.add_option("", "--capture", type="string", default=None,
+                      help="demodulate this capture instead of a simulated one [default=%default]")
+    parser.add_option("", "--sizes", type="string", default="100,400",
+                      help="comma-separated payload sizes [default=%default]")
+    parser.add_option("", "--count", type="int", default=500,
+                      help="packets per size [default=%default]")
+    parser.add_option("", "--min-gap", type="int", default=2,
+                      help="shortest idle gap in OFDM symbols [default=%default]")
+    parser.add_option("", "--max-gap", type="int", default=50,
+                      help="longest idle gap in OFDM symbols [default=%default]")
+    parser.add_option("-r", "--samp-rate", type="eng_float", default=800e3,
+                      help="sample rate, for the real time factor [default=%default]")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    add_channel_options(parser)
+    transmit_path.add_options(parser, expert_grp)
+    blks2.ofdm_mod.add_options(parser, expert_grp)
+    blks2.ofdm_demod.add_options(parser, expert_grp)
+    (options, args) = parser.parse_args()
+
+    if options.capture is not None:
+        capture = iq_capture.iq_capture(options.capture)
+        samples = numpy.array(capture.samples())
+        if capture.samp_rate > 0:
+            options.samp_rate = capture.samp_rate
+    else:
+        samples = make_recording(options, random.Random(options.seed))
+
+    results = []
+    print "%-11s %8s %8s %10s %10s" % ("", "ok", "bad CRC", "(MS/s)", "real time")
+    for (name, demodulate) in (("ofdm_demod", flow_graph), ("batch_demod", batch)):
+        (packets, elapsed) = demodulate(options, samples)
+        ok = [payload for (good, payload) in packets if good]
+        print "%-11s %8d %8d %10.2f %9.1fx" % \
+              (name, len(ok), len(packets) - len(ok), 1e-6 * len(samples) / elapsed,
+               len(samples) / options.samp_rate / elapsed)
+        results.append(set(ok))
+    print
+    print "ok from both: %d, only ofdm_demod: %d, only batch_demod: %d" % \
+          (len(results[0] & results[1]), len(results[0] - results[1]), len(results[1] - results[0]))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Burst TX Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# Sends MAC-like traffic (a frame, then --gap seconds of silence) through the
+# transmit path, streaming as before and with --burst, into stand-ins for the
+# USRP sink that take the samples at the sample rate. Reports the CPU time the
+# process used (user + system) and the samples that reached the sink, and in
+# burst mode checks that every frame went out as one tx_sob..tx_eob burst
+# (burst_tx.burst_sink).
+#
+# python benchmark_burst_tx.py --frames=500 --gap=2m --size=100
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr, blks2
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+
+import copy
+import os
+import time
+
+# from current dir
+from transmit_path import transmit_path
+import burst_tx
+
+
+class tx_block(gr.top_block):
+    def __init__(self, options, burst):
+        gr.top_block.__init__(self)
+        options = copy.copy(options)
+        options.burst = burst
+        self.txpath = transmit_path(options)
+        if burst:
+            self.txpath.burst.record = True
+            self.sink = burst_tx.burst_sink(options.samp_rate, self.txpath.burst)
+            self.connect(self.txpath, self.sink)
+        else:
+            self.sink = None
+            self._q = gr.msg_queue()
+            self.connect(self.txpath, gr.throttle(gr.sizeof_gr_complex, options.samp_rate),
+                         gr.message_sink(gr.sizeof_gr_complex, self._q, False))
+
+    def samples(self):
+        if self.sink is not None:
+            return self.sink.samples
+        n = 0
+        while not self._q.empty_p():
+            msg = self._q.delete_head()
+            if msg.type() != 1:
+                n += msg.length() // gr.sizeof_gr_complex
+        return n
+
+def run(options, burst):
+    """
+    @returns (CPU seconds, wall seconds, samples at the sink, bursts or None)
+    """
+    tb = tx_block(options, burst)
+    tb.start()
+    payload = options.size * "k"
+    cpu = os.times()
+    started = time.time()
+    for i in range(options.frames):
+        tb.txpath.send_pkt(payload)
+        time.sleep(options.gap)
+    while tb.txpath.in_flight() > 0:
+        time.sleep(.01)
+    time.sleep(.1)                     # what's left between the tap and the sink
+    wall = time.time() - started
+    now = os.times()
+    cpu = (now[0] - cpu[0]) + (now[1] - cpu[1])
+    samples = tb.samples()
+    bursts = None
+    if burst:
+        bursts = tb.sink.check()
+    tb.txpath.send_pkt(eof=True)
+    tb.wait()
+    return (cpu, wall, samples, bursts)
+
+def main():
+    parser = OptionParser(option_class=eng_option, conflict_handler="resolve")
+    expert_grp = parser.add_option_group("Expert")
+    parser.add_option("", "--frames", type="int", default=500,
+                      help="frames to send per mode [default=%default]")
+    parser.add_option("", "--gap", type="eng_float", default=2e-3,
+                      help="seconds of silence after each frame [default=%default]")
+    parser.add_option("-s", "--size", type="int", default=100,
+                      help="payload bytes per frame [default=%default]")
+    parser.add_option("", "--samp-rate", type="eng_float", default=1e6,
+                      help="sample rate of the sink stand-in [default=%default]")
+    transmit_path.add_options(parser, expert_grp)
+    blks2.ofdm_mod.add_options(parser, expert_grp)
+    (options, args) = parser.parse_args()
+
+    print "%-11s %9s %9s %8s %10s %7s" % ("", "cpu", "wall", "cpu", "samples", "bursts")
+    print "%-11s %9s %9s %8s %10s %7s" % ("", "(s)", "(s)", "(%)", "", "")
+    for (name, burst) in (("continuous", False), ("burst", True)):
+        (cpu, wall, samples, bursts) = run(options, burst)
+        print "%-11s %9.3f %9.3f %7.1f%% %10d %7s" % \
+              (name, cpu, wall, 100 * cpu / wall, samples, bursts is None and "-" or bursts)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Carrier Sense Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# Compares the old carrier sense (the average power with alpha = 0.001, as
+# gr.probe_avg_mag_sqrd_c computes it) with the cca block (cca.py) on the
+# channel benchmark_ofdm.py simulates (--snr, --frequency-offset,
+# --multipath-on, ...). OFDM frames made by blks2.ofdm_mod are sent with
+# random idle gaps between them; both detectors' busy flags are recorded for
+# every sample and compared with where the frames really are:
+#   - detect: OFDM symbols from the start of a frame to the first busy sample
+#   - missed: frames never flagged busy
+#   - clear: symbols from the end of a frame until the flag drops again
+#   - false busy: idle samples flagged busy, leaving out the symbol right
+#     after each frame
+#
+# python benchmark_cca.py --snr=10 --frames=200 -c -20
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr, blks2
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+
+import random
+
+import numpy
+
+# from current dir
+from benchmark_ofdm import make_channel, make_emulator, add_channel_options
+from transmit_path import transmit_path
+from receive_path import receive_path
+from ctl_cache import ctl_cache
+import cca
+
+
+def make_stream(options, rng):
+    """
+    @returns (samples, [(start, end)] of the frames)
+    """
+    symbol_len = options.fft_length + options.cp_length
+    payloads = [chr(i & 0xff) * options.size for i in range(options.frames)]
+    modulated = ctl_cache(options).modulate(payloads)
+    parts = []
+    frames = []
+    pos = 0
+    for payload in payloads:
+        gap = symbol_len * rng.randint(options.min_gap, options.max_gap)
+        parts.append(numpy.zeros(gap, numpy.complex64))
+        frame = numpy.fromstring(modulated[payload], numpy.complex64) * options.tx_amplitude
+        parts.append(frame)
+        frames.append((pos + gap, pos + gap + len(frame)))
+        pos += gap + len(frame)
+    parts.append(numpy.zeros(symbol_len * options.max_gap, numpy.complex64))
+    return (numpy.concatenate(parts), frames)
+
+def run_detectors(options, samples):
+    """
+    @returns (old flags, cca flags), one per sample
+    """
+    tb = gr.top_block()
+    if options.numpy_channel:
+        # through the channel beforehand: numpy_channel's output only ends
+        # with an eof()
+        channel = gr.vector_source_c(make_emulator(options).process(samples).tolist())
+    else:
+        channel = make_channel(options)
+        tb.connect(gr.vector_source_c(samples.tolist()), channel)
+
+    threshold = 10 ** (options.carrier_threshold / 10.0)
+    old = gr.vector_sink_f()
+    tb.connect(channel, gr.complex_to_mag_squared(), gr.single_pole_iir_filter_ff(0.001),
+               gr.threshold_ff(threshold, threshold, 0), old)
+
+    new = gr.vector_sink_f()
+    tb.connect(channel, cca.cca(options.fft_length, options.cp_length, options.carrier_threshold,
+                                options.cca_corr_thresh, options.cca_window), new)
+    tb.run()
+    return (numpy.array(old.data()), numpy.array(new.data()))
+
+def score(flags, frames, symbol_len):
+    detect = []
+    clear = []
+    missed = 0
+    idle = numpy.ones(len(flags), numpy.bool_)
+    for (start, end) in frames:
+        idle[start:min(end + symbol_len, len(flags))] = False
+        busy = numpy.flatnonzero(flags[start:end] > 0)
+        if len(busy) == 0:
+            missed += 1
+        else:
+            detect.append(busy[0] / float(symbol_len))
+        after = numpy.flatnonzero(flags[end:] <= 0)
+        if len(after) > 0:
+            clear.append(after[0] / float(symbol_len))
+    false_busy = (flags[idle] > 0).sum() / float(max(1, idle.sum()))
+    return (detect, missed, clear, false_busy)
+
+def main():
+    parser = OptionParser(option_class=eng_option, conflict_handler="resolve")
+    expert_grp = parser.add_option_group("Expert")
+    parser.add_option("", "--frames", type="int", default=200,
+                      help="frames to send [default=%default]")
+    parser.add_option("-s", "--size", type="int", default=100,
+                      help="payload bytes per frame [default=%default]")
+    parser.add_option("", "--min-gap", type="int", default=2,
+                      help="shortest idle gap in OFDM symbols [default=%default]")
+    parser.add_option("", "--max-gap", type="int", default=50,
+                      help="longest idle gap in OFDM symbols [default=%default]")
+    parser.add_option("-c", "--carrier-threshold", type="eng_float", default=-20,
+                      help="energy threshold in dB for both detectors [default=%default]")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    add_channel_options(parser)
+    transmit_path.add_options(parser, expert_grp)
+    receive_path.add_options(parser, expert_grp)
+    blks2.ofdm_mod.add_options(parser, expert_grp)
+    (options, args) = parser.parse_args()
+
+    symbol_len = options.fft_length + options.cp_length
+    (samples, frames) = make_stream(options, random.Random(options.seed))
+    flags = run_detectors(options, samples)
+
+    print "%-6s %9s %9s %8s %9s %11s" % ("", "detect", "detect", "missed", "clear", "false busy")
+    print "%-6s %9s %9s %8s %9s %11s" % ("", "(avg sym)", "(99th)", "", "(avg sym)", "")
+    for (name, f) in zip(("probe", "cca"), flags):
+        (detect, missed, clear, false_busy) = score(f, frames, symbol_len)
+        detect.sort()
+        print "%-6s %9s %9s %7.1f%% %9s %10.2f%%" % \
+              (name, detect and "%.2f" % (sum(detect) / len(detect)) or "-",
+               detect and "%.2f" % detect[min(len(detect) - 1, int(.99 * len(detect)))] or "-",
+               100.0 * missed / len(frames),
+               clear and "%.2f" % (sum(clear) / len(clear)) or "-", 100 * false_busy)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
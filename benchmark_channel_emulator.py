@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Channel Emulator Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# How fast the numpy channel (channel_emulator.py) is, and whether it does
+# what it says. --samples of unit power noise in the middle half of the band
+# (a stand-in for OFDM's occupied carriers) go through each channel --block
+# samples at a time:
+#   - gr.channel_model: AWGN, frequency offset, clock ratio, fixed taps (the
+#     --multipath-on profile), in a flow graph run as fast as it goes
+#   - the same channel with channel_emulator
+#   - channel_emulator with Rayleigh and Rician (--rician-k) fading of those
+#     taps at --doppler, and --phase-noise and --clock-drift on top
+# For each: samples per second, how many times faster than real time at
+# --samp-rate, output power over the input's (the taps add 1.3 dB, noise at
+# --snr a little more) and, for the numpy channel, whether the output is the
+# same when the input comes in blocks of --block / 7 instead.
+#
+# python benchmark_channel_emulator.py --samples=4M --doppler=1e-4 --rician-k=6
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+
+import math
+import time
+
+import numpy
+
+# from current dir
+from channel_emulator import channel_emulator
+
+
+TAPS = [1.0, .2, 0.0, .1, .08, -.4, .12, -.2, 0, 0, 0, .3]
+
+def flow_graph(x, noise_voltage, frequency_offset, clock_ratio):
+    """
+    @returns (samples, seconds) through gr.channel_model
+    """
+    tb = gr.top_block()
+    sink = gr.vector_sink_c()
+    tb.connect(gr.vector_source_c(x.tolist()),
+               gr.channel_model(noise_voltage, frequency_offset, clock_ratio, TAPS), sink)
+    started = time.time()
+    tb.run()
+    elapsed = time.time() - started
+    return (numpy.array(sink.data(), numpy.complex64), elapsed)
+
+def run(x, block, **params):
+    """
+    @returns (samples, seconds) through a channel_emulator
+    """
+    channel = channel_emulator(**params)
+    started = time.time()
+    y = [channel.process(x[i:i + block]) for i in range(0, len(x), block)]
+    elapsed = time.time() - started
+    return (numpy.concatenate(y), elapsed)
+
+def main():
+    parser = OptionParser(option_class=eng_option)
+    parser.add_option("", "--samples", type="eng_float", default=4e6,
+                      help="samples through each channel [default=%default]")
+    parser.add_option("", "--block", type="eng_float", default=65536,
+                      help="samples per call [default=%default]")
+    parser.add_option("-r", "--samp-rate", type="eng_float", default=800e3,
+                      help="sample rate, for the real time factor [default=%default]")
+    parser.add_option("", "--snr", type="eng_float", default=20,
+                      help="SNR of the noise (dB) [default=%default]")
+    parser.add_option("", "--frequency-offset", type="eng_float", default=1e-3,
+                      help="frequency offset, cycles per sample [default=%default]")
+    parser.add_option("", "--clockrate-ratio", type="eng_float", default=1.0001,
+                      help="input samples per output sample [default=%default]")
+    parser.add_option("", "--doppler", type="eng_float", default=1e-4,
+                      help="largest Doppler shift, cycles per sample [default=%default]")
+    parser.add_option("", "--rician-k", type="eng_float", default=6.0,
+                      help="K factor of the direct path (dB) [default=%default]")
+    parser.add_option("", "--phase-noise", type="eng_float", default=1e-3,
+                      help="phase noise, rad per sample [default=%default]")
+    parser.add_option("", "--clock-drift", type="eng_float", default=1e-12,
+                      help="change of the clock ratio per sample [default=%default]")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    (options, args) = parser.parse_args()
+
+    n = int(options.samples)
+    block = int(options.block)
+    rs = numpy.random.RandomState(options.seed)
+    X = numpy.fft.fft(rs.randn(n) + 1j * rs.randn(n))
+    X[n // 4:n - n // 4] = 0
+    x = numpy.fft.ifft(X)
+    x = (x / numpy.sqrt((abs(x) ** 2).mean())).astype(numpy.complex64)
+    noise_voltage = math.sqrt(10 ** (-options.snr / 10.0) / 2)
+    static = dict(noise_voltage=noise_voltage, frequency_offset=options.frequency_offset,
+                  clock_ratio=options.clockrate_ratio, taps=TAPS, seed=options.seed)
+    rayleigh = dict(static, fading="rayleigh", doppler=options.doppler)
+    rician = dict(rayleigh, fading="rician", k_factor=options.rician_k,
+                  phase_noise=options.phase_noise, clock_drift=options.clock_drift)
+
+    print "%-18s %10s %10s %10s %6s" % ("", "(MS/s)", "real time", "power", "same")
+    print "%-18s %10s %10s %10s %6s" % ("", "", "", "(dB)", "")
+    (y, elapsed) = flow_graph(x, noise_voltage, options.frequency_offset, options.clockrate_ratio)
+    print "%-18s %10.2f %9.1fx %10.2f %6s" % \
+          ("gr.channel_model", 1e-6 * n / elapsed, n / options.samp_rate / elapsed,
+           10 * math.log10((abs(y) ** 2).mean()), "")
+    for (name, params) in (("numpy, fixed taps", static), ("numpy, rayleigh", rayleigh),
+                           ("numpy, rician", rician)):
+        (y, elapsed) = run(x, block, **params)
+        (z, _) = run(x, max(1, block // 7), **params)
+        m = min(len(y), len(z))
+        print "%-18s %10.2f %9.1fx %10.2f %6s" % \
+              (name, 1e-6 * n / elapsed, n / options.samp_rate / elapsed,
+               10 * math.log10((abs(y) ** 2).mean()), abs(y[:m] - z[:m]).max() < 1e-4)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Mode Switch Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# Measures the cost of the sense <-> TX/RX switches done every quiet period,
+# using mock_uhd devices so no hardware is needed. The "direct" run issues the
+# same calls qpcsmaca_mac used to make; the "cached" run goes through
+# radio_state; the "concurrent" run senses alongside the receiver the way
+# --concurrent-sense does. The receive outage per quiet period is reported for
+# each. Every sense <-> TX/RX switch changes the sample rate, so the cache has
+# next to nothing to skip and "cached" takes as long as "direct"; the saving
+# is from not switching at all ("concurrent").
+#
+# python benchmark_mode_switch.py --rate-latency=.004 --tune-latency=.001
+# /////////////////////////////////////////////////////////////////////////////
+
+from optparse import OptionParser
+import time
+
+import mock_uhd
+from radio_state import radio_state
+
+
+class _flush_queue(object):
+    """
+    Stands in for sense_path.msgq
+    """
+    def flush(self):
+        pass
+
+
+def _make_devices(options):
+    u_src = mock_uhd.usrp_source(rate_latency=options.rate_latency,
+                                 tune_latency=options.tune_latency)
+    u_snk = mock_uhd.usrp_sink(rate_latency=options.rate_latency,
+                               tune_latency=options.tune_latency)
+    u_src.set_samp_rate(options.samp_rate)
+    u_snk.set_samp_rate(options.samp_rate)
+    u_src.set_center_freq(options.freq)
+    u_snk.set_center_freq(options.freq)
+    u_src.reset_calls()
+    u_snk.reset_calls()
+    return (u_src, u_snk, mock_uhd.valve(), mock_uhd.valve())
+
+def run_direct(options):
+    """
+    The calls prep_to_sense/prep_to_txrx made before radio_state
+    """
+    (u_src, u_snk, rx_valve, sense_valve) = _make_devices(options)
+    msgq = _flush_queue()
+    times = []
+    outage = 0.0
+    for i in range(options.quiet_periods):
+        start = time.time()
+        rx_valve.set_enabled(False)
+        closed_at = time.time()
+        u_src.set_samp_rate(options.channel_rate)
+        u_snk.set_samp_rate(options.channel_rate)
+        msgq.flush()
+        sense_valve.set_enabled(True)
+        times.append(time.time() - start)
+        time.sleep(options.dwell)
+
+        start = time.time()
+        sense_valve.set_enabled(False)
+        u_src.set_samp_rate(options.samp_rate)
+        u_snk.set_samp_rate(options.samp_rate)
+        rx_valve.set_enabled(True)
+        outage += time.time() - closed_at
+        times.append(time.time() - start)
+    calls = u_src.num_calls() + u_snk.num_calls() + rx_valve.calls + sense_valve.calls
+    return (times, calls, outage)
+
+def run_cached(options):
+    (u_src, u_snk, rx_valve, sense_valve) = _make_devices(options)
+    radio = radio_state(u_src, u_snk, rx_valve, sense_valve,
+                        samp_rate=options.samp_rate, center_freq=options.freq)
+    radio.set_valves(rx_enabled=True, sense_enabled=False)
+    rx_valve.calls = 0
+    sense_valve.calls = 0
+    msgq = _flush_queue()
+    times = []
+    for i in range(options.quiet_periods):
+        times.append(radio.switch_mode("sense", options.channel_rate, rx_enabled=False,
+                                       sense_enabled=True, flush=msgq))
+        time.sleep(options.dwell)
+        times.append(radio.switch_mode("txrx", options.samp_rate, rx_enabled=True,
+                                       sense_enabled=False))
+    calls = u_src.num_calls() + u_snk.num_calls() + rx_valve.calls + sense_valve.calls
+    return (times, calls, radio.rx_outage_time())
+
+def run_concurrent(options):
+    """
+    In-channel sensing with --concurrent-sense: the receiver is never cut off
+    """
+    (u_src, u_snk, rx_valve, sense_valve) = _make_devices(options)
+    radio = radio_state(u_src, u_snk, rx_valve, sense_valve,
+                        samp_rate=options.samp_rate, center_freq=options.freq)
+    radio.set_valves(rx_enabled=True, sense_enabled=False)
+    rx_valve.calls = 0
+    sense_valve.calls = 0
+    msgq = _flush_queue()
+    times = []
+    for i in range(options.quiet_periods):
+        times.append(radio.switch_mode("sense", options.samp_rate, rx_enabled=True,
+                                       sense_enabled=True, flush=msgq))
+        time.sleep(options.dwell)
+        times.append(radio.switch_mode("txrx", options.samp_rate, rx_enabled=True,
+                                       sense_enabled=False))
+    calls = u_src.num_calls() + u_snk.num_calls() + rx_valve.calls + sense_valve.calls
+    return (times, calls, radio.rx_outage_time())
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--quiet-periods", type="int", default=200,
+                      help="number of quiet periods to simulate [default=%default]")
+    parser.add_option("-r", "--samp-rate", type="int", default=800000,
+                      help="TX/RX sample rate [default=%default]")
+    parser.add_option("", "--channel-rate", type="int", default=4000000,
+                      help="sense sample rate [default=%default]")
+    parser.add_option("-f", "--freq", type="float", default=620e6,
+                      help="center frequency [default=%default]")
+    parser.add_option("", "--rate-latency", type="float", default=.004,
+                      help="time a mock set_samp_rate call takes [default=%default]")
+    parser.add_option("", "--tune-latency", type="float", default=.001,
+                      help="time a mock set_center_freq call takes [default=%default]")
+    parser.add_option("", "--dwell", type="float", default=.03,
+                      help="time spent sensing in each quiet period [default=%default]")
+    (options, args) = parser.parse_args()
+
+    for (name, run) in (("direct", run_direct), ("cached", run_cached),
+                        ("concurrent", run_concurrent)):
+        (times, calls, outage) = run(options)
+        print "%-10s switches: %5d  radio calls: %6d  avg: %7.3f ms  max: %7.3f ms  " \
+              "rx outage/qp: %7.3f ms" % \
+              (name, len(times), calls, 1e3*sum(times)/len(times), 1e3*max(times),
+               1e3*outage/options.quiet_periods)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
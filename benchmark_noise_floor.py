@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Noise Floor Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# How well the noise floor (noise_floor.py, --auto-threshold) is estimated
+# from the block powers receive_path hands it, for channels that are busy some
+# fraction of the time. The blocks are averages of --block samples of noise,
+# or of noise plus a frame --snr dB above it; frames cover --occupancy of the
+# blocks, in bursts. Halfway through the noise floor steps by --step dB (a gain
+# change nobody told the receive path about). Compared are the floor taken as
+#   - mean: the average block power
+#   - median: the 50th percentile
+#   - pNN: the --percentile percentile (what --auto-threshold uses)
+# of the same history:
+#   - error: estimate - true floor before the step (dB), mean and worst
+#   - adapt: blocks after the step until the estimate is within 1 dB of the
+#     new floor and stays there
+#
+# python benchmark_noise_floor.py --occupancy=0.1,0.3,0.6 --step=10
+# /////////////////////////////////////////////////////////////////////////////
+
+from optparse import OptionParser
+import math
+
+import numpy
+
+# from current dir
+from noise_floor import noise_floor
+
+
+class mean_floor(noise_floor):
+    """
+    The average of the history instead of a percentile
+    """
+    def add(self, powers):
+        self._lock.acquire()
+        history = len(self._blocks)
+        powers = numpy.asarray(powers)[-history:]
+        i = self._count % history
+        n = len(powers)
+        first = min(n, history - i)
+        self._blocks[i:i + first] = powers[:first]
+        self._blocks[:n - first] = powers[first:]
+        self._count += n
+        self._pending += n
+        if self._count >= self.min_blocks and self._pending >= self.update_every:
+            self._pending = 0
+            level = self._blocks[:min(self._count, history)].mean()
+            self._floor = 10 * math.log10(max(level, 1e-30))
+        self._lock.release()
+
+
+def make_blocks(options, occupancy, rs):
+    """
+    @returns (block powers, true floor in dB for each block)
+    """
+    n = options.blocks
+    floor_db = numpy.zeros(n)
+    floor_db[n // 2:] = options.step
+    busy = numpy.zeros(n, numpy.bool_)
+    # bursts of frames, as long on average as --burst blocks
+    pos = 0
+    while pos < n:
+        length = 1 + rs.geometric(1.0 / options.burst)
+        if rs.uniform() < occupancy:
+            busy[pos:pos + length] = True
+        pos += length
+    noise = 10 ** (floor_db / 10.0)
+    # average of options.block exponential samples
+    power = noise * rs.gamma(options.block, 1.0 / options.block, n)
+    power[busy] += noise[busy] * 10 ** (options.snr / 10.0)
+    return (power, floor_db)
+
+def run(estimator, power, floor_db, chunk):
+    estimates = numpy.empty(len(power))
+    estimates.fill(numpy.nan)
+    for i in range(0, len(power), chunk):
+        estimator.add(power[i:i + chunk])
+        if estimator.floor() is not None:
+            estimates[i:i + chunk] = estimator.floor()
+    half = len(power) // 2
+    before = estimates[:half] - floor_db[:half]
+    before = before[~numpy.isnan(before)]
+    after = numpy.abs(estimates[half:] - floor_db[half:]) >= 1.0
+    bad = numpy.flatnonzero(after)
+    if len(bad) == 0:
+        adapt = 0
+    elif bad[-1] == len(after) - 1:
+        adapt = None
+    else:
+        adapt = bad[-1] + 1
+    return (before.mean(), before[numpy.argmax(numpy.abs(before))], adapt)
+
+def main():
+    parser = OptionParser()
+    parser.add_option("", "--blocks", type="int", default=40000,
+                      help="block powers to simulate [default=%default]")
+    parser.add_option("", "--block", type="int", default=128,
+                      help="samples averaged per block [default=%default]")
+    parser.add_option("", "--occupancy", type="string", default="0.1,0.3,0.6,0.85",
+                      help="comma separated fractions of blocks with a frame [default=%default]")
+    parser.add_option("", "--burst", type="float", default=20,
+                      help="average length of a run of busy or idle blocks [default=%default]")
+    parser.add_option("", "--snr", type="float", default=15,
+                      help="frame power over the noise (dB) [default=%default]")
+    parser.add_option("", "--step", type="float", default=10,
+                      help="noise floor change halfway through (dB) [default=%default]")
+    parser.add_option("", "--percentile", type="float", default=10,
+                      help="percentile the floor is taken at [default=%default]")
+    parser.add_option("", "--history", type="int", default=4096,
+                      help="blocks the floor is estimated over [default=%default]")
+    parser.add_option("", "--chunk", type="int", default=32,
+                      help="blocks handed over at once [default=%default]")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    (options, args) = parser.parse_args()
+
+    name = "p%g" % options.percentile
+    print "%-10s %-8s %10s %10s %12s" % ("occupancy", "floor", "error", "worst", "adapt")
+    print "%-10s %-8s %10s %10s %12s" % ("", "", "(dB)", "(dB)", "(blocks)")
+    for occupancy in [float(o) for o in options.occupancy.split(",")]:
+        (power, floor_db) = make_blocks(options, occupancy, numpy.random.RandomState(options.seed))
+        for (label, estimator) in (("mean", mean_floor(history=options.history)),
+                                   ("median", noise_floor(history=options.history, percentile=50)),
+                                   (name, noise_floor(history=options.history,
+                                                      percentile=options.percentile))):
+            (error, worst, adapt) = run(estimator, power, floor_db, options.chunk)
+            print "%-10s %-8s %10.2f %10.2f %12s" % \
+                  (occupancy, label, error, worst, adapt is None and "never" or adapt)
+        print
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -30,32 +30,93 @@ import random, time, struct, sys, math, os
 # from current dir
 from transmit_path import transmit_path
 from receive_path import receive_path
+from channel_emulator import channel_emulator, numpy_channel
+import ofdm_framing
+
+
+def channel_params(options):
+    """
+    @returns (noise voltage, frequency offset, taps) of the simulated channel
+    """
+    if options.channel_off:
+        return (0.0, 0.0, [1.0, 0.0])
+    SNR = 10.0**(options.snr/10.0)
+    power_in_signal = abs(options.tx_amplitude)**2.0
+    noise_power_in_channel = power_in_signal/SNR
+    noise_voltage = math.sqrt(noise_power_in_channel/2.0)
+    frequency_offset = options.frequency_offset / options.fft_length
+    if options.multipath_on:
+        taps = [1.0, .2, 0.0, .1, .08, -.4, .12, -.2, 0, 0, 0, .3]
+    else:
+        taps = [1.0, 0.0]
+    return (noise_voltage, frequency_offset, taps)
+
+def make_emulator(options):
+    """
+    The simulated channel as a channel_emulator, with --fading, --doppler,
+    --rician-k, --phase-noise and --clock-drift as well
+    """
+    (noise_voltage, frequency_offset, taps) = channel_params(options)
+    if options.channel_off:
+        return channel_emulator(taps=taps)
+    fading = None
+    if options.fading != "none":
+        fading = options.fading
+    return channel_emulator(noise_voltage, frequency_offset, options.clockrate_ratio, taps,
+                            fading, options.doppler, options.rician_k, options.phase_noise,
+                            options.clock_drift, options.channel_seed)
+
+def make_channel(options):
+    """
+    The simulated channel: AWGN for --snr, --frequency-offset, --clockrate-ratio
+    and, with --multipath-on, a multipath profile (none of it with --channel-off).
+    gr.channel_model, or with --numpy-channel a channel_emulator
+    """
+    (noise_voltage, frequency_offset, taps) = channel_params(options)
+    if not options.channel_off:
+        print "Noise voltage: ", noise_voltage
+        print "Frequency offset: ", frequency_offset
+
+    if options.numpy_channel:
+        return numpy_channel(make_emulator(options))
+    return gr.channel_model(noise_voltage, frequency_offset, options.clockrate_ratio, taps)
+
+
+def add_channel_options(parser):
+    """
+    Adds the simulated channel's options to the Options Parser
+    """
+    parser.add_option("", "--snr", type="eng_float", default=30,
+                      help="set the SNR of the channel in dB [default=%default]")
+    parser.add_option("", "--frequency-offset", type="eng_float", default=0,
+                      help="set frequency offset introduced by channel [default=%default]")
+    parser.add_option("", "--clockrate-ratio", type="eng_float", default=1.0,
+                      help="set clock rate ratio (sample rate difference) between two systems [default=%default]")
+    parser.add_option("","--channel-off", action="store_true", default=False,
+                      help="Turns AWGN, freq offset channel off")
+    parser.add_option("","--multipath-on", action="store_true", default=False,
+                      help="enable multipath")
+    parser.add_option("", "--numpy-channel", action="store_true", default=False,
+                      help="simulate the channel with channel_emulator instead of gr.channel_model [default=%default]")
+    parser.add_option("", "--fading", type="choice", choices=["none", "rayleigh", "rician"],
+                      default="none",
+                      help="fade the taps: none, rayleigh or rician (--numpy-channel) [default=%default]")
+    parser.add_option("", "--doppler", type="eng_float", default=1e-4,
+                      help="largest Doppler shift of the fading, cycles per sample [default=%default]")
+    parser.add_option("", "--rician-k", type="eng_float", default=6.0,
+                      help="K factor of the direct path with --fading=rician (dB) [default=%default]")
+    parser.add_option("", "--phase-noise", type="eng_float", default=0,
+                      help="phase noise, rad per sample (--numpy-channel) [default=%default]")
+    parser.add_option("", "--clock-drift", type="eng_float", default=0,
+                      help="change of --clockrate-ratio per sample (--numpy-channel) [default=%default]")
+    parser.add_option("", "--channel-seed", type="int", default=None,
+                      help="random seed of the numpy channel [default=%default]")
 
 
 class my_top_block(gr.top_block):
     def __init__(self, callback, options):
         gr.top_block.__init__(self)
 
-        if not options.channel_off:
-            SNR = 10.0**(options.snr/10.0)
-            power_in_signal = abs(options.tx_amplitude)**2.0
-            noise_power_in_channel = power_in_signal/SNR
-            noise_voltage = math.sqrt(noise_power_in_channel/2.0)
-            print "Noise voltage: ", noise_voltage
-
-            frequency_offset = options.frequency_offset / options.fft_length
-            print "Frequency offset: ", frequency_offset
-
-            if options.multipath_on:
-                taps = [1.0, .2, 0.0, .1, .08, -.4, .12, -.2, 0, 0, 0, .3]
-            else:
-                taps = [1.0, 0.0]
-
-        else:
-            noise_voltage = 0.0
-            frequency_offset = 0.0
-            taps = [1.0, 0.0]
-
         symbols_per_packet = math.ceil(((4+options.size+4) * 8) / options.occupied_tones)
         samples_per_packet = (symbols_per_packet+2) * (options.fft_length+options.cp_length)
         print "Symbols per Packet: ", symbols_per_packet
@@ -71,8 +132,7 @@ class my_top_block(gr.top_block):
 
         #self.mux = gr.stream_mux(gr.sizeof_gr_complex, stream_size)
         self.throttle = gr.throttle(gr.sizeof_gr_complex, options.sample_rate)
-        self.channel = gr.channel_model(noise_voltage, frequency_offset,
-                                        options.clockrate_ratio, taps)
+        self.channel = make_channel(options)
         self.rxpath = receive_path(callback, options)
                 
         #self.connect(self.zeros, (self.mux,0))
@@ -81,10 +141,8 @@ class my_top_block(gr.top_block):
         #self.connect(self.mux, self.throttle, self.rxpath)
         self.connect(self.txpath, self.throttle, self.channel, self.rxpath)
         
-        if options.log:
-            self.connect(self.txpath, gr.file_sink(gr.sizeof_gr_complex, "txpath.dat"))
-            #self.connect(self.mux, gr.file_sink(gr.sizeof_gr_complex, "mux.dat"))
-            #self.connect(self.channel, gr.file_sink(gr.sizeof_gr_complex, "channel.dat"))
+        # with --log the transmit and receive paths record what they send and
+        # get (iq_recorder.py)
             
 # /////////////////////////////////////////////////////////////////////////////
 #                                   main
@@ -99,13 +157,15 @@ def main():
     def send_pkt(payload='', eof=False):
         return tb.txpath.send_pkt(payload, eof)
         
-    def rx_callback(ok, payload):
+    def rx_callback(ok, payload, meta=None):
         global n_rcvd, n_right
         n_rcvd += 1
         (pktno,) = struct.unpack('!H', payload[0:2])
         if ok:
             n_right += 1
         print "ok: %r \t pktno: %d \t n_rcvd: %d \t n_right: %d" % (ok, pktno, n_rcvd, n_right)
+        if meta is not None:        # --rx-metadata
+            print "\t", meta
 
         printlst = list()
         for x in payload[2:]:
@@ -126,18 +186,9 @@ def main():
                       help="set megabytes to transmit [default=%default]")
     parser.add_option("-r", "--sample-rate", type="eng_float", default=1e5,
                       help="limit sample rate to RATE in throttle (%default)") 
-    parser.add_option("", "--snr", type="eng_float", default=30,
-                      help="set the SNR of the channel in dB [default=%default]")
-    parser.add_option("", "--frequency-offset", type="eng_float", default=0,
-                      help="set frequency offset introduced by channel [default=%default]")
-    parser.add_option("", "--clockrate-ratio", type="eng_float", default=1.0,
-                      help="set clock rate ratio (sample rate difference) between two systems [default=%default]")
     parser.add_option("","--discontinuous", type="int", default=0,
                       help="enable discontinous transmission, burst of N packets [Default is continuous]")
-    parser.add_option("","--channel-off", action="store_true", default=False,
-                      help="Turns AWGN, freq offset channel off")
-    parser.add_option("","--multipath-on", action="store_true", default=False,
-                      help="enable multipath")
+    add_channel_options(parser)
 
     transmit_path.add_options(parser, expert_grp)
     receive_path.add_options(parser, expert_grp)
@@ -145,6 +196,7 @@ def main():
     blks2.ofdm_demod.add_options(parser, expert_grp)
     
     (options, args) = parser.parse_args ()
+    options.samp_rate = options.sample_rate    # what the paths call it
        
     # build the graph
     tb = my_top_block(rx_callback, options)
@@ -157,24 +209,16 @@ def main():
     
     # generate and send packets
     nbytes = int(1e6 * options.megabytes)
-    n = 0
-    pktno = 0
     pkt_size = int(options.size)
 
-    while n < nbytes:
-        #r = ''.join([chr(random.randint(0,255)) for i in range(pkt_size-2)])
-        #pkt_contents = struct.pack('!H', pktno) + r
-
-        pkt_contents = struct.pack('!H', pktno) + (pkt_size - 2) * chr(pktno & 0xff)
+    #r = ''.join([chr(random.randint(0,255)) for i in range(pkt_size-2)])
+    #pkt_contents = struct.pack('!H', pktno) + r
 
-        send_pkt(pkt_contents)
-        n += pkt_size
-        #sys.stderr.write('.')
-        #if options.discontinuous and pktno % 5 == 4:
-        #    time.sleep(1)
-        pktno += 1
-        
-    send_pkt(eof=True)
+    # all the packets at once, framed in bulk
+    count = (nbytes + pkt_size - 1) // pkt_size
+    tb.txpath.send_pkts(ofdm_framing.numbered_payloads(pkt_size, count), eof=True)
+    if options.numpy_channel:
+        tb.channel.eof()            # its output ends only when told to
     tb.wait()                       # wait for it to finish
 
 
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Batch Modulator Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# Checks the batch modulator (ofdm_batch.py) against blks2.ofdm_mod and
+# compares how many samples per second each makes. The same numbered payloads
+# (what the benchmark scripts send) go through a flow graph with ofdm_mod and a
+# vector sink, as fast as the scheduler runs it, and through batch_mod. The
+# flow graph gets them from ofdm_mod's own send_pkt (make_packet), not from
+# ofdm_framing, so the framing is checked too. For every packet it compares
+#   - samples: the largest difference between the two, over every symbol
+#     except the last (ofdm_mod fills the end of that one with random points)
+#   - bits: the points on the data carriers of the last symbol that carry
+#     data; they have to be the same constellation points
+#
+# python benchmark_ofdm_batch.py --sizes=16,100,400,1500 --count=2000
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr, blks2
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+
+import math
+import time
+
+import numpy
+
+# from current dir
+import ofdm_batch
+import ofdm_framing
+import ofdm_solver
+
+
+def flow_graph(options, rows):
+    """
+    @returns (samples, seconds) of ofdm_mod modulating rows
+    """
+    tb = gr.top_block()
+    mod = blks2.ofdm_mod(options, msgq_limit=len(rows) + 1, pad_for_usrp=False)
+    sink = gr.vector_sink_c()
+    tb.connect(mod, sink)
+    for payload in rows:
+        mod.send_pkt(payload.tostring())
+    mod.send_pkt(eof=True)
+    started = time.time()
+    tb.run()
+    elapsed = time.time() - started
+    return (numpy.array(sink.data(), numpy.complex64), elapsed)
+
+def batch(mod, rows):
+    """
+    @returns (samples, seconds) of batch_mod modulating rows
+    """
+    started = time.time()
+    frames = [f for f in mod.modulate(rows)]
+    elapsed = time.time() - started
+    return (numpy.vstack(frames), elapsed)
+
+def compare(mod, size, reference, frames):
+    """
+    @returns (largest sample difference, data points that differ)
+    """
+    n = len(frames)
+    symbols = reference.reshape(n, -1, mod.symbol_len)
+    ours = frames.reshape(n, -1, mod.symbol_len)
+    error = abs(symbols[:, :-1] - ours[:, :-1]).max()
+    # data points on the last symbol
+    ncarriers = len(mod.carriers)
+    nvalues = 8 * (size + ofdm_solver.FRAMING_BYTES) // mod.bits
+    used = mod.carriers[:nvalues - (ours.shape[1] - 2) * ncarriers]
+    points = []
+    for s in (symbols, ours):
+        x = s[:, -1, mod.cp_length:]
+        bins = numpy.fft.fftshift(numpy.fft.fft(x, axis=1), axes=(1,)) / math.sqrt(mod.fft_length)
+        # nearest constellation point
+        d = abs(bins[:, used, None] - mod.constellation[None, None, :])
+        points.append(d.argmin(axis=2))
+    return (error, (points[0] != points[1]).sum())
+
+def main():
+    parser = OptionParser(option_class=eng_option, conflict_handler="resolve")
+    expert_grp = parser.add_option_group("Expert")
+    parser.add_option("", "--sizes", type="string", default="16,100,400,1500",
+                      help="comma-separated payload sizes [default=%default]")
+    parser.add_option("", "--count", type="int", default=2000,
+                      help="packets per size [default=%default]")
+    blks2.ofdm_mod.add_options(parser, expert_grp)
+    (options, args) = parser.parse_args()
+
+    mod = ofdm_batch.batch_mod(options)
+    print "%d data carriers, %s" % (len(mod.carriers), options.modulation)
+    print "%6s %12s %12s %8s %10s %8s" % ("size", "ofdm_mod", "batch_mod", "speedup", "samples", "bits")
+    print "%6s %12s %12s %8s %10s %8s" % ("(B)", "(MS/s)", "(MS/s)", "", "(max err)", "(diff)")
+    for size in [int(s) for s in options.sizes.split(",")]:
+        rows = ofdm_framing.numbered_payloads(size, options.count)
+        (reference, gr_time) = flow_graph(options, rows)
+        (frames, batch_time) = batch(mod, rows)
+        if reference.size != frames.size:
+            print "%6d ofdm_mod made %d samples, batch_mod %d" % (size, reference.size, frames.size)
+            continue
+        (error, diff) = compare(mod, size, reference, frames)
+        print "%6d %12.2f %12.2f %7.1fx %10.2g %8d" % \
+              (size, 1e-6 * reference.size / gr_time, 1e-6 * frames.size / batch_time,
+               gr_time / batch_time, error, diff)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -30,6 +30,8 @@ import struct, sys
 
 # from current dir
 from receive_path import receive_path
+import iq_replay
+import ofdm_solver
 #import fusb_options
 
 class my_top_block(gr.top_block):
@@ -41,12 +43,14 @@ class my_top_block(gr.top_block):
         self._rate               = options.rate            # USRP sample rate
         self._snr                 = options.snr
 
-        if self._rx_freq is None:
+        if self._rx_freq is None and options.replay is None:
             sys.stderr.write("-f FREQ or --freq FREQ or --rx-freq FREQ must be specified\n")
             raise SystemExit
 
-        # Set up USRP source
-        self._setup_usrp_source()
+        # Set up USRP source (or play back captures)
+        self._setup_usrp_source(options)
+        if self._rx_freq is None:
+            self._rx_freq = self.u.get_center_freq()
         self.set_freq(self._rx_freq)
         g = self.u.get_gain_range()
         if options.show_rx_gain_range:
@@ -64,12 +68,15 @@ class my_top_block(gr.top_block):
         self.connect(self.u, self.rxpath)
         #self.connect(self.u, self.file)
         
-    def _setup_usrp_source(self):
-        self.u = uhd.usrp_source(
-            device_addr = "",
-            io_type=uhd.io_type.COMPLEX_FLOAT32,
-            num_channels=1,
-        )
+    def _setup_usrp_source(self, options):
+        if options.replay is not None:
+            self.u = iq_replay.make_source(options)
+        else:
+            self.u = uhd.usrp_source(
+                device_addr = "",
+                io_type=uhd.io_type.COMPLEX_FLOAT32,
+                num_channels=1,
+            )
         self.u.set_samp_rate(self._rate)
         self.u.set_antenna("TX/RX", 0)
 
@@ -114,6 +121,7 @@ class my_top_block(gr.top_block):
                           help="set sample rate to [default=%default]")
         expert.add_option("", "--snr", type="eng_float", default=30,
                           help="set the SNR of the channel in dB [default=%default]")
+        iq_replay.add_options(normal, expert)
    
 
     # Make a static method to call before instantiation
@@ -155,13 +163,18 @@ def main():
     n_rcvd = 0
     n_right = 0
 
-    def rx_callback(ok, payload):
+    def rx_callback(ok, payload, meta=None):
         global n_rcvd, n_right
         n_rcvd += 1
         (pktno,) = struct.unpack('!H', payload[0:2])
         if ok:
             n_right += 1
         print "ok: %r \t pktno: %d \t n_rcvd: %d \t n_right: %d" % (ok, pktno, n_rcvd, n_right)
+        if meta is not None:
+            # --rx-metadata
+            print "\t rx_time: %s \t latency: %s \t snr: %s \t cfo: %.0f \t timing offset: %s" % \
+                  (meta.rx_time, meta.rx_time is not None and "%.6f" % (meta.time - meta.rx_time) or "-",
+                   meta.snr is not None and "%.1f" % meta.snr or "-", meta.cfo, meta.timing_offset)
 
         if 0:
             printlst = list()
@@ -184,10 +197,15 @@ def main():
     receive_path.add_options(parser, expert_grp)
     blks2.ofdm_mod.add_options(parser, expert_grp)
     blks2.ofdm_demod.add_options(parser, expert_grp)
+    ofdm_solver.add_options(parser, expert_grp)
     #fusb_options.add_options(expert_grp)
 
     (options, args) = parser.parse_args ()
 
+    # pick the OFDM parameters and rate for --target-bitrate
+    ofdm_solver.apply_options(options, "rate")
+    options.samp_rate = options.rate    # what receive_path calls it
+
     # build the graph
     tb = my_top_block(rx_callback, options)
 
@@ -31,6 +31,8 @@ import time, struct, sys
 # from current dir
 from transmit_path import transmit_path
 from pick_bitrate import pick_tx_bitrate
+import ofdm_framing
+import ofdm_solver
 #import fusb_options
 
 class my_top_block(gr.top_block):
@@ -164,10 +166,15 @@ def main():
     transmit_path.add_options(parser, expert_grp)
     blks2.ofdm_mod.add_options(parser, expert_grp)
     blks2.ofdm_demod.add_options(parser, expert_grp)
+    ofdm_solver.add_options(parser, expert_grp)
     #fusb_options.add_options(expert_grp)
 
     (options, args) = parser.parse_args ()
 
+    # pick the OFDM parameters and rate for --target-bitrate
+    ofdm_solver.apply_options(options, "rate")
+    options.samp_rate = options.rate    # what transmit_path calls it
+
     # build the graph
     tb = my_top_block(options)
     
@@ -183,14 +190,16 @@ def main():
     pktno = 0
     pkt_size = int(options.size)
 
+    # send in batches (bursts of 5 in discontinuous mode), a dot per batch
+    batch = options.discontinuous and 5 or 100
     while n < nbytes:
-        #pktno % 65535 to account for sending very large amounts of data
-        send_pkt(struct.pack('!H', pktno % 65535) + (pkt_size - 2) * chr(pktno & 0xff))
-        n += pkt_size
+        count = min(batch, (nbytes - n + pkt_size - 1) // pkt_size)
+        tb.txpath.send_pkts(ofdm_framing.numbered_payloads(pkt_size, count, pktno))
+        n += count * pkt_size
+        pktno += count
         sys.stderr.write('.')
-        if options.discontinuous and pktno % 5 == 1:
+        if options.discontinuous:
             time.sleep(1)
-        pktno += 1
         
     send_pkt(eof=True)
     tb.wait()                       # wait for it to finish
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           pick_bitrate Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# Times pick_tx_bitrate/pick_rx_bitrate (cached tables, binary search) against
+# the original implementation, which rebuilt and filtered the whole table and
+# scanned it on every call, and checks that both pick the same configuration
+# for
+#   - random target bitrates
+#   - targets exactly on a table rate that several samples_per_symbol reach
+#     (the tie goes to the lowest samples_per_symbol)
+#   - targets exactly halfway between two table rates (the tie goes to the
+#     lower rate)
+# with and without a samples_per_symbol or interp/decim constraint.
+#
+# python benchmark_pick_bitrate.py --calls=20000
+# /////////////////////////////////////////////////////////////////////////////
+
+from optparse import OptionParser
+import random
+import time
+
+import pick_bitrate
+
+
+def _reference_pick_best(target_bitrate, bits_per_symbol, info):
+    """
+    The original linear scan
+    """
+    if len(info) == 0:
+        raise RuntimeError, "info is zero length!"
+    if target_bitrate is None:
+        return info[-1]
+    target_symbolrate = target_bitrate / bits_per_symbol
+    best = info[0]
+    best_delta = abs(target_symbolrate - best[0])
+    for x in info[1:]:
+        delta = abs(target_symbolrate - x[0])
+        if delta < best_delta:
+            best_delta = delta
+            best = x
+    return ((best[0] * bits_per_symbol),) + best[1:]
+
+def _reference_pick_bitrate(bitrate, bits_per_symbol, samples_per_symbol,
+                            xrate, converter_rate, gen_info):
+    """
+    The original _pick_bitrate, generating the table on every call
+    """
+    if samples_per_symbol is not None and xrate is not None:
+        return (float(converter_rate) / xrate / samples_per_symbol,
+                samples_per_symbol, xrate)
+    if bitrate is None and samples_per_symbol is None and xrate is None:
+        bitrate = pick_bitrate._default_bitrate
+    return _reference_pick_best(bitrate, bits_per_symbol,
+                                pick_bitrate._filter_info(gen_info(converter_rate),
+                                                          samples_per_symbol, xrate))
+
+def _cases(rng, n, converter_rate, gen_info):
+    """
+    (bitrate, bits_per_symbol, samples_per_symbol, xrate) to try
+    """
+    table = gen_info(converter_rate)
+    rates = sorted(set([x[0] for x in table]))
+    xrates = sorted(set([x[2] for x in table]))
+    shared = [r for r in rates if len([x for x in table if x[0] == r]) > 1]
+    cases = []
+    for i in range(n):
+        bits = rng.choice((1, 2, 3))
+        kind = rng.randrange(3)
+        if kind == 0:
+            symbolrate = rng.uniform(rates[0] * .5, rates[-1] * 1.5)
+        elif kind == 1:
+            symbolrate = rng.choice(shared)
+        else:
+            j = rng.randrange(len(rates) - 1)
+            symbolrate = (rates[j] + rates[j+1]) / 2.0
+        sps = None
+        xrate = None
+        constraint = rng.randrange(4)
+        if constraint == 1:
+            sps = rng.choice(pick_bitrate._valid_samples_per_symbol)
+        elif constraint == 2:
+            xrate = rng.choice(xrates)
+        elif constraint == 3:
+            symbolrate = None
+        cases.append((symbolrate is not None and symbolrate * bits or None, bits, sps, xrate))
+    return cases
+
+def main():
+    parser = OptionParser()
+    parser.add_option("", "--calls", type="int", default=20000,
+                      help="calls to time per direction [default=%default]")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    (options, args) = parser.parse_args()
+
+    rng = random.Random(options.seed)
+    print "%-4s %12s %12s %8s %10s" % ("", "original", "cached", "speedup", "mismatches")
+    print "%-4s %12s %12s %8s %10s" % ("", "(us/call)", "(us/call)", "", "")
+    for (name, gen_info, converter_rate, pick) in \
+            (("tx", pick_bitrate._gen_tx_info, 128e6, pick_bitrate.pick_tx_bitrate),
+             ("rx", pick_bitrate._gen_rx_info, 64e6, pick_bitrate.pick_rx_bitrate)):
+        cases = _cases(rng, options.calls, converter_rate, gen_info)
+
+        started = time.time()
+        expected = [_reference_pick_bitrate(b, bits, sps, xrate, converter_rate, gen_info)
+                    for (b, bits, sps, xrate) in cases]
+        original = time.time() - started
+
+        started = time.time()
+        got = [pick(b, bits, sps, xrate, converter_rate) for (b, bits, sps, xrate) in cases]
+        cached = time.time() - started
+
+        mismatches = len([1 for (e, g) in zip(expected, got) if e != g])
+        print "%-4s %12.2f %12.2f %7.0fx %10d" % \
+              (name, 1e6 * original / len(cases), 1e6 * cached / len(cases),
+               original / max(cached, 1e-9), mismatches)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Response Timing Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# How precisely the MAC knows when a received frame ended, which is what a
+# CTS or ACK is timed from. Simulates the receive stream at --samp-rate: frames
+# of --frame-len samples with idle gaps between them, handed to the host in
+# chunks of --chunk samples that arrive a variable time after they were taken,
+# and the demodulator calling back a variable time after the chunk with the
+# frame end arrived. For every frame it compares the true end with
+#   - callback: when the demodulator called back (what the MAC used)
+#   - rx_timer: the end found in the tapped power (rx_timing.py, what
+#     --rx-timestamps gives the MAC; none while the drop in power at the end
+#     of the frame hasn't come through the tap yet, then the MAC goes by the
+#     callback)
+# It then measures, on this machine, how late respond()'s sleep and spin wait
+# sends compared with a plain time.sleep. The spread (99th - 1st percentile)
+# of the response gap is what --sifs has to be padded by.
+#
+# python benchmark_rx_timing.py --frames=2000 --chunk=4096
+# /////////////////////////////////////////////////////////////////////////////
+
+from optparse import OptionParser
+import random
+import time
+
+import numpy
+
+# from current dir
+from rx_timing import rx_timer
+
+_STEP = 8
+_ALPHA = 0.25
+
+
+def simulate(options, rng):
+    """
+    @returns ([callback - end], [estimate - end]) in seconds, one per frame
+    """
+    rate = float(options.samp_rate)
+    threshold_db = 30.0
+    on = 10 ** (threshold_db / 10.0)
+    # the stream: noise, with frames well above the threshold
+    ends = []
+    level = []
+    pos = 0
+    for i in range(options.frames):
+        idle = int(rate * rng.uniform(options.min_gap, options.max_gap))
+        level.append(numpy.empty(idle)); level[-1].fill(.01 * on)
+        level.append(numpy.empty(options.frame_len)); level[-1].fill(100 * on)
+        pos += idle + options.frame_len
+        ends.append(pos)
+    level.append(numpy.empty(int(rate * options.max_gap))); level[-1].fill(.01 * on)
+    power = numpy.concatenate(level) * numpy.random.RandomState(options.seed).exponential(1.0, pos + len(level[-1]))
+    # what the tap hands over: averaged (the single pole IIR, truncated where
+    # its taps are negligible), one value out of _STEP
+    taps = _ALPHA * (1 - _ALPHA) ** numpy.arange(48)
+    avg = numpy.convolve(power, taps)[:len(power)]
+    tapped = avg[_STEP - 1::_STEP].astype(numpy.float32)
+
+    # chunk arrival times: taken, plus the USRP, bus and scheduling delay
+    nchunks = (len(power) + options.chunk - 1) // options.chunk
+    arrival = []
+    last = 0.0
+    for k in range(nchunks):
+        taken = min((k + 1) * options.chunk, len(power)) / rate
+        last = max(last, taken + options.latency + rng.expovariate(1.0 / options.jitter))
+        arrival.append(last)
+
+    timer = rx_timer(rate, threshold_db, _STEP)
+    callback_err = []
+    estimate_err = []
+    fed = 0                          # chunks the timer has seen
+    per_chunk = options.chunk // _STEP
+    for end in ends:
+        k = (end - 1) // options.chunk
+        called = arrival[k] + rng.expovariate(1.0 / options.decode)
+        while fed < nchunks and arrival[fed] <= called:
+            timer.power(tapped[fed*per_chunk:(fed + 1)*per_chunk], arrival[fed])
+            fed += 1
+        callback_err.append(called - end / rate)
+        estimate = timer.last_frame_end()
+        if estimate is not None:
+            estimate_err.append(estimate - end / rate)
+    return (callback_err, estimate_err)
+
+def wait_errors(n, rng, spin):
+    """
+    How late a send timed with time.sleep (spin=False) or with sleep and
+    spin (respond) goes out
+    """
+    late = []
+    for i in range(n):
+        deadline = time.time() + rng.uniform(.0001, .003)
+        if spin:
+            remaining = deadline - time.time()
+            if remaining > .002:
+                time.sleep(remaining - .002)
+            while time.time() < deadline:
+                pass
+        else:
+            time.sleep(max(0, deadline - time.time()))
+        late.append(time.time() - deadline)
+    return late
+
+def summary(name, values, total):
+    values = sorted(values)
+    n = len(values)
+    mean = sum(values) / n
+    std = (sum([(v - mean)**2 for v in values]) / n) ** .5
+    spread = values[min(n - 1, int(.99 * n))] - values[int(.01 * n)]
+    print "%-18s %10.1f %10.1f %10.1f %9.1f%%" % \
+          (name, 1e6 * mean, 1e6 * std, 1e6 * spread, 100.0 * n / total)
+
+def main():
+    parser = OptionParser()
+    parser.add_option("", "--frames", type="int", default=2000,
+                      help="frames to simulate [default=%default]")
+    parser.add_option("", "--samp-rate", type="float", default=800e3,
+                      help="receive sample rate [default=%default]")
+    parser.add_option("", "--frame-len", type="int", default=3200,
+                      help="samples per frame [default=%default]")
+    parser.add_option("", "--min-gap", type="float", default=2e-3,
+                      help="shortest idle time between frames (s) [default=%default]")
+    parser.add_option("", "--max-gap", type="float", default=20e-3,
+                      help="longest idle time between frames (s) [default=%default]")
+    parser.add_option("", "--chunk", type="int", default=4096,
+                      help="samples per chunk handed to the host [default=%default]")
+    parser.add_option("", "--latency", type="float", default=1e-3,
+                      help="fixed chunk delivery delay (s) [default=%default]")
+    parser.add_option("", "--jitter", type="float", default=.5e-3,
+                      help="mean random chunk delivery delay (s) [default=%default]")
+    parser.add_option("", "--decode", type="float", default=1e-3,
+                      help="mean delay of the demodulator's callback (s) [default=%default]")
+    parser.add_option("", "--waits", type="int", default=2000,
+                      help="timed sends to measure [default=%default]")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    (options, args) = parser.parse_args()
+
+    rng = random.Random(options.seed)
+    (callback_err, estimate_err) = simulate(options, rng)
+    print "frame end error    %10s %10s %10s %10s" % ("mean", "std", "spread", "frames")
+    print "                   %10s %10s %10s" % ("(us)", "(us)", "(us)")
+    summary("callback", callback_err, options.frames)
+    summary("rx_timer", estimate_err, options.frames)
+    print
+    print "send lateness      %10s %10s %10s %10s" % ("mean", "std", "spread", "sends")
+    summary("time.sleep", wait_errors(options.waits, rng, False), options.waits)
+    summary("sleep and spin", wait_errors(options.waits, rng, True), options.waits)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
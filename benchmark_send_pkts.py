@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           send_pkts Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# Measures how many packets per second the host can frame and queue for
+# blks2.ofdm_mod, one at a time (what send_pkt does: make_packet, a message
+# and an insert per packet, with the payload built by struct.pack and string
+# repetition) against transmit_path.send_pkts (numbered_payloads and bulk
+# framing, ofdm_framing.py). Both fill an unbounded message queue, so this is
+# the Python cost only, not the modulator's. It also checks that both produce
+# the same packets.
+#
+# python benchmark_send_pkts.py --sizes=16,64,256,1500 --count=20000
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr, ofdm_packet_utils
+from optparse import OptionParser
+
+import struct
+import time
+
+# from current dir
+import ofdm_framing
+
+
+def one_at_a_time(msgq, size, count):
+    for pktno in range(count):
+        payload = struct.pack('!H', pktno % 65535) + (size - 2) * chr(pktno & 0xff)
+        pkt = ofdm_packet_utils.make_packet(payload, 1, 1, False, whitening=True)
+        msgq.insert_tail(gr.message_from_string(pkt))
+
+def batched(msgq, size, count):
+    for pkt in ofdm_framing.frame_packets(ofdm_framing.numbered_payloads(size, count)):
+        msgq.insert_tail(gr.message_from_string(pkt))
+
+def drain(msgq):
+    out = []
+    while not msgq.empty_p():
+        out.append(msgq.delete_head().to_string())
+    return out
+
+def main():
+    parser = OptionParser()
+    parser.add_option("", "--sizes", type="string", default="16,64,256,1500",
+                      help="comma-separated payload sizes [default=%default]")
+    parser.add_option("", "--count", type="int", default=20000,
+                      help="packets per size [default=%default]")
+    (options, args) = parser.parse_args()
+
+    print "%6s %14s %14s %8s %6s" % ("size", "send_pkt", "send_pkts", "speedup", "same")
+    print "%6s %14s %14s %8s %6s" % ("(B)", "(pkts/s)", "(pkts/s)", "", "")
+    for size in [int(s) for s in options.sizes.split(",")]:
+        rates = []
+        packets = []
+        for send in (one_at_a_time, batched):
+            msgq = gr.msg_queue()
+            started = time.time()
+            send(msgq, size, options.count)
+            rates.append(options.count / (time.time() - started))
+            packets.append(drain(msgq))
+        print "%6d %14.0f %14.0f %7.1fx %6s" % \
+              (size, rates[0], rates[1], rates[1] / rates[0], packets[0] == packets[1])
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Sense PSD Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# Compares the plain (non-overlapped, max-hold) sense path PSD with the Welch
+# (overlapped and averaged) one. The sense path is simulated in numpy the way
+# the flow graph computes it, and so is the statistic qpcsmaca_mac thresholds
+# (the bin average of 10*log10 of the max-hold spectrum).
+#
+# For each configuration and dwell time this prints
+#   - the per-bin variance ratio predicted by welch.py and the measured one
+#   - the spread (std, dB) of the MAC statistic on noise alone
+#   - the detection probability of a weak primary with the threshold set for
+#     a 1% false alarm rate
+# so the shortest dwell that keeps the detection rate can be read off.
+#
+# python benchmark_sense_psd.py --snr=-12 --dwells=.005,.01,.02,.04
+# /////////////////////////////////////////////////////////////////////////////
+
+from optparse import OptionParser
+
+import numpy
+
+import welch
+
+
+def _frames(x, fft_size, hop, window):
+    """
+    Windowed periodograms of frames starting every hop samples
+    """
+    n = (len(x) - fft_size) // hop + 1
+    idx = numpy.arange(fft_size)[None, :] + hop*numpy.arange(n)[:, None]
+    X = numpy.fft.fft(x[idx] * window[None, :], axis=1)
+    return (X.real**2 + X.imag**2)
+
+def _average(frames, averages):
+    """
+    Single pole IIR average along the frame axis (gr.single_pole_iir_filter_ff)
+    """
+    if averages <= 1:
+        return frames
+    alpha = welch.iir_alpha(averages)
+    out = numpy.empty_like(frames)
+    y = frames[0]
+    for i in range(len(frames)):
+        y = alpha*frames[i] + (1 - alpha)*y
+        out[i] = y
+    return out
+
+def _statistic(x, options, overlap, averages, dwell_frames, settle_frames, window):
+    k = welch.branches(overlap)
+    hop = int(round(options.fft_size / float(k)))
+    p = _average(_frames(x, options.fft_size, hop, window), averages)
+    hold = p[settle_frames:settle_frames + dwell_frames].max(axis=0)
+    return numpy.mean(10*numpy.log10(hold))
+
+def _signal(rng, n, snr=None):
+    """
+    Unit power noise, plus a primary at snr dB if snr is given
+    """
+    noise = (rng.normal(size=n) + 1j*rng.normal(size=n)) / numpy.sqrt(2)
+    if snr is None:
+        return noise
+    # a primary occupying the middle half of the band
+    S = numpy.fft.fft((rng.normal(size=n) + 1j*rng.normal(size=n)) / numpy.sqrt(2))
+    mask = numpy.zeros(n)
+    mask[:n//4] = 1
+    mask[-n//4:] = 1
+    s = numpy.fft.ifft(S * mask) * numpy.sqrt(2.0)
+    return noise + s * 10**(snr/20.0)
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-F", "--fft-size", type="int", default=512,
+                      help="sense FFT size [default=%default]")
+    parser.add_option("-r", "--rate", type="float", default=4e6,
+                      help="sense sample rate [default=%default]")
+    parser.add_option("", "--snr", type="float", default=-12,
+                      help="primary SNR in dB within its band [default=%default]")
+    parser.add_option("", "--dwells", type="string", default=".0025,.005,.01,.02,.04",
+                      help="comma-separated dwell times to try [default=%default]")
+    parser.add_option("", "--configs", type="string", default="0:1,.5:1,.5:8,.75:16",
+                      help="comma-separated OVERLAP:AVERAGES pairs [default=%default]")
+    parser.add_option("-n", "--trials", type="int", default=100,
+                      help="trials per point [default=%default]")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    (options, args) = parser.parse_args()
+
+    rng = numpy.random.RandomState(options.seed)
+    window = numpy.array(welch.blackmanharris(options.fft_size))
+    dwells = [float(d) for d in options.dwells.split(",")]
+    configs = [(float(c.split(":")[0]), int(c.split(":")[1])) for c in options.configs.split(",")]
+
+    print "%-22s %8s %8s %8s %10s %6s" % ("config", "dwell", "var", "var", "noise std", "Pd")
+    print "%-22s %8s %8s %8s %10s %6s" % ("", "(ms)", "pred.", "meas.", "(dB)", "")
+    for (overlap, averages) in configs:
+        k = welch.branches(overlap)
+        hop = int(round(options.fft_size / float(k)))
+        if averages > 1:
+            predicted = welch.iir_variance_ratio(list(window), hop, welch.iir_alpha(averages))
+            settle = int(numpy.ceil(5.0 / welch.iir_alpha(averages)))
+        else:
+            predicted = 1.0
+            settle = 0
+
+        # measured per-bin variance ratio on noise
+        x = _signal(rng, options.fft_size*400)
+        p = _frames(x, options.fft_size, hop, window)
+        base = p.var(axis=0).mean()
+        p = _average(p, averages)[settle:]
+        measured = p.var(axis=0).mean() / base
+
+        for dwell in dwells:
+            dwell_frames = max(1, int(round(dwell * options.rate / hop)))
+            n = (settle + dwell_frames - 1)*hop + options.fft_size
+            noise = []
+            primary = []
+            for i in range(options.trials):
+                noise.append(_statistic(_signal(rng, n), options, overlap, averages,
+                                        dwell_frames, settle, window))
+                primary.append(_statistic(_signal(rng, n, options.snr), options, overlap,
+                                          averages, dwell_frames, settle, window))
+            thresh = numpy.percentile(noise, 99)
+            pd = numpy.mean(numpy.array(primary) > thresh)
+            print "%-22s %8.2f %8.3f %8.3f %10.3f %6.2f" % \
+                  ("overlap %.2f avg %d" % (overlap, averages), dwell*1e3,
+                   predicted, measured, numpy.std(noise), pd)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
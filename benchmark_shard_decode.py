@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Sharded Decoder Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# How the sharded decoder (shard_decode.py) scales with processes. The same
+# capture is decoded with each of --jobs processes, and for each it prints
+# samples per second, the speedup over one process, and the speedup divided
+# by the processes (1.0 is linear). If the first run is not with one process,
+# the speedup is taken as if that run were already linear. Every run has to
+# pass up the same packets as the first; "same" says whether it did.
+#
+# python benchmark_shard_decode.py --jobs=1,2,4,8 field.dat
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import blks2
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+
+import multiprocessing
+import time
+
+# from current dir
+from shard_decode import shard_decoder
+import iq_capture
+
+
+def main():
+    parser = OptionParser(option_class=eng_option, conflict_handler="resolve",
+                          usage="%prog [options] capture")
+    expert_grp = parser.add_option_group("Expert")
+    shard_decoder.add_options(parser, expert_grp)
+    parser.add_option("-j", "--jobs", type="string", default=None,
+                      help="comma-separated process counts [default=1,2,4,... up to one per core]")
+    blks2.ofdm_mod.add_options(parser, expert_grp)
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.print_help()
+        raise SystemExit, 1
+
+    if options.jobs is None:
+        cores = multiprocessing.cpu_count()
+        jobs = [1]
+        while jobs[-1] * 2 < cores:
+            jobs.append(jobs[-1] * 2)
+        if jobs[-1] != cores:
+            jobs.append(cores)
+    else:
+        jobs = [int(j) for j in options.jobs.split(",")]
+
+    capture = iq_capture.iq_capture(args[0])
+    decoder = shard_decoder(options, 1, int(options.shard_size), int(options.chunk))
+    print "%d samples, %d shards" % (len(capture), len(decoder.shards(capture)))
+    print "%6s %8s %10s %8s %10s %6s" % ("jobs", "packets", "(MS/s)", "speedup", "efficiency", "same")
+    reference = None
+    single = None
+    for n in jobs:
+        decoder.jobs = n
+        started = time.time()
+        packets = decoder.decode(args[0])
+        elapsed = time.time() - started
+        if reference is None:
+            (reference, single) = (packets, elapsed * n)
+        print "%6d %8d %10.2f %7.2fx %10.2f %6s" % \
+              (n, len(packets), 1e-6 * len(capture) / elapsed, single / elapsed,
+               single / elapsed / n, packets == reference)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Spectrum History Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# Fills a spectrum_history file with --days of synthetic sensing results (every
+# channel sensed every --interval seconds, primaries whose busy probability
+# follows the hour of day) and times
+#   - recording the measurements
+#   - opening the file (reading the hourly totals into memory)
+#   - "quietest channel at this hour" from memory, and the same query as a
+#     GROUP BY over every measurement on disk
+# and checks how often the channel picked from history is idle at startup,
+# against picking a channel at random.
+#
+# python benchmark_spectrum_history.py --days=30 --interval=60
+# /////////////////////////////////////////////////////////////////////////////
+
+from optparse import OptionParser
+import math
+import os
+import random
+import tempfile
+import time
+
+import channel_plan
+import spectrum_history
+
+
+def busy_probability(profile, t):
+    """
+    Probability a channel's primary is on at time t: a daily cycle peaking at
+    the channel's peak hour
+    """
+    (base, swing, peak) = profile
+    hour = spectrum_history.hour_of_day(t) + (t % 3600) / 3600.0
+    return max(0.0, min(1.0, base + swing * math.cos(2 * math.pi * (hour - peak) / 24.0)))
+
+def main():
+    parser = OptionParser()
+    parser.add_option("", "--days", type="float", default=30,
+                      help="days of history to generate [default=%default]")
+    parser.add_option("", "--interval", type="float", default=60,
+                      help="time between sweeps of the band [default=%default]")
+    parser.add_option("", "--start-freq", type="float", default=470e6,
+                      help="start of the band to cut into channels [default=%default]")
+    parser.add_option("", "--end-freq", type="float", default=650e6,
+                      help="end of the band to cut into channels [default=%default]")
+    parser.add_option("", "--queries", type="int", default=1000,
+                      help="number of startups to try [default=%default]")
+    parser.add_option("", "--db", type="string", default=None,
+                      help="history file to write (default: a temporary file)")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    (options, args) = parser.parse_args()
+
+    rng = random.Random(options.seed)
+    channels = channel_plan.from_band(options.start_freq, options.end_freq, 6e6).freqs
+    profiles = dict([(c, (rng.uniform(.1, .6), rng.uniform(0, .4), rng.uniform(0, 24)))
+                     for c in channels])
+    filename = options.db
+    if filename is None:
+        (fd, filename) = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.remove(filename)
+
+    history = spectrum_history.spectrum_history(filename)
+    t_end = time.time()
+    t = t_end - options.days * 86400
+    n = 0
+    started = time.time()
+    while t < t_end:
+        for c in channels:
+            busy = rng.random() < busy_probability(profiles[c], t)
+            level = rng.gauss(busy and -40.0 or -75.0, 2.0)
+            history.add(c, level, busy, t)
+            n += 1
+        t += options.interval
+    history.close()
+    record = time.time() - started
+    print "%d channels, %d measurements (%.1f days), %.1f MB" % \
+          (len(channels), n, options.days, os.path.getsize(filename) / 1e6)
+    print "recording:            %8.2f us per measurement" % (1e6 * record / n,)
+
+    started = time.time()
+    history = spectrum_history.spectrum_history(filename)
+    print "opening:              %8.2f ms" % (1e3 * (time.time() - started),)
+
+    times = [t_end - rng.uniform(0, 86400) for i in range(options.queries)]
+    started = time.time()
+    picks = [history.quietest(channels, q) for q in times]
+    print "quietest (memory):    %8.3f ms per query" % (1e3 * (time.time() - started) / len(times),)
+
+    db = history._db
+    started = time.time()
+    for q in times[:10]:
+        hour = spectrum_history.hour_of_day(q)
+        db.execute("SELECT freq, AVG(busy), AVG(level) FROM obs "
+                   "WHERE CAST(strftime('%H', t, 'unixepoch', 'localtime') AS INTEGER) = ? "
+                   "GROUP BY freq ORDER BY AVG(busy), AVG(level) LIMIT 1", (hour,)).fetchall()
+    print "quietest (scan obs):  %8.1f ms per query" % (1e3 * (time.time() - started) / 10,)
+    history.close()
+    if options.db is None:
+        os.remove(filename)
+
+    hits = sum([rng.random() >= busy_probability(profiles[c], q) for (c, q) in zip(picks, times)])
+    blind = sum([rng.random() >= busy_probability(profiles[rng.choice(channels)], q) for q in times])
+    print "first channel idle:   %7.1f%% from history, %.1f%% at random" % \
+          (100.0 * hits / len(times), 100.0 * blind / len(times))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
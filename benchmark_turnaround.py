@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Turnaround Benchmark
+#
+# FuNLab
+# University of Washington
+#
+# Measures how long a control frame takes to get through the transmit path,
+# from the send call until its last sample has left it, with send_pkt (framed
+# and modulated every time) and send_ctl with --ctl-cache (pre-modulated
+# samples). The transmit path feeds a throttle at the sample rate and a null
+# sink, standing in for the device. Each frame is sent with the transmit path
+# idle, the way the MAC sends a CTS or an ACK.
+#
+# python benchmark_turnaround.py --frames=200 --fft-length=512 --occupied-tones=200
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr, blks2
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+
+import threading
+import time
+
+# from current dir
+from transmit_path import transmit_path
+
+
+class loopback(gr.top_block):
+    def __init__(self, options):
+        gr.top_block.__init__(self)
+        self.txpath = transmit_path(options)
+        self.connect(self.txpath, gr.throttle(gr.sizeof_gr_complex, options.samp_rate),
+                     gr.null_sink(gr.sizeof_gr_complex))
+
+def turnaround(send, payload, frames):
+    """
+    Send payload frames times and return the send call to done times (s)
+    """
+    done = threading.Event()
+    finished = []
+    times = []
+    for i in range(frames):
+        done.clear()
+        started = time.time()
+        send(payload, callback=lambda t: (finished.append(t), done.set()))
+        done.wait(5)
+        if not done.isSet():
+            raise RuntimeError, "frame %d never left the transmit path" % (i,)
+        times.append(finished[-1] - started)
+    return times
+
+def percentile(times, p):
+    times = sorted(times)
+    return times[min(len(times) - 1, int(p * len(times)))]
+
+def main():
+    parser = OptionParser(option_class=eng_option, conflict_handler="resolve")
+    expert_grp = parser.add_option_group("Expert")
+    parser.add_option("", "--frames", type="int", default=200,
+                      help="control frames to send per method [default=%default]")
+    parser.add_option("", "--samp-rate", type="eng_float", default=1e6,
+                      help="sample rate of the throttle [default=%default]")
+    transmit_path.add_options(parser, expert_grp)
+    blks2.ofdm_mod.add_options(parser, expert_grp)
+    (options, args) = parser.parse_args()
+    options.ctl_cache = True
+
+    tb = loopback(options)
+    tb.start()
+    payload = "a" + "b" + "CTS"
+    tb.txpath.precompute_ctl([payload])
+
+    print "%-10s %10s %10s %10s" % ("", "mean", "median", "99th")
+    print "%-10s %10s %10s %10s" % ("", "(us)", "(us)", "(us)")
+    for (name, send) in (("send_pkt", tb.txpath.send_pkt), ("send_ctl", tb.txpath.send_ctl)):
+        times = turnaround(send, payload, options.frames)
+        print "%-10s %10.0f %10.0f %10.0f" % \
+              (name, 1e6 * sum(times) / len(times), 1e6 * percentile(times, .5),
+               1e6 * percentile(times, .99))
+
+    tb.txpath.send_pkt(eof=True)
+    tb.wait()
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
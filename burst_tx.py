@@ -0,0 +1,177 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Burst Transmission
+#
+# FuNLab
+# University of Washington
+#
+# With --burst transmit_path tags every frame as a burst of its own: a tx_sob
+# tag on its first sample and a tx_eob tag on its last one. uhd.usrp_sink then
+# sends each frame with start and end of burst flags, and the device knows the
+# silence between frames is meant to be there (no underflows, nothing to carry
+# over the bus while the MAC is quiet).
+#
+# The tags are added by gr.burst_tagger (GNU Radio 3.5 and later) from a
+# trigger stream that runs alongside the samples: 1 during a frame and 0 on its
+# last sample. burst_marker makes the trigger from the lengths of the frames
+# transmit_path queued, in the order they go out.
+#
+# burst_sink stands in for uhd.usrp_sink: it takes the samples at the sample
+# rate and checks them against the tags burst_marker had the tagger add (one
+# burst per frame, back to back, every sample in a burst).
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr
+
+import collections
+import threading
+
+import numpy
+
+SOB_KEY = "tx_sob"
+EOB_KEY = "tx_eob"
+
+
+def make_tagger():
+    """
+    gr.burst_tagger adding tx_sob/tx_eob from the trigger on input 1
+    """
+    if not hasattr(gr, "burst_tagger"):
+        raise RuntimeError, "--burst needs gr.burst_tagger (GNU Radio 3.5 or later)"
+    tagger = gr.burst_tagger(gr.sizeof_gr_complex)
+    tagger.set_true_tag(SOB_KEY, True)
+    tagger.set_false_tag(EOB_KEY, True)
+    return tagger
+
+def burst_tags(trigger, offset=0, state=False):
+    """
+    The tags gr.burst_tagger adds for trigger: SOB_KEY where it goes above 0,
+    EOB_KEY where it drops back to 0
+
+    @param offset: index of trigger[0] in the stream
+    @param state: whether the stream is in a burst before trigger[0]
+    @returns ([(index, key)], state after trigger)
+    """
+    tags = []
+    on = numpy.asarray(trigger) > 0
+    if len(on) == 0:
+        return (tags, state)
+    changes = numpy.flatnonzero(on != numpy.concatenate(([state], on[:-1])))
+    for i in changes:
+        if on[i]:
+            tags.append((offset + int(i), SOB_KEY))
+        else:
+            tags.append((offset + int(i), EOB_KEY))
+    return (tags, bool(on[-1]))
+
+def check_bursts(tags, frames, nsamples):
+    """
+    Check that the tags make one burst per frame, back to back, and cover the
+    nsamples samples that went out
+
+    @param tags: [(index, key)] in stream order
+    @param frames: samples in each frame, in the order they were sent
+    @returns number of bursts
+    @raises ValueError: describing the first thing wrong
+    """
+    if len(tags) != 2 * len(frames):
+        raise ValueError, "%d tags for %d frames" % (len(tags), len(frames))
+    start = 0
+    for (i, length) in enumerate(frames):
+        (sob, sob_key) = tags[2*i]
+        (eob, eob_key) = tags[2*i + 1]
+        if sob_key != SOB_KEY or eob_key != EOB_KEY:
+            raise ValueError, "frame %d: tagged %s, %s" % (i, sob_key, eob_key)
+        if sob != start or eob != start + length - 1:
+            raise ValueError, "frame %d: burst [%d, %d], expected [%d, %d]" % \
+                  (i, sob, eob, start, start + length - 1)
+        start += length
+    if nsamples != start:
+        raise ValueError, "%d samples out, the bursts hold %d" % (nsamples, start)
+    return len(frames)
+
+
+class burst_marker(object):
+    """
+    Makes the trigger stream for gr.burst_tagger from the frame lengths
+    """
+    def __init__(self, record=False):
+        """
+        @param record: keep the frame lengths and the tags (for burst_sink)
+        """
+        self._frames = collections.deque()   # lengths of the frames not out yet
+        self._left = 0                       # samples left in the current frame
+        self._offset = 0                     # samples triggered so far
+        self._state = False
+        self.record = record
+        self.frames = []
+        self.tags = []
+
+    def queued(self, nsamples):
+        """
+        A frame of nsamples samples was sent (in transmit order)
+        """
+        self._frames.append(nsamples)
+        if self.record:
+            self.frames.append(nsamples)
+
+    def trigger(self, nitems):
+        """
+        Trigger for the next nitems samples
+
+        @returns int16 array
+        """
+        out = numpy.ones(nitems, numpy.int16)
+        i = 0
+        while i < nitems:
+            if self._left == 0:
+                if len(self._frames) == 0:
+                    raise RuntimeError, "%d samples don't belong to any frame" % (nitems - i,)
+                self._left = self._frames.popleft()
+            step = min(self._left, nitems - i)
+            i += step
+            self._left -= step
+            if self._left == 0:
+                out[i - 1] = 0
+        if self.record:
+            (tags, self._state) = burst_tags(out, self._offset, self._state)
+            self.tags.extend(tags)
+        self._offset += nitems
+        return out
+
+
+class burst_sink(gr.hier_block2):
+    """
+    Stand-in for uhd.usrp_sink in burst mode: consumes the samples at the
+    sample rate and checks the tags of the transmit path's burst_marker
+    """
+    def __init__(self, samp_rate, marker):
+        """
+        @param marker: the transmit path's burst_marker (made with record=True)
+        """
+        gr.hier_block2.__init__(self, "burst_sink",
+                                gr.io_signature(1, 1, gr.sizeof_gr_complex),
+                                gr.io_signature(0, 0, 0))
+        self.marker = marker
+        self.samples = 0
+        self._q = gr.msg_queue()
+        self.connect(self, gr.throttle(gr.sizeof_gr_complex, samp_rate),
+                     gr.message_sink(gr.sizeof_gr_complex, self._q, False))
+        counter = threading.Thread(target=self._count)
+        counter.setDaemon(True)
+        counter.start()
+
+    def _count(self):
+        while True:
+            msg = self._q.delete_head()
+            if msg.type() == 1:
+                return
+            self.samples += msg.length() // gr.sizeof_gr_complex
+
+    def check(self):
+        """
+        Check the bursts so far; call with the transmit path idle
+
+        @returns number of bursts
+        @raises ValueError: if they are not one per frame
+        """
+        return check_bursts(self.marker.tags, self.marker.frames, self.samples)
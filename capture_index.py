@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           IQ Capture Index
+#
+# FuNLab
+# University of Washington
+#
+# Finds the frames in an IQ capture (iq_capture.py) once and writes where
+# they are to a sidecar, so later passes seek straight to them instead of
+# scanning the capture from the start again.
+#
+# The capture is read a chunk at a time (memory stays at a chunk plus one
+# frame whatever its size). Frames are found by batch_demod (ofdm_batch.py):
+# the preamble's correlation with itself gives the start and the frequency
+# offset, and the header gives the length. Where the header doesn't decode
+# the frame is taken to run for as long as the power stays above halfway (in
+# dB) between the noise floor and the preamble. The noise floor is tracked
+# over the capture from block powers (noise_floor.py) and gives each frame a
+# coarse SNR, from the power of its preamble.
+#
+# The index is the capture's filename plus ".idx": an 8 byte magic and then
+# one fixed size record per frame, in order:
+#
+#   offset   int64    first sample of the frame
+#   length   int32    samples in the frame
+#   payload  int32    payload bytes from the header, -1 if it didn't decode
+#   snr      float32  preamble power over the noise floor (dB)
+#   cfo      float32  frequency offset (carriers)
+#
+# so the N-th frame is read straight from the file, and frames by time or
+# sample with a binary search.
+#
+# python capture_index.py field.dat
+# python capture_index.py --frame=1000 field.dat
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import blks2
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+
+import math
+import os
+import time
+
+import numpy
+
+# from current dir
+from noise_floor import noise_floor
+import iq_capture
+import ofdm_batch
+
+
+MAGIC = "IQIDX001"
+
+INDEX_DTYPE = numpy.dtype([("offset", "<i8"), ("length", "<i4"), ("payload", "<i4"),
+                           ("snr", "<f4"), ("cfo", "<f4")])
+
+def index_filename(filename):
+    """
+    @returns the name of the index of the capture filename
+    """
+    return filename + ".idx"
+
+
+class capture_index(object):
+    """
+    A capture's frame index, memory-mapped
+    """
+    def __init__(self, filename):
+        """
+        @param filename: the capture (not the index)
+        """
+        self.capture = iq_capture.iq_capture(filename)
+        name = index_filename(filename)
+        f = open(name, "rb")
+        magic = f.read(len(MAGIC))
+        f.close()
+        if magic != MAGIC:
+            raise ValueError, "%s is not a capture index" % (name,)
+        if os.path.getsize(name) == len(MAGIC):
+            self.frames = numpy.zeros(0, INDEX_DTYPE)
+        else:
+            self.frames = numpy.memmap(name, dtype=INDEX_DTYPE, mode="r", offset=len(MAGIC))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, n):
+        """
+        @returns the n-th frame's record (offset, length, payload, snr, cfo)
+        """
+        return self.frames[n]
+
+    def samples(self, n, pad=0):
+        """
+        The samples of the n-th frame
+
+        @param pad: samples before and after the frame to include as well
+        """
+        frame = self.frames[n]
+        start = max(0, int(frame["offset"]) - pad)
+        return self.capture.samples(start, int(frame["offset"]) + int(frame["length"]) + pad)
+
+    def find(self, index):
+        """
+        @returns the number of the first frame that starts at or after sample index
+        """
+        return int(numpy.searchsorted(self.frames["offset"], index))
+
+    def find_time(self, t):
+        """
+        @returns the number of the first frame that starts at or after time t
+        """
+        return self.find(self.capture.index_at(t))
+
+    def __repr__(self):
+        return "capture_index(%r, %d frames)" % (self.capture.filename, len(self))
+
+
+class indexer(object):
+    """
+    Finds the frames in a capture in one pass
+    """
+    def __init__(self, options, chunk=1 << 22):
+        """
+        @param options: the ofdm_mod options the capture was sent with
+        @param chunk: samples read at a time
+        """
+        self.demod = ofdm_batch.batch_demod(options)
+        self.chunk = chunk
+
+    def _lengths(self, x, starts, level):
+        """
+        Samples from each of starts for as long as the power per symbol stays
+        above level
+        """
+        Lp = self.demod.symbol_len
+        nmax = self.demod.overlap // Lp
+        lengths = numpy.empty(len(starts), numpy.int_)
+        for i in range(len(starts)):
+            n = min(nmax, (len(x) - starts[i]) // Lp)
+            y = x[starts[i]:starts[i] + n * Lp].reshape(n, Lp)
+            below = numpy.flatnonzero((y.real ** 2 + y.imag ** 2).mean(axis=1) < level[i])
+            if len(below):
+                n = below[0]
+            lengths[i] = Lp * n
+        return lengths
+
+    def frames(self, capture):
+        """
+        @param capture: iq_capture
+        @returns generator of arrays of INDEX_DTYPE records, a chunk's frames at a time
+        """
+        demod = self.demod
+        Lp = demod.symbol_len
+        floor = noise_floor()
+        margin = 2 * (demod._search + Lp)
+        pos = 0
+        busy = 0
+        while pos < len(capture):
+            end = min(pos + self.chunk, len(capture))
+            first = max(0, pos - margin)
+            x = numpy.asarray(capture.samples(first, end + demod.overlap), numpy.complex128)
+            # the floor from this chunk, before its frames are measured; the
+            # blocks are a cyclic prefix long, to fit in short gaps
+            block = demod.cp_length
+            n = (end - pos) // block
+            y = x[pos - first:pos - first + n * block].reshape(n, block)
+            floor.add((y.real ** 2 + y.imag ** 2).mean(axis=1))
+            noise = floor.floor() is not None and 10 ** (floor.floor() / 10.0) or 0.0
+
+            (starts, cfo) = demod.detect(x)
+            (starts, cfo, length, whitener, valid) = demod.headers(x, starts, cfo)
+            own = (starts + first >= pos) & (starts + first < end)
+            (starts, cfo, length, valid) = (starts[own], cfo[own], length[own], valid[own])
+            y = x[starts[:, None] + numpy.arange(Lp)]
+            preamble = (y.real ** 2 + y.imag ** 2).mean(axis=1)
+            payload = numpy.where(valid, length - 4, -1)
+            samples = numpy.array([demod.frame_samples(max(0, L - 4)) for L in length], numpy.int_)
+            bad = numpy.flatnonzero(~valid)
+            if len(bad):
+                samples[bad] = self._lengths(x, starts[bad], numpy.sqrt(preamble[bad] * max(noise, 1e-30)))
+
+            records = []
+            for i in range(len(starts)):
+                start = first + starts[i]
+                if start < busy:
+                    continue
+                busy = start + samples[i] - demod.cp_length
+                if noise > 0:
+                    snr = 10 * math.log10(max(preamble[i] / noise - 1, 1e-3))
+                else:
+                    snr = numpy.nan
+                records.append((start, samples[i], payload[i], snr, cfo[i]))
+            yield numpy.array(records, INDEX_DTYPE)
+            pos = end
+
+    def write(self, filename):
+        """
+        Index the capture filename
+
+        @returns the number of frames found
+        """
+        capture = iq_capture.iq_capture(filename)
+        name = index_filename(filename)
+        # written under another name first, so a half-written index is
+        # never taken for a whole one
+        f = open(name + ".tmp", "wb")
+        f.write(MAGIC)
+        n = 0
+        for records in self.frames(capture):
+            records.tofile(f)
+            n += len(records)
+        f.close()
+        os.rename(name + ".tmp", name)
+        return n
+
+
+def main():
+    parser = OptionParser(option_class=eng_option, conflict_handler="resolve",
+                          usage="%prog [options] capture")
+    expert_grp = parser.add_option_group("Expert")
+    parser.add_option("-n", "--frame", type="int", default=None,
+                      help="print this frame from the index instead of building it [default=%default]")
+    parser.add_option("-v", "--verbose", action="store_true", default=False,
+                      help="print every frame in the index [default=%default]")
+    expert_grp.add_option("", "--chunk", type="eng_float", default=1 << 22,
+                          help="samples read at a time [default=%default]")
+    blks2.ofdm_mod.add_options(parser, expert_grp)
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.print_help()
+        raise SystemExit, 1
+
+    if options.frame is None:
+        started = time.time()
+        n = indexer(options, int(options.chunk)).write(args[0])
+        elapsed = time.time() - started
+        index = capture_index(args[0])
+        print "%d frames, %d with a header, in %.2f s (%.1f MS/s)" % \
+              (n, (index.frames["payload"] >= 0).sum(), elapsed, 1e-6 * len(index.capture) / elapsed)
+        frames = options.verbose and range(len(index)) or []
+    else:
+        index = capture_index(args[0])
+        frames = [options.frame]
+    for i in frames:
+        frame = index[i]
+        print "%8d %12d %14.6f %7d %6d %6.1f dB %6.2f" % \
+              (i, frame["offset"], index.capture.time_at(int(frame["offset"])), frame["length"],
+               frame["payload"], frame["snr"], frame["cfo"])
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
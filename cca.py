@@ -0,0 +1,105 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Clear Channel Assessment
+#
+# FuNLab
+# University of Washington
+#
+# carrier_sensed() used to be a gr.probe_avg_mag_sqrd_c with alpha = 0.001:
+# a frame has to go on for thousands of samples before the average crosses the
+# threshold, and it stays high as long after the frame is over. The cca block
+# decides per sample from two detectors over short windows:
+#   - energy: the power averaged over --cca-window samples (one OFDM symbol
+#     by default) against the carrier threshold, with 3 dB of hysteresis
+#   - cyclic prefix correlation: an OFDM symbol's cyclic prefix is a copy of
+#     its last cp_length samples, so x[n] x*[n - fft_length] averaged over
+#     cp_length samples, squared and normalized by the power of both, is
+#     close to 1 inside an OFDM frame and around 1/cp_length on noise. It
+#     picks up frames that are too weak for the energy detector.
+# The channel is busy if either says so, and stays busy for another window
+# after that (so a poll between two symbols doesn't see it idle).
+#
+# The output is the busy flag (1.0 or 0.0) for every input sample; receive_path
+# probes it for carrier_sensed() (--cca).
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr
+
+
+class cca(gr.hier_block2):
+    """
+    Energy and cyclic prefix correlation carrier sense
+    """
+    def __init__(self, fft_length, cp_length, threshold_db, corr_threshold=0.5,
+                 window=0, hysteresis_db=3.0):
+        """
+        @param threshold_db: energy threshold (same scale as the probe's)
+        @param corr_threshold: cyclic prefix correlation (0 to 1) that means busy
+        @param window: samples the energy is averaged over, and the hold time
+                       (0 for one OFDM symbol)
+        """
+        gr.hier_block2.__init__(self, "cca",
+                                gr.io_signature(1, 1, gr.sizeof_gr_complex),
+                                gr.io_signature(1, 1, gr.sizeof_float))
+        if window == 0:
+            window = fft_length + cp_length
+        self.window = window
+        self.hysteresis_db = hysteresis_db
+
+        # energy
+        mag2 = gr.complex_to_mag_squared()
+        energy = gr.moving_average_ff(window, 1.0 / window, 4000)
+        self.energy_busy = gr.threshold_ff(0, 0, 0)
+        self.set_threshold(threshold_db)
+        self.connect(self, mag2, energy, self.energy_busy)
+
+        # cyclic prefix correlation, normalized by the power of both x[n] and
+        # x[n - fft_length] over the prefix (so it stays within 0 to 1 when a
+        # frame ends and only the delayed samples are frame). Squared, to do
+        # without a square root: |C|^2 / (P[n] P[n - fft_length])
+        product = gr.multiply_cc()
+        self.connect(self, (product, 0))
+        self.connect(self, gr.delay(gr.sizeof_gr_complex, fft_length), gr.conjugate_cc(),
+                     (product, 1))
+        corr = gr.complex_to_mag_squared()
+        self.connect(product, gr.moving_average_cc(cp_length, 1.0 / cp_length, 4000), corr)
+        power = gr.moving_average_ff(cp_length, 1.0 / cp_length, 4000)
+        powers = gr.multiply_ff()
+        self.connect(mag2, power, (powers, 0))
+        self.connect(power, gr.delay(gr.sizeof_float, fft_length), (powers, 1))
+        floor = gr.add_const_ff(1e-20)
+        ratio = gr.divide_ff()
+        self.connect(powers, floor, (ratio, 1))
+        self.connect(corr, (ratio, 0))
+        self.corr_busy = gr.threshold_ff((corr_threshold * 0.8) ** 2, corr_threshold ** 2, 0)
+        self.connect(ratio, self.corr_busy)
+
+        # either, held for a window
+        either = gr.add_ff()
+        self.connect(self.energy_busy, (either, 0))
+        self.connect(self.corr_busy, (either, 1))
+        held = gr.moving_average_ff(window, 1.0, 4000)
+        busy = gr.threshold_ff(0.5, 0.5, 0)
+        self.connect(either, held, busy, self)
+
+    def set_threshold(self, threshold_db):
+        """
+        Set the energy threshold (dB)
+        """
+        self.threshold_db = threshold_db
+        self.energy_busy.set_hi(10 ** (threshold_db / 10.0))
+        self.energy_busy.set_lo(10 ** ((threshold_db - self.hysteresis_db) / 10.0))
+
+    def threshold(self):
+        return self.threshold_db
+
+
+def add_options(normal, expert):
+    """
+    Adds clear channel assessment options to the Options Parser
+    """
+    expert.add_option("", "--cca", action="store_true", default=False,
+                      help="carrier sense from short window energy and cyclic prefix correlation [default=%default]")
+    expert.add_option("", "--cca-corr-thresh", type="eng_float", default=0.5,
+                      help="cyclic prefix correlation (0 to 1) that means busy [default=%default]")
+    expert.add_option("", "--cca-window", type="int", default=0,
+                      help="energy averaging and hold time in samples, 0 for one OFDM symbol [default=%default]")
@@ -0,0 +1,259 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Channel Emulator
+#
+# FuNLab
+# University of Washington
+#
+# The simulated channel in numpy, a block of samples at a time, for runs that
+# need more than gr.channel_model (AWGN, a frequency offset, a clock rate
+# ratio and fixed taps) and shouldn't be held to a throttle. In the order the
+# samples go through them:
+#   - multipath: a tapped delay line, fixed or fading. Fading taps are
+#     Rayleigh, or Rician on the first (direct) tap with a K factor; each
+#     tap's gain is a sum of sinusoids with the Doppler spread, worked out
+#     every few samples (a hundredth of a Doppler cycle at most) and
+#     interpolated in between
+#   - sampling clock: resampled (cubic interpolation) by a clock rate ratio
+#     that can drift
+#   - frequency offset and phase noise (a random walk)
+#   - AWGN, noise_voltage per I and Q (like gr.channel_model)
+# The state (delay line, resampler, phases, random generators) carries over
+# from block to block, and the random generators are seeded: the same seed
+# gives the same output (to float32 rounding) however the input is split
+# into blocks.
+#
+# process() works on arrays; numpy_channel is a block that runs it in a flow
+# graph (benchmark_ofdm.py --numpy-channel). Its output only ends when eof()
+# is called, once the input has.
+#
+# python benchmark_channel_emulator.py --fading=rayleigh --doppler=1e-4
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr
+
+import math
+import threading
+import time
+
+import numpy
+
+
+class channel_emulator(object):
+    """
+    AWGN, frequency offset, sampling clock, multipath and fading, and phase
+    noise on blocks of complex samples
+    """
+    def __init__(self, noise_voltage=0.0, frequency_offset=0.0, clock_ratio=1.0, taps=(1.0,),
+                 fading=None, doppler=0.0, k_factor=0.0, phase_noise=0.0, clock_drift=0.0,
+                 seed=None, sinusoids=16):
+        """
+        @param noise_voltage: standard deviation of the noise on I and on Q
+        @param frequency_offset: cycles per sample
+        @param clock_ratio: input samples per output sample
+        @param taps: complex tap gains, one sample apart
+        @param fading: None (fixed taps), "rayleigh" or "rician"
+        @param doppler: largest Doppler shift, cycles per sample
+        @param k_factor: Rician K factor of the first tap (dB)
+        @param phase_noise: standard deviation of the phase step per sample (rad)
+        @param clock_drift: change of clock_ratio per output sample
+        @param seed: for the noise, the phase noise and the fading
+        @param sinusoids: per fading tap
+        """
+        self.noise_voltage = noise_voltage
+        self.frequency_offset = frequency_offset
+        self.clock_ratio = clock_ratio
+        self.clock_drift = clock_drift
+        self.phase_noise = phase_noise
+        taps = numpy.asarray(taps, numpy.complex128)
+        self._delays = numpy.flatnonzero(taps)
+        self._taps = taps[self._delays]
+        self._history = numpy.zeros(len(taps) - 1, numpy.complex64)
+        self._n = 0                      # input samples so far
+        # one generator each, so how many numbers one draws doesn't move
+        # the others
+        seeds = numpy.random.RandomState(seed).randint(0, 1 << 30, 3)
+        self._noise_rng = numpy.random.RandomState(seeds[0])
+        self._phase_rng = numpy.random.RandomState(seeds[1])
+
+        self.fading = fading
+        if fading is not None:
+            if fading not in ("rayleigh", "rician"):
+                raise ValueError, "unknown fading %s" % (fading,)
+            rng = numpy.random.RandomState(seeds[2])
+            ntaps = len(self._taps)
+            self._sinusoids = sinusoids
+            # each sinusoid arrives from its own angle, so is shifted by the
+            # Doppler times its cosine
+            angles = rng.uniform(0, 2 * math.pi, (ntaps, sinusoids))
+            self._freqs = 2 * math.pi * doppler * numpy.cos(angles)
+            self._phases = rng.uniform(0, 2 * math.pi, (ntaps, sinusoids))
+            # the direct path (Rician only)
+            K = 0.0
+            if fading == "rician":
+                K = 10 ** (k_factor / 10.0)
+            self._los = numpy.zeros(ntaps)
+            self._los[0] = math.sqrt(K / (K + 1))
+            self._scatter = numpy.ones(ntaps)
+            self._scatter[0] = math.sqrt(1 / (K + 1))
+            self._los_freq = 2 * math.pi * doppler * math.cos(rng.uniform(0, 2 * math.pi))
+            self._los_phase = rng.uniform(0, 2 * math.pi)
+            if doppler > 0:
+                self._step = int(max(1, min(256, 0.01 / doppler)))
+            else:
+                self._step = 256
+
+        # resampler: the input not used yet, from one sample before the next
+        # output's position on
+        self._buf = numpy.zeros(1, numpy.complex64)
+        self._t = 1.0
+        self._carrier = 0.0              # frequency offset phase
+        self._phase = 0.0                # phase noise
+
+    def gains(self, first, n):
+        """
+        Fading tap gains for input samples first..first+n
+
+        @returns (taps, n) array
+        """
+        step = self._step
+        start = (first // step) * step
+        grid = numpy.arange(start, first + n + step, step)
+        sos = numpy.exp(1j * (self._freqs[:, :, None] * grid + self._phases[:, :, None]))
+        sos = sos.sum(axis=1) / math.sqrt(self._sinusoids)
+        los = numpy.exp(1j * (self._los_freq * grid + self._los_phase))
+        g = self._los[:, None] * los + self._scatter[:, None] * sos
+        g = (g * self._taps[:, None]).astype(numpy.complex64)
+        # straight lines between the grid points
+        w = numpy.arange(step, dtype=numpy.float32) / step
+        lines = g[:, :-1, None] + (g[:, 1:] - g[:, :-1])[:, :, None] * w
+        return lines.reshape(len(g), -1)[:, first - start:first - start + n]
+
+    def _multipath(self, x):
+        D = len(self._history)
+        if D == 0 and self.fading is None:
+            return x * numpy.complex64(self._taps[0])
+        xx = numpy.concatenate((self._history, x))
+        n = len(x)
+        if self.fading is not None:
+            gains = self.gains(self._n, n)
+        y = numpy.zeros(n, numpy.complex64)
+        for (k, d) in enumerate(self._delays):
+            if self.fading is not None:
+                y += gains[k] * xx[D - d:D - d + n]
+            else:
+                y += numpy.complex64(self._taps[k]) * xx[D - d:D - d + n]
+        if D:
+            self._history = xx[-D:]
+        return y
+
+    def _resample(self, x):
+        if self.clock_ratio == 1.0 and self.clock_drift == 0.0:
+            return x
+        buf = numpy.concatenate((self._buf, x))
+        # outputs whose four neighbours are in buf (one before, two after)
+        r = self.clock_ratio
+        k = int((len(buf) - 2 - self._t) / r) + 2
+        ratios = r + self.clock_drift * numpy.arange(k)
+        pos = self._t + numpy.concatenate(([0.0], numpy.cumsum(ratios[:-1])))
+        k = numpy.searchsorted(pos, len(buf) - 2)
+        pos = pos[:k]
+        i = pos.astype(numpy.int_)
+        mu = (pos - i).astype(numpy.float32)
+        # cubic (Lagrange) through samples i - 1 .. i + 2
+        c0 = -mu * (mu - 1) * (mu - 2) / 6
+        c1 = (mu + 1) * (mu - 1) * (mu - 2) / 2
+        c2 = -(mu + 1) * mu * (mu - 2) / 2
+        c3 = (mu + 1) * mu * (mu - 1) / 6
+        y = c0 * buf[i - 1]
+        y += c1 * buf[i]
+        y += c2 * buf[i + 1]
+        y += c3 * buf[i + 2]
+        if k > 0:
+            t = pos[-1] + ratios[k - 1]
+            self.clock_ratio = ratios[k - 1] + self.clock_drift
+        else:
+            t = self._t
+        keep = int(t) - 1
+        self._buf = buf[keep:]
+        self._t = t - keep
+        return y
+
+    def process(self, x):
+        """
+        Put a block of samples through the channel
+
+        @param x: complex samples
+        @returns complex64 samples (len(x) / clock_ratio of them, give or take)
+        """
+        x = numpy.asarray(x, numpy.complex64)
+        y = self._multipath(x)
+        self._n += len(x)
+        y = self._resample(y)
+        n = len(y)
+        if self.frequency_offset != 0.0 or self.phase_noise != 0.0:
+            phase = self._carrier + 2 * math.pi * self.frequency_offset * numpy.arange(n)
+            self._carrier = (self._carrier + 2 * math.pi * self.frequency_offset * n) % (2 * math.pi)
+            if self.phase_noise != 0.0:
+                walk = self._phase + numpy.cumsum(self._phase_rng.standard_normal(n) * self.phase_noise)
+                if n:
+                    self._phase = walk[-1] % (2 * math.pi)
+                phase += walk
+            phase = (phase % (2 * math.pi)).astype(numpy.float32)
+            turn = numpy.empty(n, numpy.complex64)
+            turn.real = numpy.cos(phase)
+            turn.imag = numpy.sin(phase)
+            y = y * turn
+        if self.noise_voltage != 0.0:
+            noise = self._noise_rng.standard_normal(2 * n).astype(numpy.float32)
+            noise *= self.noise_voltage
+            y = y + noise.view(numpy.complex64)
+        return y
+
+
+class numpy_channel(gr.hier_block2):
+    """
+    A channel_emulator in a flow graph
+    """
+    def __init__(self, emulator):
+        """
+        @param emulator: channel_emulator
+        """
+        gr.hier_block2.__init__(self, "numpy_channel",
+                                gr.io_signature(1, 1, gr.sizeof_gr_complex),
+                                gr.io_signature(1, 1, gr.sizeof_gr_complex))
+        self.emulator = emulator
+        # both queues are bounded, so a slow side holds up the other instead
+        # of samples piling up
+        self._in_q = gr.msg_queue(16)
+        self._out_q = gr.msg_queue(16)
+        self.connect(self, gr.message_sink(gr.sizeof_gr_complex, self._in_q, False))
+        self.connect(gr.message_source(gr.sizeof_gr_complex, self._out_q), self)
+        self._last = 0                   # when the last block came in
+        worker = threading.Thread(target=self._run)
+        worker.setDaemon(True)
+        worker.start()
+
+    def _run(self):
+        while True:
+            msg = self._in_q.delete_head()
+            if msg.type() == 1:          # from eof()
+                self._out_q.insert_tail(gr.message(1))
+                break
+            self._last = time.time()
+            y = self.emulator.process(numpy.fromstring(msg.to_string(), numpy.complex64))
+            self._out_q.insert_tail(gr.message_from_string(y.tostring()))
+
+    def eof(self, idle=1.0):
+        """
+        End the output once the input has ended, so the blocks after this one
+        finish (the message sink doesn't pass the end of the input on). Call
+        it after the last samples have been sent upstream; it waits until no
+        samples have come in for idle seconds, and the end follows the blocks
+        still to go through.
+
+        @param idle: seconds without samples taken as the end of the input
+        """
+        called = time.time()
+        while self._in_q.count() or time.time() - max(self._last, called) < idle:
+            time.sleep(idle / 10)
+        self._in_q.insert_tail(gr.message(1))
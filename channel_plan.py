@@ -0,0 +1,185 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Channel Plan
+#
+# FuNLab
+# University of Washington
+#
+# The set of channels the sense path sweeps, the MAC picks from and the
+# simulated primary hops between. A plan is either read from a file, one
+# channel per line:
+#
+#   # center freq   name (optional)
+#   539M            ch25
+#   545M            ch26
+#   551000000       ch27
+#
+# or made from a band (--start-freq/--end-freq) cut into --chan-bandwidth wide
+# channels. Without either the original six test channels are used.
+#
+# Channels are kept sorted by frequency, so finding the channel a frequency
+# falls in, the channels next to it, or where a sweep should resume are all
+# bisections (O(log n)).
+# /////////////////////////////////////////////////////////////////////////////
+
+import bisect
+
+# the channels the testbed has always used
+DEFAULT_CHANNELS = [600000000, 620000000, 625000000, 640000000, 645000000, 650000000]
+
+_suffixes = {"k": 1e3, "K": 1e3, "M": 1e6, "G": 1e9}
+
+
+def parse_freq(text):
+    """
+    Parse a frequency like 600000000, 600e6 or 600M
+    """
+    text = text.strip()
+    if text and text[-1] in _suffixes:
+        return float(text[:-1]) * _suffixes[text[-1]]
+    return float(text)
+
+
+class channel_plan(object):
+    """
+    A sorted set of channel center frequencies
+    """
+    def __init__(self, freqs, bandwidth=6e6, names=None):
+        """
+        @param freqs: channel center frequencies in Hz
+        @param bandwidth: width of a channel in Hz
+        @param names: optional list of channel names, parallel to freqs
+        """
+        if names is None:
+            names = [None] * len(freqs)
+        if len(names) != len(freqs):
+            raise ValueError, "need one name per channel"
+        pairs = {}
+        for (f, n) in zip(freqs, names):
+            pairs[int(round(f))] = n
+        if len(pairs) == 0:
+            raise ValueError, "channel plan is empty"
+        self.freqs = sorted(pairs.keys())
+        self.names = [pairs[f] for f in self.freqs]
+        self.bandwidth = bandwidth
+
+    def __len__(self):
+        return len(self.freqs)
+
+    def __getitem__(self, i):
+        return self.freqs[i]
+
+    def __iter__(self):
+        return iter(self.freqs)
+
+    def name(self, i):
+        """
+        Return the name of channel i (its frequency if it has none)
+        """
+        return self.names[i] or "%g MHz" % (self.freqs[i] / 1e6,)
+
+    def index_of(self, freq):
+        """
+        Return the index of the channel freq falls in, or None if it isn't in
+        any channel.
+        """
+        i = bisect.bisect_left(self.freqs, freq)
+        best = None
+        for j in (i - 1, i):
+            if 0 <= j < len(self.freqs) and abs(self.freqs[j] - freq) <= self.bandwidth / 2.0:
+                if best is None or abs(self.freqs[j] - freq) < abs(self.freqs[best] - freq):
+                    best = j
+        return best
+
+    def channel_of(self, freq):
+        """
+        Return the center frequency of the channel freq falls in, or None
+        """
+        i = self.index_of(freq)
+        if i is None:
+            return None
+        return self.freqs[i]
+
+    def adjacent(self, i):
+        """
+        Return the indices of the channels next to channel i (closer than
+        one and a half channel widths, so they share an edge or overlap).
+        """
+        f = self.freqs[i]
+        reach = 1.5 * self.bandwidth
+        lo = bisect.bisect_left(self.freqs, f - reach)
+        hi = bisect.bisect_right(self.freqs, f + reach)
+        return [j for j in range(lo, hi) if j != i]
+
+    def in_band(self, start_freq, end_freq):
+        """
+        Return the indices of the channels with centers in [start_freq, end_freq]
+        """
+        lo = bisect.bisect_left(self.freqs, start_freq)
+        hi = bisect.bisect_right(self.freqs, end_freq)
+        return range(lo, hi)
+
+    def next_index(self, freq):
+        """
+        Return the index of the first channel above freq (wrapping around),
+        which is where a sweep that was at freq carries on.
+        """
+        return bisect.bisect_right(self.freqs, freq) % len(self.freqs)
+
+    def __repr__(self):
+        return "channel_plan(%d channels, %g-%g MHz)" % \
+               (len(self), self.freqs[0] / 1e6, self.freqs[-1] / 1e6)
+
+
+def from_band(start_freq, end_freq, step):
+    """
+    Cut [start_freq, end_freq] into channels step wide
+    """
+    if start_freq > end_freq:
+        start_freq, end_freq = end_freq, start_freq   # swap them
+    nsteps = int((end_freq - start_freq) / step + 1e-9)
+    if nsteps < 1:
+        raise ValueError, "band %g-%g is narrower than one channel" % (start_freq, end_freq)
+    return channel_plan([start_freq + step/2.0 + i*step for i in range(nsteps)], step)
+
+def from_file(filename, bandwidth=6e6):
+    """
+    Read a channel plan file (see the top of this file)
+    """
+    freqs = []
+    names = []
+    f = open(filename, "r")
+    try:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if not line:
+                continue
+            fields = line.split(None, 1)
+            freqs.append(parse_freq(fields[0]))
+            if len(fields) > 1:
+                names.append(fields[1].strip())
+            else:
+                names.append(None)
+    finally:
+        f.close()
+    return channel_plan(freqs, bandwidth, names)
+
+def make_plan(filename=None, start_freq=None, end_freq=None, bandwidth=6e6):
+    """
+    Return the plan from a file, else from a band, else the default channels
+    """
+    if filename:
+        return from_file(filename, bandwidth)
+    if start_freq is not None and end_freq is not None:
+        return from_band(start_freq, end_freq, bandwidth)
+    return channel_plan(DEFAULT_CHANNELS, bandwidth)
+
+def add_options(normal, expert):
+    """
+    Adds channel plan options to the Options Parser
+    """
+    normal.add_option("", "--channel-plan", type="string", default=None, metavar="FILE",
+                      help="read the channels to use from FILE [default=%default]")
+    normal.add_option("", "--start-freq", type="eng_float", default=None,
+                      help="set the start of the frequency band to sense over [default=%default]")
+    normal.add_option("", "--end-freq", type="eng_float", default=None,
+                      help="set the end of the frequency band to sense over [default=%default]")
@@ -0,0 +1,222 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Cooperative Sensing
+#
+# FuNLab
+# University of Washington
+#
+# Lets qpCSMA/CA nodes share what they sense so each one only has to sense a
+# few channels per quiet period.
+#
+# After a quiet period a node broadcasts a sensing report to the reserved
+# address 'y'. The report is a string of fixed size records, one per channel
+# sensed:
+#
+#   count    B     number of records
+#   freq     I     center frequency in kHz          \
+#   power    h     average power in 1/100 dB         > per record
+#   age      H     ms between the measurement and    /
+#                  sending the report
+#
+# Ages are used instead of timestamps so the nodes' clocks don't need to agree.
+#
+# Every node keeps the latest measurement per (channel, node), its own
+# included, and fuses the fresh ones into a busy/idle view:
+#
+#   or     busy if any node saw power over the threshold
+#   and    busy if all of them did
+#   kofn   busy if at least k did (all of them if fewer than k reported)
+#   soft   busy if the average (linear) power is over the threshold
+#
+# sense_schedule hands each node its share of the channels for each quiet
+# period, rotating so every channel gets sensed by someone.
+# /////////////////////////////////////////////////////////////////////////////
+
+import math
+import struct
+
+REPORT_ADDRESS = 'y'
+
+FUSION_MODES = ("or", "and", "kofn", "soft")
+
+_header = struct.Struct("!B")
+_record = struct.Struct("!IhH")
+MAX_RECORDS = 255
+
+
+def encode_report(measurements, now):
+    """
+    Pack measurements into a report body.
+
+    @param measurements: list of (freq, power_db, measured_at)
+    @param now: time the report is sent
+    @returns report string (without the addresses)
+    """
+    if len(measurements) > MAX_RECORDS:
+        raise ValueError, "at most %d measurements per report" % (MAX_RECORDS,)
+    parts = [_header.pack(len(measurements))]
+    for (freq, power_db, t) in measurements:
+        power = int(round(power_db * 100))
+        power = max(-32768, min(32767, power))
+        age = int(round((now - t) * 1000))
+        age = max(0, min(65535, age))
+        parts.append(_record.pack(int(round(freq / 1e3)), power, age))
+    return "".join(parts)
+
+def decode_report(data, now):
+    """
+    Unpack a report body.
+
+    @param data: report string (without the addresses)
+    @param now: time the report was received
+    @returns list of (freq, power_db, measured_at)
+    """
+    if len(data) < _header.size:
+        raise ValueError, "short sensing report"
+    (count,) = _header.unpack_from(data, 0)
+    if len(data) != _header.size + count * _record.size:
+        raise ValueError, "sensing report length doesn't match its count"
+    out = []
+    offset = _header.size
+    for i in range(count):
+        (freq, power, age) = _record.unpack_from(data, offset)
+        out.append((freq * 1e3, power / 100.0, now - age / 1000.0))
+        offset += _record.size
+    return out
+
+
+class occupancy_view(object):
+    """
+    The fused busy/idle state of each channel
+    """
+    def __init__(self, threshold, mode="or", k=2, max_age=1.0):
+        """
+        @param threshold: power (dB) over which a channel is busy
+        @param mode: one of FUSION_MODES
+        @param k: for kofn, how many nodes have to see the channel busy
+        @param max_age: measurements older than this (s) are ignored
+        """
+        if mode not in FUSION_MODES:
+            raise ValueError, "unknown fusion mode %s" % (mode,)
+        self.threshold = threshold
+        self.mode = mode
+        self.k = k
+        self.max_age = max_age
+        self._reports = {}         # freq -> {node: (power_db, measured_at)}
+
+    def add(self, node, freq, power_db, t):
+        """
+        Record a measurement of freq by node taken at time t
+        """
+        freq = int(round(freq))
+        reports = self._reports.setdefault(freq, {})
+        old = reports.get(node)
+        if old is None or old[1] <= t:
+            reports[node] = (power_db, t)
+
+    def add_report(self, node, data, now):
+        """
+        Record every measurement in a received report. Returns how many there
+        were; malformed reports are dropped.
+        """
+        try:
+            measurements = decode_report(data, now)
+        except (ValueError, struct.error):
+            return 0
+        for (freq, power_db, t) in measurements:
+            self.add(node, freq, power_db, t)
+        return len(measurements)
+
+    def fresh(self, freq, now):
+        """
+        Return the measurements of freq younger than max_age as {node: power_db}
+        """
+        out = {}
+        for (node, (power_db, t)) in self._reports.get(int(round(freq)), {}).items():
+            if now - t <= self.max_age:
+                out[node] = power_db
+        return out
+
+    def fuse(self, freq, now):
+        """
+        Return True (busy), False (idle) or None (no fresh measurements)
+        """
+        powers = self.fresh(freq, now).values()
+        if len(powers) == 0:
+            return None
+        if self.mode == "soft":
+            mean = sum([10**(p/10.0) for p in powers]) / len(powers)
+            return 10*math.log10(mean) > self.threshold
+        busy = len([p for p in powers if p > self.threshold])
+        if self.mode == "or":
+            return busy > 0
+        if self.mode == "and":
+            return busy == len(powers)
+        return busy >= min(self.k, len(powers))
+
+    def level(self, freq, now):
+        """
+        Return the average fresh power of freq in dB (None if there is none)
+        """
+        powers = self.fresh(freq, now).values()
+        if len(powers) == 0:
+            return None
+        return 10*math.log10(sum([10**(p/10.0) for p in powers]) / len(powers))
+
+    def idle_channels(self, channels, now):
+        """
+        Return the channels the view says are idle, as (level, freq) sorted
+        quietest first
+        """
+        out = []
+        for freq in channels:
+            if self.fuse(freq, now) is False:
+                out.append((self.level(freq, now), freq))
+        out.sort()
+        return out
+
+
+class sense_schedule(object):
+    """
+    Which channels one node senses in each quiet period
+    """
+    def __init__(self, channels, node_index, num_nodes, share):
+        """
+        @param channels: all channel center frequencies
+        @param node_index: this node's index, 0 <= node_index < num_nodes
+        @param num_nodes: nodes sharing the sensing
+        @param share: channels this node senses per quiet period
+        """
+        if not 0 <= node_index < num_nodes:
+            raise ValueError, "node index must be in [0, %d)" % (num_nodes,)
+        self.channels = list(channels)
+        self.share = max(1, min(share, len(self.channels)))
+        # spread the nodes' starting points evenly over the channels
+        self._next = (node_index * len(self.channels)) // num_nodes
+
+    def next(self):
+        """
+        Return the channels to sense in the next quiet period
+        """
+        n = len(self.channels)
+        out = [self.channels[(self._next + i) % n] for i in range(self.share)]
+        self._next = (self._next + self.share) % n
+        return out
+
+
+def add_options(normal, expert):
+    """
+    Adds cooperative sensing options to the Options Parser
+    """
+    expert.add_option("", "--coop-sense", type="choice", choices=("none",) + FUSION_MODES,
+                      default="none",
+                      help="share sensing reports with other nodes and fuse them: none, or, and, kofn or soft [default=%default]")
+    expert.add_option("", "--coop-k", type="int", default=2,
+                      help="nodes that must see a channel busy for kofn fusion [default=%default]")
+    expert.add_option("", "--coop-nodes", type="int", default=2,
+                      help="number of nodes sharing the sensing [default=%default]")
+    expert.add_option("", "--coop-index", type="int", default=0,
+                      help="this node's index among them [default=%default]")
+    expert.add_option("", "--coop-share", type="int", default=1,
+                      help="extra channels this node senses per quiet period [default=%default]")
+    expert.add_option("", "--coop-max-age", type="eng_float", default=2.0,
+                      help="ignore sensing reports older than this many seconds [default=%default]")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Cooperative Sensing Simulation
+#
+# FuNLab
+# University of Washington
+#
+# Simulates a group of qpCSMA/CA nodes sensing a band with on/off primaries
+# and compares
+#   - standalone, every channel: each node senses all channels every quiet
+#     period (what find_best_freq costs)
+#   - standalone, share: each node senses only --share channels per quiet
+#     period, round robin, on its own
+#   - cooperative: each node senses --share channels, broadcasts a report
+#     (coop_sense.py) and fuses everyone's reports with or/and/kofn/soft
+#
+# Each node sees each primary through its own shadowing, so a channel that
+# looks idle to one node can be busy for another. After every quiet period
+# each node's view of every channel is checked against the truth.
+#
+# For each mode this prints the sensing airtime per node and quiet period,
+# the airtime spent sending reports, the detection and false alarm rates of
+# the nodes' views, and how often a node had no fresh information at all.
+#
+# python coop_sense_sim.py --nodes=6 --share=5
+# /////////////////////////////////////////////////////////////////////////////
+
+from optparse import OptionParser
+import math
+import random
+
+import channel_plan
+import coop_sense
+
+
+class band(object):
+    """
+    Primaries turning on and off on each channel (two state Markov)
+    """
+    def __init__(self, channels, mean_on, mean_off, rng):
+        self.channels = channels
+        self.mean_on = mean_on
+        self.mean_off = mean_off
+        self.rng = rng
+        p_on = mean_on / float(mean_on + mean_off)
+        self.on = dict([(c, rng.random() < p_on) for c in channels])
+
+    def step(self, dt):
+        for c in self.channels:
+            if self.on[c]:
+                if self.rng.random() < dt / self.mean_on:
+                    self.on[c] = False
+            elif self.rng.random() < dt / self.mean_off:
+                self.on[c] = True
+
+
+class sim_node(object):
+    """
+    One node: its shadowing, its schedule and its view of the band
+    """
+    def __init__(self, index, channels, options, mode, rng):
+        self.index = index
+        self.address = chr(ord('a') + index)
+        self.channels = channels
+        self.options = options
+        self.rng = rng
+        # received primary SNR (dB) per channel, with log-normal shadowing
+        self.snr = dict([(c, rng.gauss(options.snr, options.shadowing)) for c in channels])
+        if mode == "full":
+            share = len(channels)
+        else:
+            share = options.share
+        nodes = options.nodes
+        if mode == "alone":
+            # on its own: rotate through every channel, no one to share with
+            (index, nodes) = (0, 1)
+        self.schedule = coop_sense.sense_schedule(channels, index, nodes, share)
+        fusion = mode in coop_sense.FUSION_MODES and mode or "or"
+        max_age = options.max_age
+        if mode in ("full", "alone"):
+            # only our own measurements, kept until we sense the channel again
+            max_age = options.qp_period * math.ceil(len(channels) / float(share)) + 1e-6
+        self.view = coop_sense.occupancy_view(options.threshold, fusion, options.k, max_age)
+        self.sense_time = 0.0
+        self.report_time = 0.0
+
+    def measure(self, band, freq):
+        """
+        Average power (dB, noise = 0 dB) the energy detector reports for freq
+        """
+        power = 1.0
+        if band.on[freq]:
+            power += 10**(self.snr[freq] / 10.0)
+        return 10*math.log10(power) + self.rng.gauss(0, self.options.meas_std)
+
+    def quiet_period(self, band, now):
+        """
+        Sense this quiet period's share and return the report body
+        """
+        measurements = []
+        for freq in self.schedule.next():
+            self.sense_time += self.options.tune + self.options.dwell
+            level = self.measure(band, freq)
+            self.view.add(self.address, freq, level, now)
+            measurements.append((freq, level, now))
+        return coop_sense.encode_report(measurements, now)
+
+
+def run(mode, channels, options):
+    rng = random.Random(options.seed)
+    primaries = band(channels, options.mean_on, options.mean_off, rng)
+    nodes = [sim_node(i, channels, options, mode, rng) for i in range(options.nodes)]
+    cooperative = mode in coop_sense.FUSION_MODES
+
+    counts = {"tp": 0, "fn": 0, "fp": 0, "tn": 0, "stale": 0}
+    t = 0.0
+    qps = 0
+    while t < options.duration:
+        reports = [(n, n.quiet_period(primaries, t)) for n in nodes]
+        if cooperative:
+            for (sender, report) in reports:
+                # addresses plus the report, plus the fixed frame overhead
+                nbytes = 2 + len(report)
+                sender.report_time += options.frame_overhead + nbytes * 8.0 / options.bitrate
+                for n in nodes:
+                    if n is not sender and rng.random() >= options.report_loss:
+                        n.view.add_report(sender.address, report, t)
+        for n in nodes:
+            for c in channels:
+                busy = n.view.fuse(c, t)
+                if busy is None:
+                    counts["stale"] += 1
+                elif primaries.on[c]:
+                    counts[busy and "tp" or "fn"] += 1
+                else:
+                    counts[busy and "fp" or "tn"] += 1
+        qps += 1
+        t += options.qp_period
+        primaries.step(options.qp_period)
+
+    sense = sum([n.sense_time for n in nodes]) / (len(nodes) * qps)
+    report = sum([n.report_time for n in nodes]) / (len(nodes) * qps)
+    pd = counts["tp"] / float(max(1, counts["tp"] + counts["fn"]))
+    pfa = counts["fp"] / float(max(1, counts["fp"] + counts["tn"]))
+    stale = counts["stale"] / float(len(nodes) * len(channels) * qps)
+    return (sense, report, pd, pfa, stale)
+
+def main():
+    parser = OptionParser()
+    parser.add_option("", "--nodes", type="int", default=6,
+                      help="number of nodes [default=%default]")
+    parser.add_option("", "--share", type="int", default=5,
+                      help="channels each node senses per quiet period [default=%default]")
+    parser.add_option("", "--modes", type="string", default="full,alone,or,and,kofn,soft",
+                      help="comma-separated modes to run [default=%default]")
+    parser.add_option("", "--k", type="int", default=2,
+                      help="k for kofn fusion [default=%default]")
+    parser.add_option("", "--channel-plan", type="string", default=None,
+                      help="read the channels from a channel plan file [default=%default]")
+    parser.add_option("", "--start-freq", type="float", default=470e6,
+                      help="start of the band to cut into channels [default=%default]")
+    parser.add_option("", "--end-freq", type="float", default=650e6,
+                      help="end of the band to cut into channels [default=%default]")
+    parser.add_option("", "--chan-bandwidth", type="float", default=6e6,
+                      help="channel width [default=%default]")
+    parser.add_option("", "--mean-on", type="float", default=30.0,
+                      help="mean time a primary stays on [default=%default]")
+    parser.add_option("", "--mean-off", type="float", default=60.0,
+                      help="mean time a channel stays free [default=%default]")
+    parser.add_option("", "--snr", type="float", default=0.0,
+                      help="mean primary SNR at the nodes in dB [default=%default]")
+    parser.add_option("", "--shadowing", type="float", default=8.0,
+                      help="std of the per node shadowing in dB [default=%default]")
+    parser.add_option("", "--meas-std", type="float", default=.5,
+                      help="std of a power measurement in dB [default=%default]")
+    parser.add_option("", "--threshold", type="float", default=1.5,
+                      help="busy threshold in dB over the noise floor [default=%default]")
+    parser.add_option("", "--qp-period", type="float", default=.5,
+                      help="time between quiet periods [default=%default]")
+    parser.add_option("", "--max-age", type="float", default=1.5,
+                      help="ignore reports older than this [default=%default]")
+    parser.add_option("", "--tune", type="float", default=.005,
+                      help="time to retune [default=%default]")
+    parser.add_option("", "--dwell", type="float", default=.01,
+                      help="time to sense one channel [default=%default]")
+    parser.add_option("", "--bitrate", type="float", default=500e3,
+                      help="bitrate the reports are sent at [default=%default]")
+    parser.add_option("", "--frame-overhead", type="float", default=.0005,
+                      help="airtime of a frame on top of its bytes [default=%default]")
+    parser.add_option("", "--report-loss", type="float", default=.05,
+                      help="probability a report is lost [default=%default]")
+    parser.add_option("", "--duration", type="float", default=600.0,
+                      help="seconds to simulate [default=%default]")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    (options, args) = parser.parse_args()
+
+    channels = channel_plan.make_plan(options.channel_plan, options.start_freq,
+                                      options.end_freq, options.chan_bandwidth).freqs
+    names = {"full": "standalone, every channel", "alone": "standalone, share"}
+
+    print "%d nodes, %d channels, %d channels per node and quiet period" % \
+          (options.nodes, len(channels), options.share)
+    print "%-26s %10s %10s %7s %7s %7s" % ("mode", "sensing", "reports", "Pd", "Pfa", "stale")
+    print "%-26s %10s %10s %7s %7s %7s" % ("", "(ms/QP)", "(ms/QP)", "", "", "")
+    for mode in options.modes.split(","):
+        (sense, report, pd, pfa, stale) = run(mode, channels, options)
+        print "%-26s %10.1f %10.2f %7.3f %7.4f %7.3f" % \
+              (names.get(mode, "cooperative, " + mode), sense*1e3, report*1e3, pd, pfa, stale)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
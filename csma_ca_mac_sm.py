@@ -104,12 +104,13 @@ class cs_mac(threading.Thread):
     def set_error_array(self, array):
     	self.err_array = array
 
-    def phy_rx_callback(self, ok, payload):
+    def phy_rx_callback(self, ok, payload, meta=None):
         """
         Invoked by thread associated with PHY to pass received packet up.
 
         @param ok: bool indicating whether payload CRC was OK
         @param payload: contents of the packet (string)
+        @param meta: rx_metadata of the packet (--rx-metadata), or None
         """
         #if the rcvd packet is empty or from this node, ignore it completely
         if len(payload) == 0 or (payload[1] == self.address):
@@ -201,7 +202,7 @@ class cs_mac(threading.Thread):
                          log_file = open('csma_ca_mac_log.dat', 'w')
                          log_file.write("TX:" + self.sender + self.address + "CTS")
                          log_file.close()
-                    self.tb.txpath.send_pkt(self.sender + self.address + "CTS")
+                    self.tb.txpath.send_ctl(self.sender + self.address + "CTS")
                     self.state = 6
                     self.next_call = self.SIFS_time + self.ctl_pkt_time
                     #threading.Timer(self.ctl_pkt_time, self.state_machine).start()
@@ -243,7 +244,7 @@ class cs_mac(threading.Thread):
                         log_file = open('csma_ca_mac_log.dat', 'w')
                         log_file.write("TX:" + self.tx_queue[0][0] + self.address + "RTS")
                         log_file.close()
-                    self.tb.txpath.send_pkt(self.tx_queue[0][0] + self.address + "RTS")
+                    self.tb.txpath.send_ctl(self.tx_queue[0][0] + self.address + "RTS")
                     self.tx_tries += 1
                     self.state = 4
                     self.next_call = self.SIFS_time + self.ctl_pkt_time
@@ -294,7 +295,7 @@ class cs_mac(threading.Thread):
                     log_file = open('csma_ca_mac_log.dat', 'w')
                     log_file.write("TX:" + self.sender + self.address + "ACK")
                     log_file.close()
-                self.tb.txpath.send_pkt(self.sender + self.address + "ACK")
+                self.tb.txpath.send_ctl(self.sender + self.address + "ACK")
             self.state = 0
             self.next_call = "NOW"#self.SIFS_time
         else:
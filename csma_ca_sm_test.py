@@ -284,6 +284,8 @@ def main():
 
     tb.start()    # Start executing the flow graph (runs in separate threads)
 
+    tb.rxpath.calibrate_noise_floor(options.calibrate_time)    # --auto-threshold
+
     mac.start()
     
     print  time.strftime("%X")
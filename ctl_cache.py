@@ -0,0 +1,108 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Control Frame Cache
+#
+# FuNLab
+# University of Washington
+#
+# RTS, CTS and ACK frames are the same few bytes every time for a given pair
+# of nodes, so there is no need to run them through the modulator (framing,
+# CRC, mapping, IFFT, cyclic prefix, preamble) each time one has to go out.
+# ctl_cache modulates each control frame once, with its own blks2.ofdm_mod in
+# a throwaway flow graph, and keeps the complex baseband samples. With
+# --ctl-cache transmit_path.send_ctl puts the cached samples straight into
+# the TX stream (see transmit_path.py).
+#
+# The samples are what ofdm_mod produces for the payload with the same
+# options, except for the random symbols it fills the rest of the last OFDM
+# symbol with.
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr, blks2
+
+import copy
+import threading
+
+import numpy
+
+# from current dir
+import ofdm_solver
+
+
+class ctl_cache(object):
+    """
+    Modulated samples of control frames, keyed by payload
+    """
+    def __init__(self, options):
+        """
+        @param options: the OFDM options the transmit path was built with
+        """
+        self.options = copy.copy(options)
+        self.options.log = False
+        self.symbol_len = options.fft_length + options.cp_length
+        self.bits = ofdm_solver.BITS_PER_SYMBOL[options.modulation]
+        self._cache = {}             # payload -> samples (complex64 string)
+        self._wanted = set()         # payloads waiting to be modulated
+        self._lock = threading.Lock()
+
+    def get(self, payload):
+        """
+        Return the cached samples of payload, or None (and modulate it in the
+        background so it's there next time)
+        """
+        samples = self._cache.get(payload)
+        if samples is None:
+            self._lock.acquire()
+            start = len(self._wanted) == 0
+            self._wanted.add(payload)
+            self._lock.release()
+            if start:
+                t = threading.Thread(target=self._fill)
+                t.setDaemon(True)
+                t.start()
+        return samples
+
+    def precompute(self, payloads):
+        """
+        Modulate every payload that isn't cached yet (blocks until done)
+        """
+        missing = [p for p in payloads if p not in self._cache]
+        if len(missing) > 0:
+            self._cache.update(self.modulate(missing))
+
+    def _fill(self):
+        while True:
+            self._lock.acquire()
+            wanted = list(self._wanted)
+            self._lock.release()
+            if len(wanted) == 0:
+                return
+            self.precompute(wanted)
+            self._lock.acquire()
+            self._wanted.difference_update(wanted)
+            self._lock.release()
+
+    def modulate(self, payloads):
+        """
+        Run payloads through a blks2.ofdm_mod of their own
+
+        @returns {payload: samples (complex64 string)}
+        """
+        tb = gr.top_block()
+        mod = blks2.ofdm_mod(self.options, msgq_limit=len(payloads) + 1, pad_for_usrp=False)
+        sink = gr.vector_sink_c()
+        tb.connect(mod, sink)
+        for payload in payloads:
+            mod.send_pkt(payload)
+        mod.send_pkt(eof=True)
+        tb.run()
+        data = numpy.array(sink.data(), numpy.complex64)
+        out = {}
+        offset = 0
+        for payload in payloads:
+            n = ofdm_solver.frame_symbols(len(payload), self.options.occupied_tones,
+                                          self.bits) * self.symbol_len
+            out[payload] = data[offset:offset + n].tostring()
+            offset += n
+        if offset != len(data):
+            raise RuntimeError, "modulator produced %d samples, expected %d" % (len(data), offset)
+        return out
@@ -0,0 +1,189 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           IQ Capture Files
+#
+# FuNLab
+# University of Washington
+#
+# Reading (and describing) recorded IQ captures without GNU Radio.
+#
+# A capture is a raw sample file plus a JSON sidecar with the same name and a
+# ".json" extension:
+#
+#   capture.dat       raw samples
+#   capture.dat.json  {"format": "int16", "scale": 32767.0, "samp_rate": 800000,
+#                      "center_freq": 620000000, "start_time": 1306886400.0,
+#                      "timestamps": [[0, 1306886400.0], [8000000, 1306886410.5]]}
+#
+# format is one of complex64 (what gr.file_sink writes), int16 or int8 (I/Q
+# interleaved). Integer samples are divided by scale to get back to floats.
+# timestamps is optional and only needed when the capture has gaps; each
+# entry gives the time of the sample at that offset.
+#
+# Captures are memory-mapped, so multi-gigabyte files can be sliced without
+# reading them into memory.
+# /////////////////////////////////////////////////////////////////////////////
+
+import bisect
+import json
+import os
+
+import numpy
+
+# format name -> (raw dtype, raw values per complex sample)
+FORMATS = {
+    "complex64" : (numpy.complex64, 1),
+    "int16"     : (numpy.int16, 2),
+    "int8"      : (numpy.int8, 2),
+    }
+
+_default_scale = {"complex64": 1.0, "int16": 32767.0, "int8": 127.0}
+
+
+def metadata_filename(filename):
+    return filename + ".json"
+
+def read_metadata(filename):
+    """
+    Return the sidecar metadata of a capture as a dict ({} if there is none)
+    """
+    try:
+        f = open(metadata_filename(filename), "r")
+    except IOError:
+        return {}
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+def write_metadata(filename, samp_rate, center_freq=0, start_time=0.0,
+                   format="complex64", scale=None, timestamps=None, **extra):
+    """
+    Write the sidecar metadata for a capture.
+
+    @param filename: the capture (not the sidecar) file name
+    @param samp_rate: sample rate in samples/sec
+    @param center_freq: center frequency in Hz
+    @param start_time: time of the first sample (seconds since the epoch)
+    @param format: complex64, int16 or int8
+    @param scale: integer full scale (defaults to the format maximum)
+    @param timestamps: list of [sample_offset, time] pairs, or None
+    """
+    if format not in FORMATS:
+        raise ValueError, "unknown capture format %s" % (format,)
+    meta = dict(extra)
+    meta.update({"samp_rate": samp_rate,
+                 "center_freq": center_freq,
+                 "start_time": start_time,
+                 "format": format,
+                 "scale": scale or _default_scale[format]})
+    if timestamps:
+        meta["timestamps"] = timestamps
+    f = open(metadata_filename(filename), "w")
+    try:
+        json.dump(meta, f, indent=1)
+    finally:
+        f.close()
+
+
+class iq_capture(object):
+    """
+    A memory-mapped IQ capture and its metadata
+    """
+    def __init__(self, filename, samp_rate=None, center_freq=None, format=None):
+        """
+        Values given here override the ones in the sidecar.
+
+        @param filename: raw sample file
+        @param samp_rate: sample rate in samples/sec
+        @param center_freq: center frequency in Hz
+        @param format: complex64, int16 or int8
+        """
+        meta = read_metadata(filename)
+        self.filename = filename
+        self.format = format or meta.get("format", "complex64")
+        if self.format not in FORMATS:
+            raise ValueError, "unknown capture format %s" % (self.format,)
+        self.samp_rate = float(samp_rate or meta.get("samp_rate", 0))
+        self.center_freq = float(center_freq or meta.get("center_freq", 0))
+        self.start_time = float(meta.get("start_time", 0.0))
+        self.scale = float(meta.get("scale", _default_scale[self.format]))
+        self.metadata = meta
+
+        # timestamps, kept as two sorted lists for bisect
+        stamps = meta.get("timestamps") or [[0, self.start_time]]
+        stamps.sort()
+        self._stamp_offsets = [int(s[0]) for s in stamps]
+        self._stamp_times = [float(s[1]) for s in stamps]
+
+        (dtype, self._width) = FORMATS[self.format]
+        if os.path.getsize(filename) == 0:
+            self._raw = numpy.zeros(0, dtype)
+        else:
+            self._raw = numpy.memmap(filename, dtype=dtype, mode="r")
+
+    def __len__(self):
+        return len(self._raw) // self._width
+
+    def duration(self):
+        if self.samp_rate == 0:
+            return 0.0
+        return len(self) / self.samp_rate
+
+    def raw(self, start=0, stop=None):
+        """
+        Return the raw (not scaled) values for samples start..stop
+        """
+        if stop is None or stop > len(self):
+            stop = len(self)
+        return self._raw[start*self._width : stop*self._width]
+
+    def samples(self, start=0, stop=None):
+        """
+        Return samples start..stop as complex64.
+
+        complex64 captures come back as a view into the memory map; integer
+        captures are converted.
+        """
+        raw = self.raw(start, stop)
+        if self._width == 1:
+            return raw
+        iq = numpy.array(raw, dtype=numpy.float32)
+        iq *= 1.0 / self.scale
+        return iq.view(numpy.complex64)
+
+    def chunks(self, chunk_size, start=0, stop=None):
+        """
+        Yield (offset, samples) in blocks of chunk_size samples.
+        """
+        if stop is None or stop > len(self):
+            stop = len(self)
+        offset = start
+        while offset < stop:
+            end = min(offset + chunk_size, stop)
+            yield (offset, self.samples(offset, end))
+            offset = end
+
+    def time_at(self, index):
+        """
+        Return the time the sample at index was taken
+        """
+        i = bisect.bisect_right(self._stamp_offsets, index) - 1
+        if i < 0:
+            i = 0
+        if self.samp_rate == 0:
+            return self._stamp_times[i]
+        return self._stamp_times[i] + (index - self._stamp_offsets[i]) / self.samp_rate
+
+    def index_at(self, t):
+        """
+        Return the sample index closest to time t
+        """
+        i = bisect.bisect_right(self._stamp_times, t) - 1
+        if i < 0:
+            i = 0
+        index = self._stamp_offsets[i] + int(round((t - self._stamp_times[i]) * self.samp_rate))
+        return max(0, min(index, len(self)))
+
+    def __repr__(self):
+        return "iq_capture(%r, %s, %g S/s @ %g Hz, %d samples)" % \
+               (self.filename, self.format, self.samp_rate, self.center_freq, len(self))
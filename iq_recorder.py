@@ -0,0 +1,315 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           IQ Recorder
+#
+# FuNLab
+# University of Washington
+#
+# What --log records. complex64 at 800 kS/s is 6.4 MB/s for every stream
+# logged, so the recorder can
+#   - quantize: --log-format=int16 (2x less than complex64) or int8 (4x),
+#     with --log-full-scale mapped to the largest integer. Values past it
+#     are clipped, and the count of them goes in the sidecar
+#   - rotate: start a new file every --log-rotate seconds
+#   - trigger: with --log-pre-trigger and/or --log-post-trigger, only record
+#     around events. The last --log-pre-trigger seconds are held in memory;
+#     after a trigger() they are written out and recording goes on for
+#     --log-post-trigger seconds more (from the last trigger). receive_path
+#     triggers on every packet that fails its CRC, transmit_path on every
+#     frame it queues. trigger() only marks the point; the writing is left to
+#     the recorder's thread, not the caller's.
+# Every file is an iq_capture (iq_capture.py): raw samples plus a JSON
+# sidecar with the format, scale, sample rate, the host time of its first
+# sample and where it is in the stream (first_sample).
+#
+# The samples reach the recorder through a message sink that never drops
+# them, into a queue with no limit; a thread writes them out. A disk that
+# falls behind for a while costs memory (backlog()), not samples.
+#
+# python benchmark_ofdm.py --log --log-format=int8 --log-rotate=10
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr
+
+import os
+import threading
+import time
+
+import numpy
+
+# from current dir
+import iq_capture
+
+
+# the largest integer of each quantized format
+_limit = {"int16": 32767.0, "int8": 127.0}
+
+# samples per second that --log-rotate and the trigger windows are counted in
+# when the sample rate isn't known
+ASSUMED_SAMP_RATE = 1e6
+
+class capture_writer(object):
+    """
+    Writes blocks of complex samples to a series of iq_capture files
+    """
+    def __init__(self, prefix, samp_rate, center_freq=0, format="int16", full_scale=1.0,
+                 rotate=0, pre_trigger=0, post_trigger=0):
+        """
+        @param prefix: files are prefix-0000.dat, prefix-0001.dat, ...
+        @param samp_rate: sample rate in samples/sec (0 if not known)
+        @param center_freq: center frequency in Hz
+        @param format: complex64, int16 or int8
+        @param full_scale: sample magnitude written as the largest integer
+        @param rotate: seconds per file (0 for no limit); without samp_rate
+                       this and the trigger windows are counted at
+                       ASSUMED_SAMP_RATE
+        @param pre_trigger: seconds kept from before a trigger
+        @param post_trigger: seconds recorded after a trigger
+        """
+        if format not in iq_capture.FORMATS:
+            raise ValueError, "unknown capture format %s" % (format,)
+        self.prefix = prefix
+        self.samp_rate = samp_rate
+        self.center_freq = center_freq
+        self.format = format
+        if format in _limit:
+            self.scale = _limit[format] / full_scale
+        else:
+            self.scale = 1.0
+        self.triggered = pre_trigger > 0 or post_trigger > 0
+        rate = samp_rate
+        if not rate and (rotate > 0 or self.triggered):
+            rate = ASSUMED_SAMP_RATE
+            print "Warning: %s: no sample rate, --log-rotate and the triggers count" % (prefix,), \
+                  "%g samples per second" % (rate,)
+        self._rotate = int(rotate * rate)
+        self._ring = numpy.zeros(int(pre_trigger * rate), numpy.complex64)
+        self._ring_pos = 0               # where the next sample goes in the ring
+        self._post = int(post_trigger * rate)
+        self._lock = threading.Lock()
+        self.count = 0                   # samples added
+        self.files = []                  # names of the files started
+        self.clipped = 0                 # I and Q values past full scale
+        self._until = None               # record up to this sample (triggered)
+        self._pending = False            # triggered, the ring not written yet
+        self._written = 0                # sample after the last one written
+        self._start_time = None
+        self._file = None
+
+    def _time_of(self, index):
+        if self.samp_rate == 0:
+            return self._start_time
+        return self._start_time + index / float(self.samp_rate)
+
+    def _metadata(self):
+        iq_capture.write_metadata(self._name, self.samp_rate, self.center_freq,
+                                  self._time_of(self._first), self.format, self.scale,
+                                  first_sample=self._first, clipped=self._clipped)
+
+    def _open(self, first):
+        self._name = "%s-%04d.dat" % (self.prefix, len(self.files))
+        self._file = open(self._name, "wb")
+        self._first = first
+        self._samples = 0
+        self._clipped = 0
+        self.files.append(self._name)
+        # written now so a file still being recorded can be read
+        self._metadata()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._metadata()
+
+    def _write(self, x):
+        """
+        Write x, rotating files as they fill up
+        """
+        while len(x):
+            if self._file is None:
+                self._open(self._written)
+            n = len(x)
+            if self._rotate:
+                n = min(n, self._rotate - self._samples)
+            if self.format in _limit:
+                iq = x[:n].view(numpy.float32) * self.scale
+                limit = _limit[self.format]
+                clipped = numpy.count_nonzero(abs(iq) > limit)
+                if clipped:
+                    numpy.clip(iq, -limit, limit, iq)
+                    self._clipped += clipped
+                    self.clipped += clipped
+                numpy.rint(iq, iq)
+                data = iq.astype(iq_capture.FORMATS[self.format][0])
+            else:
+                data = numpy.asarray(x[:n], numpy.complex64)
+            self._file.write(data.tostring())
+            self._file.flush()
+            self._samples += n
+            self._written += n
+            if self._rotate and self._samples == self._rotate:
+                self._close()
+            x = x[n:]
+
+    def _keep(self, x):
+        """
+        Hold on to the last samples (the ring), for a trigger
+        """
+        size = len(self._ring)
+        if size == 0:
+            return
+        x = x[-size:]
+        first = min(len(x), size - self._ring_pos)
+        self._ring[self._ring_pos:self._ring_pos + first] = x[:first]
+        self._ring[:len(x) - first] = x[first:]
+        self._ring_pos = (self._ring_pos + len(x)) % size
+
+    def _held(self, n):
+        """
+        The last n samples held in the ring, oldest first
+        """
+        pos = self._ring_pos
+        if n <= pos:
+            return self._ring[pos - n:pos]
+        return numpy.concatenate((self._ring[len(self._ring) - (n - pos):], self._ring[:pos]))
+
+    def _write_held(self):
+        """
+        Start a file with what the ring holds from before the trigger
+        """
+        # what's held from before, less what's already in a file
+        first = max(self._written, self.count - len(self._ring))
+        self._close()
+        self._written = first
+        if self.count > first:
+            self._write(self._held(self.count - first))
+        if self.count >= self._until:
+            self._close()
+        self._pending = False
+
+    def trigger(self):
+        """
+        Record from --log-pre-trigger seconds ago until --log-post-trigger
+        seconds from now. Only marks the point: the next add() (or close())
+        does the writing.
+        """
+        self._lock.acquire()
+        if self.triggered:
+            if self._until is None or self.count >= self._until:
+                self._pending = True
+            self._until = self.count + self._post
+        self._lock.release()
+
+    def add(self, x):
+        """
+        Add a block of samples (complex64)
+        """
+        self._lock.acquire()
+        if self._start_time is None:
+            self._start_time = time.time()
+            if self.samp_rate:
+                self._start_time -= len(x) / float(self.samp_rate)
+        if self._pending:
+            self._write_held()
+        if not self.triggered:
+            self._write(x)
+        elif self._until is not None and self.count < self._until:
+            self._write(x[:self._until - self.count])
+            if self.count + len(x) >= self._until:
+                self._close()
+        self._keep(x)
+        self.count += len(x)
+        self._lock.release()
+
+    def close(self):
+        """
+        Close the file being written
+        """
+        self._lock.acquire()
+        if self._pending:
+            self._write_held()
+        self._close()
+        self._lock.release()
+
+
+class iq_recorder(gr.hier_block2):
+    """
+    Records a complex stream with a capture_writer
+    """
+    def __init__(self, prefix, samp_rate, center_freq=0, format="int16", full_scale=1.0,
+                 rotate=0, pre_trigger=0, post_trigger=0):
+        """
+        @param: as for capture_writer
+        """
+        gr.hier_block2.__init__(self, "iq_recorder",
+                                gr.io_signature(1, 1, gr.sizeof_gr_complex),
+                                gr.io_signature(0, 0, 0))
+        self.writer = capture_writer(prefix, samp_rate, center_freq, format, full_scale,
+                                     rotate, pre_trigger, post_trigger)
+        # no limit: when the disk falls behind the samples wait here
+        self._msgq = gr.msg_queue()
+        self.connect(self, gr.message_sink(gr.sizeof_gr_complex, self._msgq, False))
+        writer = threading.Thread(target=self._run)
+        writer.setDaemon(True)
+        writer.start()
+
+    def _run(self):
+        while True:
+            msg = self._msgq.delete_head()
+            self.writer.add(numpy.fromstring(msg.to_string(), numpy.complex64))
+
+    def trigger(self):
+        """
+        Record around now (--log-pre-trigger, --log-post-trigger)
+        """
+        self.writer.trigger()
+
+    def triggered(self):
+        """
+        True if only recording around triggers
+        """
+        return self.writer.triggered
+
+    def backlog(self):
+        """
+        Blocks of samples waiting to be written
+        """
+        return self._msgq.count()
+
+    def close(self):
+        """
+        Close the file being written (the flow graph should be stopped)
+        """
+        self.writer.close()
+
+
+def make_recorder(options, name, center_freq=0):
+    """
+    An iq_recorder set up from the --log options
+
+    @param name: what is recorded; the files are --log-dir/name-NNNN.dat
+    """
+    # scripts that don't have a sample rate record 0 (unknown) in the sidecar,
+    # and rotate and trigger at ASSUMED_SAMP_RATE
+    samp_rate = getattr(options, "samp_rate", 0) or 0
+    return iq_recorder(os.path.join(options.log_dir, name), samp_rate, center_freq,
+                       options.log_format, options.log_full_scale, options.log_rotate,
+                       options.log_pre_trigger, options.log_post_trigger)
+
+def add_options(normal, expert):
+    """
+    Adds IQ recording options to the Options Parser
+    """
+    expert.add_option("", "--log-dir", type="string", default=".",
+                      help="directory --log writes to [default=%default]")
+    expert.add_option("", "--log-format", type="choice", choices=iq_capture.FORMATS.keys(),
+                      default="int16",
+                      help="sample format --log writes: complex64, int16 or int8 [default=%default]")
+    expert.add_option("", "--log-full-scale", type="eng_float", default=1.0,
+                      help="sample magnitude written as the largest int16/int8 value [default=%default]")
+    expert.add_option("", "--log-rotate", type="eng_float", default=60,
+                      help="seconds per --log file, 0 for one file [default=%default]")
+    expert.add_option("", "--log-pre-trigger", type="eng_float", default=0,
+                      help="with --log, only record around events, keeping this many seconds from before one [default=%default]")
+    expert.add_option("", "--log-post-trigger", type="eng_float", default=0,
+                      help="with --log, only record around events, for this many seconds after one [default=%default]")
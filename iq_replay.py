@@ -0,0 +1,201 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           IQ Replay Source
+#
+# FuNLab
+# University of Washington
+#
+# Stand-ins for the USRP source and sink so the receivers and the sense path
+# can be run on recorded captures (see iq_capture.py) without radios.
+#
+# replay_source takes one or more captures, each recorded at its own center
+# frequency (and possibly sample rate). Tuning the source with
+# set_center_freq switches to the capture recorded at that frequency, at the
+# same point in the timeline, which is how a retune looks to the sense path.
+# Frequencies nobody recorded play back as low-level noise. A capture without
+# a sample rate (no sidecar) can't say what it covers, so it is played at any
+# frequency no other capture covers.
+#
+# Captures are streamed from their memory maps through a gr.message_source,
+# either as fast as the flow graph takes them or paced at the sample rate.
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr
+
+import threading
+import time
+import sys
+
+import numpy
+
+from iq_capture import iq_capture
+from mock_uhd import usrp_settings
+
+
+class replay_source(gr.hier_block2, usrp_settings):
+    """
+    Plays back IQ captures through the settings interface of uhd.usrp_source.
+    """
+    def __init__(self, captures, paced=False, repeat=True, chunk_size=16384,
+                 missing_power=1e-7, seed=None):
+        """
+        @param captures: list of iq_capture objects or capture file names
+        @param paced: stream at the capture sample rate instead of full speed
+        @param repeat: loop the captures instead of ending the stream
+        @param chunk_size: samples per message handed to the flow graph
+        @param missing_power: power of the noise played for unrecorded frequencies
+        @param seed: seed for that noise
+        """
+        gr.hier_block2.__init__(self, "replay_source",
+                gr.io_signature(0, 0, 0), # Input signature
+                gr.io_signature(1, 1, gr.sizeof_gr_complex)) # Output signature
+        usrp_settings.__init__(self, record_calls=False)
+
+        self._captures = []
+        for c in captures:
+            if not isinstance(c, iq_capture):
+                c = iq_capture(c)
+            self._captures.append(c)
+        if len(self._captures) == 0:
+            raise ValueError, "replay_source needs at least one capture"
+
+        self._paced = paced
+        self._repeat = repeat
+        self._chunk_size = chunk_size
+        self._noise_amplitude = numpy.sqrt(missing_power / 2.0)
+        self._rng = numpy.random.RandomState(seed)
+        self._warned = set()
+
+        first = self._captures[0]
+        self._samp_rate = first.samp_rate
+        self._center_freq = first.center_freq
+        self._current = first
+        self._position = 0          # samples played so far (shared timeline)
+
+        self._msgq = gr.msg_queue(4)
+        self._src = gr.message_source(gr.sizeof_gr_complex, self._msgq)
+        self.connect(self._src, self)
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._feed)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def stop_feeding(self):
+        self._stop.set()
+
+    def captures(self):
+        return self._captures
+
+    def position(self):
+        """
+        Return how many samples have been handed to the flow graph
+        """
+        return self._position
+
+    def _select(self):
+        """
+        Pick the capture recorded at the current frequency (and rate if there
+        are several). Returns None if no capture covers the frequency.
+        """
+        best = None
+        for c in self._captures:
+            if not c.samp_rate:
+                # covers every frequency, after the captures that know theirs
+                if best is None:
+                    best = c
+                continue
+            if abs(c.center_freq - self._center_freq) > c.samp_rate / 2.0:
+                continue
+            if best is None or not best.samp_rate or \
+               (c.samp_rate == self._samp_rate and best.samp_rate != self._samp_rate):
+                best = c
+        if best is not None and not best.samp_rate:
+            if best.filename not in self._warned:
+                self._warned.add(best.filename)
+                sys.stderr.write("replay: %s has no sample rate, playing it for every frequency\n"
+                                 % (best.filename,))
+        elif best is not None and best.samp_rate != self._samp_rate:
+            key = (best.filename, self._samp_rate)
+            if key not in self._warned:
+                self._warned.add(key)
+                sys.stderr.write("replay: %s was recorded at %g S/s, playing it for %g S/s\n"
+                                 % (best.filename, best.samp_rate, self._samp_rate))
+        return best
+
+    def set_samp_rate(self, rate):
+        usrp_settings.set_samp_rate(self, rate)
+        self._current = self._select()
+
+    def set_center_freq(self, freq, chan=0):
+        usrp_settings.set_center_freq(self, freq, chan)
+        self._current = self._select()
+        return True
+
+    def get_time_now(self):
+        c = self._current or self._captures[0]
+        return c.time_at(self._position % max(1, len(c)))
+
+    def _feed(self):
+        """
+        Runs in its own thread, moving samples from the memory maps to the
+        message source. insert_tail blocks while the queue is full, which is
+        what limits the full-speed mode to the speed of the flow graph.
+        """
+        start = time.time()
+        sent = 0
+        while not self._stop.isSet():
+            c = self._current
+            n = self._chunk_size
+            if c is None:
+                chunk = (self._rng.normal(0, self._noise_amplitude, 2*n)
+                         .astype(numpy.float32).view(numpy.complex64))
+            else:
+                pos = self._position
+                if pos >= len(c):
+                    if not self._repeat:
+                        break
+                    pos = pos % len(c)
+                chunk = c.samples(pos, min(pos + n, len(c)))
+
+            if self._paced and self._samp_rate > 0:
+                delay = start + sent / self._samp_rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            self._msgq.insert_tail(gr.message_from_string(chunk.tostring()))
+            self._position += len(chunk)
+            sent += len(chunk)
+
+        self._msgq.insert_tail(gr.message(1))   # tell the message source we're done
+
+
+class null_usrp_sink(gr.hier_block2, usrp_settings):
+    """
+    Swallows the transmit stream while offering the settings interface of
+    uhd.usrp_sink. Used in place of u_snk when replaying.
+    """
+    def __init__(self):
+        gr.hier_block2.__init__(self, "null_usrp_sink",
+                gr.io_signature(1, 1, gr.sizeof_gr_complex), # Input signature
+                gr.io_signature(0, 0, 0)) # Output signature
+        usrp_settings.__init__(self, record_calls=False)
+        self.connect(self, gr.null_sink(gr.sizeof_gr_complex))
+
+
+def add_options(normal, expert):
+    """
+    Adds replay-specific options to the Options Parser
+    """
+    expert.add_option("", "--replay", type="string", default=None, metavar="FILES",
+                      help="play back comma-separated IQ captures instead of using a USRP [default=%default]")
+    expert.add_option("", "--replay-paced", action="store_true", default=False,
+                      help="play captures back at their sample rate instead of full speed")
+    expert.add_option("", "--replay-once", action="store_true", default=False,
+                      help="end the stream at the end of the capture instead of looping")
+
+def make_source(options):
+    """
+    Build a replay_source from --replay and friends
+    """
+    return replay_source(options.replay.split(","), paced=options.replay_paced,
+                         repeat=not options.replay_once)
@@ -0,0 +1,148 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Mock UHD Device
+#
+# FuNLab
+# University of Washington
+#
+# Stand-ins for gnuradio.uhd.usrp_source/usrp_sink (and the gr.copy valves used
+# by the test scripts) that can be driven without hardware. Every settings call
+# is recorded and can be made to take a configurable amount of time, so the
+# cost of mode switches can be measured on a laptop.
+#
+# These are not flow graph blocks. They only implement the settings interface
+# that the MACs and radio_state use.
+# /////////////////////////////////////////////////////////////////////////////
+
+import time
+
+
+class gain_range(object):
+    """
+    Mimics the meta_range_t returned by get_gain_range()
+    """
+    def __init__(self, start=0.0, stop=31.5, step=0.5):
+        self._start = start
+        self._stop = stop
+        self._step = step
+
+    def start(self):
+        return self._start
+
+    def stop(self):
+        return self._stop
+
+    def step(self):
+        return self._step
+
+    def __repr__(self):
+        return "gain_range(%g, %g, %g)" % (self._start, self._stop, self._step)
+
+
+class usrp_settings(object):
+    """
+    Settings interface shared by the mock source and sink.
+    """
+    def __init__(self, device_addr="", io_type=None, num_channels=1,
+                 rate_latency=0.0, tune_latency=0.0, record_calls=True):
+        """
+        @param rate_latency: seconds each set_samp_rate call takes
+        @param tune_latency: seconds each set_center_freq call takes
+        @param record_calls: keep a list of the settings calls made
+        """
+        self.device_addr = device_addr
+        self.num_channels = num_channels
+        self.rate_latency = rate_latency
+        self.tune_latency = tune_latency
+        self.record_calls = record_calls
+
+        self.calls = []        # (method name, args) for every settings call
+        self._samp_rate = 0
+        self._center_freq = 0
+        self._gain = 0
+        self._antenna = ""
+        self._gain_range = gain_range()
+
+    def _record(self, name, *args):
+        if self.record_calls:
+            self.calls.append((name, args))
+
+    def num_calls(self, name=None):
+        """
+        Return how many settings calls were made (optionally only calls to name)
+        """
+        if name is None:
+            return len(self.calls)
+        return len([c for c in self.calls if c[0] == name])
+
+    def reset_calls(self):
+        self.calls = []
+
+    def set_samp_rate(self, rate):
+        self._record("set_samp_rate", rate)
+        if self.rate_latency:
+            time.sleep(self.rate_latency)
+        self._samp_rate = rate
+
+    def get_samp_rate(self):
+        self._record("get_samp_rate")
+        return self._samp_rate
+
+    def set_center_freq(self, freq, chan=0):
+        self._record("set_center_freq", freq, chan)
+        if self.tune_latency:
+            time.sleep(self.tune_latency)
+        self._center_freq = freq
+        return True
+
+    def get_center_freq(self, chan=0):
+        self._record("get_center_freq", chan)
+        return self._center_freq
+
+    def set_gain(self, gain, chan=0):
+        self._record("set_gain", gain, chan)
+        self._gain = gain
+
+    def get_gain(self, chan=0):
+        self._record("get_gain", chan)
+        return self._gain
+
+    def get_gain_range(self, chan=0):
+        return self._gain_range
+
+    def set_antenna(self, antenna, chan=0):
+        self._record("set_antenna", antenna, chan)
+        self._antenna = antenna
+
+    def get_antenna(self, chan=0):
+        return self._antenna
+
+    def set_subdev_spec(self, spec, mboard=0):
+        self._record("set_subdev_spec", spec, mboard)
+
+    def get_time_now(self):
+        return time.time()
+
+
+class usrp_source(usrp_settings):
+    pass
+
+
+class usrp_sink(usrp_settings):
+    pass
+
+
+class valve(object):
+    """
+    Stands in for the gr.copy blocks used as rx/sense valves.
+    """
+    def __init__(self, itemsize=8):
+        self.itemsize = itemsize
+        self.calls = 0
+        self._enabled = True
+
+    def set_enabled(self, enable):
+        self.calls += 1
+        self._enabled = enable
+
+    def enabled(self):
+        return self._enabled
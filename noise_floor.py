@@ -0,0 +1,115 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Noise Floor Tracker
+#
+# FuNLab
+# University of Washington
+#
+# Keeps the carrier sense threshold a fixed margin above the noise floor
+# instead of a --carrier-threshold picked by hand for every device, gain and
+# channel.
+#
+# receive_path averages the power of the filtered receive stream (what the
+# carrier sense looks at) over blocks of samples and hands the block averages
+# to noise_floor. The floor is a low percentile (10th by default) of the last
+# few thousand blocks: frames from other nodes only ever raise the power, so
+# as long as the channel is idle for more than that fraction of the time the
+# percentile is noise. It sits a little below the average noise power (about
+# half a dB for 128 sample blocks), well inside the margin. The threshold is
+# moved when it would change by more than step_db, and reset() starts over
+# after a gain or frequency change so the old floor doesn't linger.
+# /////////////////////////////////////////////////////////////////////////////
+
+import math
+import threading
+
+import numpy
+
+
+class noise_floor(object):
+    """
+    Noise floor estimate from block power averages
+    """
+    def __init__(self, margin_db=6.0, history=4096, percentile=10.0, min_blocks=64,
+                 update_every=64, step_db=0.5, on_change=None):
+        """
+        @param margin_db: how far above the floor the threshold goes
+        @param history: blocks the floor is estimated over
+        @param percentile: of the block powers that is taken as the floor
+        @param min_blocks: blocks needed before there is an estimate
+        @param update_every: blocks between estimates
+        @param step_db: smallest threshold change passed on
+        @param on_change: called with the new threshold (dB)
+        """
+        self.margin_db = margin_db
+        self.percentile = percentile
+        self.min_blocks = min_blocks
+        self.update_every = update_every
+        self.step_db = step_db
+        self.on_change = on_change
+        self._blocks = numpy.zeros(history)
+        self._lock = threading.Lock()
+        self._threshold = None
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the blocks seen so far (after a gain or frequency change)
+        """
+        self._lock.acquire()
+        self._count = 0                  # blocks added since the reset
+        self._pending = 0                # blocks since the last estimate
+        self._floor = None
+        self._lock.release()
+
+    def add(self, powers):
+        """
+        Add block power averages (linear, same scale as the carrier threshold)
+        """
+        self._lock.acquire()
+        history = len(self._blocks)
+        powers = numpy.asarray(powers)[-history:]
+        i = self._count % history
+        n = len(powers)
+        first = min(n, history - i)
+        self._blocks[i:i + first] = powers[:first]
+        self._blocks[:n - first] = powers[first:]
+        self._count += n
+        self._pending += n
+        threshold = None
+        if self._count >= self.min_blocks and self._pending >= self.update_every:
+            self._pending = 0
+            blocks = numpy.sort(self._blocks[:min(self._count, history)])
+            level = blocks[int(self.percentile / 100.0 * (len(blocks) - 1))]
+            self._floor = 10 * math.log10(max(level, 1e-30))
+            threshold = self._floor + self.margin_db
+            if self._threshold is not None and abs(threshold - self._threshold) < self.step_db:
+                threshold = None
+            else:
+                self._threshold = threshold
+        self._lock.release()
+        if threshold is not None and self.on_change is not None:
+            self.on_change(threshold)
+
+    def floor(self):
+        """
+        Noise floor in dB (None until there are min_blocks blocks)
+        """
+        return self._floor
+
+    def threshold(self):
+        """
+        The last threshold passed on (dB), or None
+        """
+        return self._threshold
+
+
+def add_options(normal, expert):
+    """
+    Adds noise floor tracking options to the Options Parser
+    """
+    normal.add_option("", "--auto-threshold", action="store_true", default=False,
+                      help="set the carrier threshold from the noise floor instead of --carrier-threshold [default=%default]")
+    expert.add_option("", "--threshold-margin", type="eng_float", default=6.0,
+                      help="dB above the noise floor for --auto-threshold [default=%default]")
+    expert.add_option("", "--calibrate-time", type="eng_float", default=0.5,
+                      help="seconds to measure the noise floor for at start up [default=%default]")
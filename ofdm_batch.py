@@ -0,0 +1,569 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Batch OFDM Modulator and Demodulator
+#
+# FuNLab
+# University of Washington
+#
+# Modulates packets the way blks2.ofdm_mod does, without a flow graph, so test
+# waveforms can be made as fast as numpy goes instead of at the pace of the
+# GNU Radio scheduler. Payloads of the same length are modulated together as a
+# 2-D array, one packet per row:
+#   - framing: ofdm_framing.frame_rows (header, CRC, pad byte, whitening)
+#   - mapping: as gr.ofdm_mapper_bcv, the packet's bits are taken least
+#     significant bit first, nbits at a time, and put on the data carriers in
+#     order; bits left over at the end are dropped and the rest of the last
+#     OFDM symbol is filled with random constellation points
+#   - one preamble symbol in front of every packet
+#   - the inverse FFT (FFT shifted, not normalized), the cyclic prefix, and
+#     the 1/sqrt(fft_length) scaling of ofdm_mod
+#
+# Which carriers carry data and what the preamble looks like are taken from
+# blks2.ofdm_mod itself: one packet is run through it in a throwaway flow graph
+# when the modulator is made. The constellations are the ones ofdm_mod builds
+# from the psk and qam modules. The data carriers are then the same points
+# ofdm_mod sends, bit for bit; the samples differ from the flow graph's only by
+# float rounding (numpy's FFT instead of FFTW's) and in the random fill.
+#
+# batch_demod goes the other way for recordings, the steps of blks2.ofdm_demod
+# done for all frames at once instead of sample by sample:
+#   - detection: the preamble is the same after half a symbol, so its
+#     normalized correlation with the samples half a symbol later (worked out
+#     for the whole recording from running sums) has a plateau at every frame;
+#     its phase is the frequency offset within a carrier
+#   - whole carriers of frequency offset from the preamble's carriers, and
+#     the timing from the correlation with the preamble, batched FFTs
+#   - the channel on every carrier from the preamble, then symbol by symbol
+#     (batched over the frames) the phase is followed and each carrier
+#     corrected from the decisions, as ofdm_frame_sink does
+#   - headers first, to find how long each frame is; then frames of the same
+#     length are demapped together, dewhitened and their CRC checked
+# It returns what ofdm_demod's callback gets, (ok, payload), with where each
+# frame starts in the recording.
+#
+# Run on its own it writes a capture file of numbered packets (the benchmark
+# payloads), with an iq_capture sidecar, or demodulates one:
+#
+# python ofdm_batch.py --size=100 --count=10000 -o corpus.dat
+# python ofdm_batch.py --demod=corpus.dat
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import gr, blks2, ofdm_packet_utils
+from gnuradio.blks2impl import psk, qam
+from optparse import OptionParser
+
+import binascii
+import copy
+import math
+import struct
+import time
+
+import numpy
+
+# from current dir
+import ofdm_framing
+import ofdm_solver
+import iq_capture
+
+_mask = numpy.array(ofdm_packet_utils.random_mask_tuple, numpy.uint8)
+
+
+def constellation(modulation):
+    """
+    The constellation blks2.ofdm_mod maps with, indexed by symbol value
+    """
+    bits = ofdm_solver.BITS_PER_SYMBOL[modulation]
+    arity = 1 << bits
+    rot = 1
+    if modulation == "qpsk":
+        rot = (0.707+0.707j)
+    if modulation.find("psk") >= 0:
+        points = psk.gray_constellation[arity]
+    else:
+        points = qam.constellation[arity]
+    # the mapper keeps them as gr_complex
+    return numpy.array([pt * rot for pt in points], numpy.complex128).astype(numpy.complex64)
+
+
+class _batch_ofdm(object):
+    """
+    What the batch modulator and demodulator share: the shape of the OFDM
+    symbols, the constellation, the preamble and the data carriers
+    """
+    def __init__(self, options):
+        """
+        @param options: fft_length, occupied_tones, cp_length and modulation,
+                        as for blks2.ofdm_mod
+        """
+        self.fft_length = options.fft_length
+        self.cp_length = options.cp_length
+        self.symbol_len = options.fft_length + options.cp_length
+        self.bits = ofdm_solver.BITS_PER_SYMBOL[options.modulation]
+        self.constellation = constellation(options.modulation)
+        (self.preamble, self.carriers) = self._probe(options)
+
+    def _probe(self, options):
+        """
+        Run a packet through blks2.ofdm_mod
+
+        @returns (the preamble symbol's samples, indices of the data carriers
+                 in the FFT shifted symbol)
+        """
+        options = copy.copy(options)
+        options.log = False
+        tb = gr.top_block()
+        mod = blks2.ofdm_mod(options, msgq_limit=2, pad_for_usrp=False)
+        sink = gr.vector_sink_c()
+        tb.connect(mod, sink)
+        mod.send_pkt('\x00')
+        mod.send_pkt(eof=True)
+        tb.run()
+        data = numpy.array(sink.data(), numpy.complex64)
+        preamble = data[:self.symbol_len]
+        # the first data symbol is full (data or random fill) on every data carrier
+        symbol = data[self.symbol_len + self.cp_length:2 * self.symbol_len]
+        bins = numpy.fft.fftshift(numpy.fft.fft(symbol)) / math.sqrt(self.fft_length)
+        carriers = numpy.flatnonzero(abs(bins) > .5 * abs(self.constellation).min())
+        return (preamble, carriers)
+
+    def frame_samples(self, size):
+        """
+        Samples blks2.ofdm_mod sends for a payload of size bytes
+        """
+        return (1 + self._data_symbols(size)) * self.symbol_len
+
+    def _data_symbols(self, size):
+        nbits = 8 * (size + ofdm_solver.FRAMING_BYTES)
+        per_symbol = len(self.carriers) * self.bits
+        return (nbits + per_symbol - 1) // per_symbol
+
+
+class batch_mod(_batch_ofdm):
+    """
+    blks2.ofdm_mod for many packets at once
+    """
+    def __init__(self, options, seed=None):
+        """
+        @param options: as for blks2.ofdm_mod
+        @param seed: for the random symbols that fill the last OFDM symbol
+        """
+        _batch_ofdm.__init__(self, options)
+        self._rng = numpy.random.RandomState(seed)
+
+    def map_rows(self, packets):
+        """
+        Map framed packets onto the carriers
+
+        @param packets: uint8 array, one framed packet per row
+        @returns the FFT shifted frequency domain data symbols, complex64
+                 array of (packets, symbols, fft_length)
+        """
+        (n, length) = packets.shape
+        ncarriers = len(self.carriers)
+        # least significant bit of each byte first
+        bits = numpy.unpackbits(packets.reshape(n, length, 1), axis=2)[:, :, ::-1]
+        nvalues = 8 * length // self.bits
+        bits = bits.reshape(n, 8 * length)[:, :nvalues * self.bits]
+        weights = 1 << numpy.arange(self.bits)
+        values = numpy.dot(bits.reshape(n, nvalues, self.bits), weights)
+        nsymbols = (8 * length + ncarriers * self.bits - 1) // (ncarriers * self.bits)
+        points = numpy.empty((n, nsymbols * ncarriers), numpy.int_)
+        points[:, :nvalues] = values
+        points[:, nvalues:] = self._rng.randint(0, len(self.constellation),
+                                                (n, nsymbols * ncarriers - nvalues))
+        symbols = numpy.zeros((n, nsymbols, self.fft_length), numpy.complex64)
+        symbols[:, :, self.carriers] = self.constellation[points].reshape(n, nsymbols, ncarriers)
+        return symbols
+
+    def modulate_rows(self, rows):
+        """
+        Modulate equal length payloads
+
+        @param rows: uint8 array, one payload per row
+        @returns complex64 array, the samples of one packet per row
+        """
+        n = len(rows)
+        framed = ofdm_framing.frame_rows(rows)
+        packets = numpy.fromstring(''.join(framed), numpy.uint8).reshape(n, -1)
+        symbols = self.map_rows(packets)
+        nsymbols = symbols.shape[1]
+        # gr.fft_vcc(fft_length, False, [], True) is an unnormalized inverse FFT
+        time = numpy.fft.ifft(numpy.fft.ifftshift(symbols, axes=2), axis=2)
+        time *= self.fft_length / math.sqrt(self.fft_length)
+        out = numpy.empty((n, 1 + nsymbols, self.symbol_len), numpy.complex64)
+        out[:, 0, :] = self.preamble
+        out[:, 1:, :self.cp_length] = time[:, :, self.fft_length - self.cp_length:]
+        out[:, 1:, self.cp_length:] = time
+        return out.reshape(n, (1 + nsymbols) * self.symbol_len)
+
+    def modulate(self, payloads, batch=1024):
+        """
+        Modulate payloads in batches
+
+        @param payloads: iterable of payload strings, or a uint8 array with one
+                         payload per row
+        @param batch: most payloads modulated together
+        @returns generator of complex64 arrays (one packet per row), in order
+        """
+        if isinstance(payloads, numpy.ndarray):
+            for i in range(0, len(payloads), batch):
+                yield self.modulate_rows(payloads[i:i+batch])
+            return
+        pending = []
+        size = None
+        for payload in payloads:
+            if len(payload) != size or len(pending) == batch:
+                if pending:
+                    yield self.modulate_rows(numpy.fromstring(''.join(pending), numpy.uint8)
+                                             .reshape(len(pending), size))
+                pending = []
+                size = len(payload)
+            pending.append(payload)
+        if pending:
+            yield self.modulate_rows(numpy.fromstring(''.join(pending), numpy.uint8)
+                                     .reshape(len(pending), size))
+
+    def write(self, filename, payloads, samp_rate, gap=0, amplitude=1.0, batch=1024):
+        """
+        Write the modulated payloads to a complex64 capture (what gr.file_sink
+        writes), with gap zero samples after every packet, and its sidecar
+
+        @returns number of samples written
+        """
+        f = open(filename, "wb")
+        nsamples = 0
+        npackets = 0
+        try:
+            for frames in self.modulate(payloads, batch):
+                if amplitude != 1.0:
+                    frames *= amplitude
+                if gap > 0:
+                    frames = numpy.hstack((frames, numpy.zeros((len(frames), gap), numpy.complex64)))
+                frames.tofile(f)
+                nsamples += frames.size
+                npackets += len(frames)
+        finally:
+            f.close()
+        iq_capture.write_metadata(filename, samp_rate, format="complex64", packets=npackets)
+        return nsamples
+
+
+class batch_demod(_batch_ofdm):
+    """
+    blks2.ofdm_demod for a recording, all of its frames at once
+    """
+    def __init__(self, options, threshold=0.5, max_cfo=4, batch=1 << 21):
+        """
+        @param options: as for blks2.ofdm_mod
+        @param threshold: preamble correlation (0 to 1) that means a frame
+        @param max_cfo: whole carriers of frequency offset searched either way
+        @param batch: samples of frames demodulated together
+        """
+        _batch_ofdm.__init__(self, options)
+        self.threshold = threshold
+        self.max_cfo = max_cfo
+        self.batch = batch
+        self.eq_gain = 0.05
+        # the preamble's carriers (every other one) and what is sent on them
+        known = numpy.fft.fftshift(numpy.fft.fft(self.preamble[self.cp_length:]))
+        known /= math.sqrt(self.fft_length)
+        self.pilots = numpy.flatnonzero(abs(known) > 1e-3 * abs(known).max())
+        self.known = known[self.pilots]
+        # the channel on the data carriers: linear between the two nearest
+        # pilots (past them at the edges)
+        hi = numpy.clip(numpy.searchsorted(self.pilots, self.carriers), 1, len(self.pilots) - 1)
+        lo = hi - 1
+        w = (self.carriers - self.pilots[lo]) / (self.pilots[hi] - self.pilots[lo]).astype(numpy.float64)
+        self._interp = numpy.zeros((len(self.pilots), len(self.carriers)))
+        self._interp[lo, numpy.arange(len(self.carriers))] = 1 - w
+        self._interp[hi, numpy.arange(len(self.carriers))] = w
+        self._points = numpy.array([self.constellation.real, self.constellation.imag])
+        self._energy = abs(self.constellation) ** 2
+        # FFT windows start this much into the cyclic prefix, so a late
+        # timing estimate doesn't take in the next symbol
+        self._backoff = self.cp_length // 8
+        self._search = self.cp_length + self.fft_length // 8
+        self.overlap = self.frame_samples(ofdm_framing.MAX_PAYLOAD) + 2 * self._search + \
+                       2 * self.symbol_len
+
+    def _read_symbols(self, length):
+        """
+        Data symbols that hold the header and length bytes of payload and CRC
+        """
+        per_symbol = len(self.carriers) * self.bits
+        return (8 * (4 + length) + per_symbol - 1) // per_symbol
+
+    def detect(self, x):
+        """
+        Find the preambles in x
+
+        @returns (index of the first sample of each frame, frequency offset of
+                 each in carriers), sorted
+        """
+        N = self.fft_length
+        h = N // 2
+        Lp = self.symbol_len
+        # room for the search around frames at either end
+        pad = self._search + Lp
+        x = numpy.concatenate((numpy.zeros(pad), x, numpy.zeros(pad)))
+        # the preamble repeats after half a symbol: correlate x with itself
+        # half a symbol later (Schmidl and Cox), normalized by the power
+        c = numpy.concatenate(([0], numpy.cumsum(x[:-h] * x[h:].conj())))
+        P = c[h:] - c[:-h]
+        e = numpy.concatenate(([0], numpy.cumsum(abs(x) ** 2)))
+        E = e[h:] - e[:-h]
+        metric = abs(P) ** 2 / numpy.maximum(E[:len(P)] * E[h:h + len(P)], 1e-30)
+        above = numpy.concatenate(([False], metric > self.threshold, [False]))
+        edges = numpy.flatnonzero(above[1:] != above[:-1])
+        (a, b) = (edges[::2], edges[1::2])
+        keep = (b - a) >= max(2, self.cp_length // 4)
+        (a, b) = (a[keep], b[keep])
+        # fine frequency offset from the phase over the plateau; the plateau
+        # is the cyclic prefix long and ends where the symbol does
+        cP = numpy.concatenate(([0], numpy.cumsum(P)))
+        eps = -numpy.angle(cP[b] - cP[a]) / math.pi
+        coarse = (a + b) // 2 - self.cp_length // 2
+        keep = (coarse >= self._search) & (coarse + self._search + Lp <= len(x))
+        (coarse, eps) = (coarse[keep], eps[keep])
+        if len(coarse) == 0:
+            return (numpy.zeros(0, numpy.int_), numpy.zeros(0))
+
+        # whole carriers of offset: where the preamble's carriers line up
+        # with the known symbol, carrier to carrier (so the timing doesn't
+        # matter yet)
+        k = numpy.arange(N)
+        pre = x[(coarse + self.cp_length)[:, None] + k] * numpy.exp(-2j * math.pi * eps[:, None] * k / N)
+        Y = numpy.fft.fftshift(numpy.fft.fft(pre, axis=1), axes=(1,))
+        ref = self.known[1:] * self.known[:-1].conj()
+        shifts = numpy.arange(-self.max_cfo, self.max_cfo + 1)
+        scores = []
+        for shift in shifts:
+            y = Y[:, (self.pilots + shift) % N]
+            scores.append(abs((y[:, :-1] * y[:, 1:].conj() * ref).sum(axis=1)))
+        cfo = eps + shifts[numpy.array(scores).argmax(axis=0)]
+
+        # timing from the correlation with the preamble itself
+        S = self._search
+        span = numpy.arange(2 * S + Lp)
+        nfft = 1 << int(math.ceil(math.log(2 * S + Lp, 2)))
+        ref = numpy.fft.fft(self.preamble, nfft).conj()
+        starts = numpy.empty(len(coarse), numpy.int_)
+        step = max(1, self.batch // len(span))
+        for i in range(0, len(coarse), step):
+            idx = (coarse[i:i+step] - S)[:, None] + span
+            w = x[idx] * numpy.exp(-2j * math.pi * cfo[i:i+step, None] * span / N)
+            corr = numpy.fft.ifft(numpy.fft.fft(w, nfft, axis=1) * ref, axis=1)[:, :2 * S + 1]
+            starts[i:i+step] = coarse[i:i+step] - S + abs(corr).argmax(axis=1)
+        starts -= self._backoff + pad
+
+        # one detection per frame
+        order = numpy.argsort(starts, kind='mergesort')
+        (starts, cfo) = (starts[order], cfo[order])
+        keep = numpy.ones(len(starts), numpy.bool_)
+        last = None
+        for i in range(len(starts)):
+            if last is not None and starts[i] - last < Lp:
+                keep[i] = False
+            else:
+                last = starts[i]
+        return (starts[keep], cfo[keep])
+
+    def _slice(self, z):
+        """
+        Nearest constellation point to each of z
+        """
+        flat = z.reshape(-1)
+        d = self._energy - 2 * numpy.dot(numpy.column_stack((flat.real, flat.imag)), self._points)
+        return d.argmin(axis=1).reshape(z.shape)
+
+    def _demap(self, x, starts, cfo, nsymbols):
+        """
+        Equalize and slice the first nsymbols data symbols of each frame
+
+        @returns (frames, nsymbols * data carriers) array of symbol values
+        """
+        N = self.fft_length
+        n = len(starts)
+        k = numpy.arange((1 + nsymbols) * self.symbol_len)
+        y = x[starts[:, None] + k] * numpy.exp(-2j * math.pi * cfo[:, None] * k / N)
+        y = y.reshape(n, 1 + nsymbols, self.symbol_len)[:, :, self.cp_length:]
+        Y = numpy.fft.fftshift(numpy.fft.fft(y, axis=2), axes=(2,)) / math.sqrt(N)
+        # channel from the preamble
+        H = numpy.dot(Y[:, 0, self.pilots] / self.known, self._interp)
+        Z = Y[:, 1:, self.carriers] / H[:, None, :]
+        # what's left of the frequency offset turns the symbols a little
+        # more each time: follow it from symbol to symbol, and correct each
+        # carrier from the decisions (like ofdm_frame_sink's equalizer)
+        phase = numpy.zeros(n)
+        dfe = numpy.ones((n, len(self.carriers)), numpy.complex128)
+        values = numpy.empty((n, nsymbols, len(self.carriers)), numpy.int_)
+        for m in range(nsymbols):
+            z = Z[:, m, :] * dfe * numpy.exp(-1j * phase)[:, None]
+            v = self._slice(z)
+            error = numpy.angle((z * self.constellation[v].conj()).sum(axis=1))
+            phase += error
+            z *= numpy.exp(-1j * error)[:, None]
+            v = self._slice(z)
+            values[:, m, :] = v
+            dfe += self.eq_gain * dfe * (self.constellation[v] / z - 1)
+        return values.reshape(n, -1)
+
+    def _bytes(self, values, nbytes):
+        """
+        Symbol values back to bytes, least significant bit first
+        """
+        n = len(values)
+        bits = (values[:, :, None] >> numpy.arange(self.bits)) & 1
+        bits = bits.reshape(n, -1)[:, :8 * nbytes].reshape(n, nbytes, 8)[:, :, ::-1]
+        return numpy.packbits(bits.astype(numpy.uint8), axis=2).reshape(n, nbytes)
+
+    def headers(self, x, starts, cfo):
+        """
+        Read the headers of the frames detect() found in x
+
+        @returns (starts, cfo, length, whitener, valid) of the frames whose
+                 header is inside x; length counts the CRC, and valid is
+                 whether both copies of the header agree
+        """
+        starts = numpy.maximum(starts, 0)
+        nh = self._read_symbols(0)
+        keep = starts + (1 + nh) * self.symbol_len <= len(x)
+        (starts, cfo) = (starts[keep], cfo[keep])
+        # two copies of the length and the whitening offset
+        step = max(1, self.batch // ((1 + nh) * self.symbol_len))
+        header = numpy.empty((len(starts), 4), numpy.int_)
+        for i in range(0, len(starts), step):
+            values = self._demap(x, starts[i:i+step], cfo[i:i+step], nh)
+            header[i:i+step] = self._bytes(values, 4)
+        first = (header[:, 0] << 8) | header[:, 1]
+        valid = first == ((header[:, 2] << 8) | header[:, 3])
+        length = first & 0x0fff
+        whitener = first >> 12
+        valid &= whitener + length <= len(_mask)
+        return (starts, cfo, length, whitener, valid)
+
+    def demodulate(self, x, offset=0):
+        """
+        Demodulate every frame in x
+
+        @param offset: added to the sample indices returned
+        @returns [(index of the frame's first sample, ok, payload)], in order
+        """
+        x = numpy.asarray(x, numpy.complex128)
+        (starts, cfo) = self.detect(x)
+        (starts, cfo, length, whitener, valid) = self.headers(x, starts, cfo)
+        if len(starts) == 0:
+            return []
+
+        # a frame can't start inside the one before (give or take the timing)
+        accepted = []
+        busy = 0
+        for i in range(len(starts)):
+            if not valid[i] or starts[i] < busy:
+                continue
+            nread = self._read_symbols(length[i])
+            if starts[i] + (1 + nread) * self.symbol_len > len(x):
+                continue
+            accepted.append(i)
+            busy = starts[i] + self.frame_samples(max(0, length[i] - 4)) - self.cp_length
+
+        frames = []
+        groups = {}
+        for i in accepted:
+            groups.setdefault(length[i], []).append(i)
+        for (L, members) in groups.items():
+            members = numpy.array(members)
+            nread = self._read_symbols(L)
+            step = max(1, self.batch // ((1 + nread) * self.symbol_len))
+            for j in range(0, len(members), step):
+                sel = members[j:j+step]
+                values = self._demap(x, starts[sel], cfo[sel], nread)
+                body = self._bytes(values, 4 + L)[:, 4:]
+                body ^= _mask[whitener[sel, None] + numpy.arange(L)]
+                for (i, packet) in zip(sel, body):
+                    packet = packet.tostring()
+                    payload = packet[:-4]
+                    ok = len(packet) >= 4 and \
+                         struct.pack('>I', binascii.crc32(payload) & 0xffffffff) == packet[-4:]
+                    frames.append((offset + starts[i], ok, payload))
+        frames.sort()
+        return frames
+
+    def demodulate_capture(self, capture, chunk=1 << 22, start=0, stop=None):
+        """
+        Demodulate an iq_capture a chunk at a time
+
+        @param start, stop: only the frames that start in this range of samples
+        @returns generator of (index of the frame's first sample, ok, payload)
+        """
+        if stop is None or stop > len(capture):
+            stop = len(capture)
+        # each chunk is read with some of the one before, so the frames that
+        # start right at its beginning are found the same way as in the middle
+        margin = 2 * (self._search + self.symbol_len)
+        pos = start
+        busy = 0
+        while pos < stop:
+            end = min(pos + chunk, stop)
+            first = max(0, pos - margin)
+            x = capture.samples(first, end + self.overlap)
+            for (frame, ok, payload) in self.demodulate(x, first):
+                if frame < max(pos, busy) or frame >= end:
+                    continue
+                busy = frame + self.frame_samples(len(payload)) - self.cp_length
+                yield (frame, ok, payload)
+            pos = end
+
+def main():
+    from gnuradio.eng_option import eng_option
+    parser = OptionParser(option_class=eng_option, conflict_handler="resolve")
+    expert_grp = parser.add_option_group("Expert")
+    parser.add_option("-o", "--output", type="string", default="corpus.dat",
+                      help="capture file to write [default=%default]")
+    parser.add_option("-d", "--demod", type="string", default=None,
+                      help="demodulate this capture instead of writing one [default=%default]")
+    parser.add_option("-s", "--size", type="int", default=400,
+                      help="payload bytes per packet [default=%default]")
+    parser.add_option("", "--count", type="int", default=10000,
+                      help="packets to write [default=%default]")
+    parser.add_option("", "--gap", type="int", default=0,
+                      help="zero samples after every packet [default=%default]")
+    parser.add_option("", "--tx-amplitude", type="eng_float", default=1.0,
+                      help="scale the samples by this [default=%default]")
+    parser.add_option("-r", "--samp-rate", type="eng_float", default=800e3,
+                      help="sample rate recorded in the sidecar [default=%default]")
+    parser.add_option("", "--seed", type="int", default=None,
+                      help="random seed for the fill symbols [default=%default]")
+    parser.add_option("-v", "--verbose", action="store_true", default=False,
+                      help="print every packet demodulated [default=%default]")
+    blks2.ofdm_mod.add_options(parser, expert_grp)
+    (options, args) = parser.parse_args()
+
+    if options.demod is not None:
+        demod = batch_demod(options)
+        capture = iq_capture.iq_capture(options.demod)
+        started = time.time()
+        n = 0
+        nok = 0
+        for (start, ok, payload) in demod.demodulate_capture(capture):
+            n += 1
+            nok += ok
+            if options.verbose:
+                print "%12d %-4s %5d" % (start, ok and "ok" or "bad", len(payload))
+        elapsed = time.time() - started
+        print "%d packets, %d ok, %d samples in %.2f s (%.1f MS/s)" % \
+              (n, nok, len(capture), elapsed, 1e-6 * len(capture) / elapsed)
+        if capture.duration() > 0:
+            print "%.1f times real time" % (capture.duration() / elapsed,)
+        return
+
+    mod = batch_mod(options, options.seed)
+    n = mod.write(options.output, ofdm_framing.numbered_payloads(options.size, options.count),
+                  options.samp_rate, options.gap, options.tx_amplitude)
+    print "wrote %d packets, %d samples to %s" % (options.count, n, options.output)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -274,6 +274,8 @@ def main():
     # I never start the MAC main loop. We just want to recieve
     # run the flow graph and wait until the user stops it.
     tb.start()
+
+    tb.rxpath.calibrate_noise_floor(options.calibrate_time)    # --auto-threshold
     
     while 1:
     	if tb.carrier_sensed():
@@ -0,0 +1,109 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           OFDM Framing
+#
+# FuNLab
+# University of Washington
+#
+# Frames packets for blks2.ofdm_mod in bulk. blks2.ofdm_mod.send_pkt frames
+# one payload at a time with ofdm_packet_utils.make_packet: CRC, header,
+# 0x55 pad byte and whitening, a handful of Python and numpy calls per
+# packet. Here payloads of the same length are stacked into one uint8 array
+# and the pad byte, CRC bytes and whitening go in with one numpy operation per
+# batch; only the CRC itself and the final string are per packet. The output
+# is byte for byte what make_packet(payload, 1, 1, pad_for_usrp=False,
+# whitening=True) returns, i.e. whitened from mask offset 0 (make_packet's
+# default whitener_offset) with 0 in the header.
+#
+# numbered_payloads builds the test payloads the benchmark scripts send
+# (2 byte packet number, then the low byte of the number repeated) the same
+# way, without a string per packet.
+# /////////////////////////////////////////////////////////////////////////////
+
+import binascii
+
+import numpy
+
+from gnuradio import ofdm_packet_utils
+
+# blks2.ofdm_mod.send_pkt doesn't pass a whitener_offset, so make_packet's
+# default of 0 is what goes in the header and where the mask starts
+_WHITENER_OFFSET = 0
+_mask = numpy.array(ofdm_packet_utils.random_mask_tuple, numpy.uint8)
+# payload, CRC and pad byte have to fit the mask, and their length (less the
+# pad) the 12 bits of the header
+MAX_PAYLOAD = min(len(_mask) - 5, 0x0fff - 4)
+
+
+def frame_rows(rows):
+    """
+    Frame equal length payloads
+
+    @param rows: uint8 array, one payload per row
+    @returns list of framed packets (strings), ready for gr.message_from_string
+    """
+    (n, size) = rows.shape
+    if size > MAX_PAYLOAD:
+        raise ValueError, "len(payload) must be in [0, %d]" % (MAX_PAYLOAD,)
+    if n == 0:
+        return []
+    length = size + 4                    # payload with CRC
+    # header, payload, CRC, pad byte
+    data = numpy.empty((n, 4 + length + 1), numpy.uint8)
+    data[:, :4] = numpy.fromstring(ofdm_packet_utils.make_header(length, _WHITENER_OFFSET),
+                                   numpy.uint8)
+    data[:, 4:4 + size] = rows
+    s = data.tostring()
+    step = data.shape[1]
+    crcs = numpy.array([binascii.crc32(buffer(s, i*step + 4, size)) & 0xffffffff
+                        for i in range(n)], numpy.uint32)
+    data[:, 4 + size:4 + length] = crcs.astype('>u4').view(numpy.uint8).reshape(n, 4)
+    data[:, 4 + length] = 0x55
+    data[:, 4:] ^= _mask[_WHITENER_OFFSET:_WHITENER_OFFSET + length + 1]
+    s = data.tostring()
+    return [s[i*step:(i+1)*step] for i in range(n)]
+
+def frame_packets(payloads, batch=256):
+    """
+    Frame payloads in batches
+
+    @param payloads: iterable of payload strings, or a uint8 array with one
+                     payload per row
+    @param batch: most payloads framed together
+    @returns generator of framed packets, in order
+    """
+    if isinstance(payloads, numpy.ndarray):
+        for i in range(0, len(payloads), batch):
+            for pkt in frame_rows(payloads[i:i+batch]):
+                yield pkt
+        return
+    pending = []
+    size = None
+    for payload in payloads:
+        if len(payload) != size or len(pending) == batch:
+            if pending:
+                rows = numpy.fromstring(''.join(pending), numpy.uint8).reshape(len(pending), size)
+                for pkt in frame_rows(rows):
+                    yield pkt
+            pending = []
+            size = len(payload)
+        pending.append(payload)
+    if pending:
+        rows = numpy.fromstring(''.join(pending), numpy.uint8).reshape(len(pending), size)
+        for pkt in frame_rows(rows):
+            yield pkt
+
+def numbered_payloads(size, count, start=0):
+    """
+    The benchmark payloads: struct.pack('!H', pktno % 65535) followed by
+    (size - 2) * chr(pktno & 0xff), for pktno from start to start + count - 1
+
+    @returns uint8 array, one payload per row
+    """
+    if size < 2:
+        raise ValueError, "payloads need at least 2 bytes for the packet number"
+    pktno = numpy.arange(start, start + count)
+    rows = numpy.empty((count, size), numpy.uint8)
+    rows[:, 0] = (pktno % 65535) >> 8
+    rows[:, 1] = (pktno % 65535) & 0xff
+    rows[:, 2:] = (pktno & 0xff)[:, None]
+    return rows
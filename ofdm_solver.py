@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           OFDM Parameter Solver
+#
+# FuNLab
+# University of Washington
+#
+# Picks fft_length, occupied_tones, cp_length and the sample rate for a target
+# bit rate instead of finding them by trial and error (pick_bitrate.py only
+# knows the single carrier interp/decim settings of the USRP1).
+#
+# A packet of P bytes sent by blks2.ofdm_mod is a 4 byte header, the payload,
+# a 4 byte CRC and a 1 byte pad, mapped onto ceil(8*(P + 9) / (tones * bits))
+# OFDM symbols of fft_length + cp_length samples, after one preamble symbol.
+# For each shape (fft_length, occupied_tones, cp_length) that gives a fixed
+# number of bits per sample, so the throughput is proportional to the sample
+# rate. The shapes are computed once per modulation and packet size; for a
+# target the solver only has to find, for each shape, the lowest rate the
+# device can run at that reaches it (a bisection), subject to
+#   - the occupied bandwidth (tones * rate / fft_length) fitting the channel
+#   - the cyclic prefix lasting at least --min-cp-time
+#   - the rate not exceeding --max-samp-rate
+# and rank the results: lowest sample rate (the host does the work) first,
+# then lowest overhead, then shortest FFT.
+#
+# python ofdm_solver.py --target-bitrate=500k --modulation=qpsk --max-bandwidth=1M
+# /////////////////////////////////////////////////////////////////////////////
+
+from optparse import OptionParser
+import bisect
+
+BITS_PER_SYMBOL = {'bpsk': 1, 'qpsk': 2, '8psk': 3, 'qam8': 3, 'qam16': 4,
+                   'qam64': 6, 'qam256': 8}
+
+FFT_LENGTHS = (64, 128, 256, 512, 1024, 2048)
+CP_FRACTIONS = (4, 8, 16, 32)            # cp_length = fft_length / n
+
+FRAMING_BYTES = 4 + 4 + 1               # header, CRC, pad byte
+_PREAMBLE_SYMBOLS = 1
+
+_shape_cache = {}
+_rate_cache = {}
+
+
+def frame_symbols(pkt_size, occupied_tones, bits):
+    """
+    Number of OFDM symbols (preamble included) blks2.ofdm_mod sends for a
+    payload of pkt_size bytes
+    """
+    bits_per_ofdm = occupied_tones * bits
+    framed = 8 * (pkt_size + FRAMING_BYTES)
+    return (framed + bits_per_ofdm - 1) // bits_per_ofdm + _PREAMBLE_SYMBOLS
+
+
+class ofdm_config(object):
+    """
+    One OFDM configuration and what it is predicted to achieve
+    """
+    def __init__(self, fft_length, occupied_tones, cp_length, samp_rate, pkt_size, bits):
+        self.fft_length = fft_length
+        self.occupied_tones = occupied_tones
+        self.cp_length = cp_length
+        self.samp_rate = samp_rate
+        self.pkt_size = pkt_size
+        self.bits_per_symbol = bits
+        bits_per_ofdm = occupied_tones * bits
+        framed = 8 * (pkt_size + FRAMING_BYTES)
+        data_symbols = frame_symbols(pkt_size, occupied_tones, bits) - _PREAMBLE_SYMBOLS
+        self.samples = (data_symbols + _PREAMBLE_SYMBOLS) * (fft_length + cp_length)
+        # fractions of the packet's airtime
+        total = float(self.samples)
+        data = data_symbols * fft_length / total
+        self.preamble = _PREAMBLE_SYMBOLS * (fft_length + cp_length) / total
+        self.cp = data_symbols * cp_length / total
+        self.framing = data * 8 * FRAMING_BYTES / float(data_symbols * bits_per_ofdm)
+        self.padding = data * (data_symbols * bits_per_ofdm - framed) / float(data_symbols * bits_per_ofdm)
+        self.overhead = 1.0 - data * 8 * pkt_size / float(data_symbols * bits_per_ofdm)
+
+    def airtime(self):
+        return self.samples / float(self.samp_rate)
+
+    def throughput(self):
+        """
+        Payload bits per second while sending back to back packets
+        """
+        return 8 * self.pkt_size / self.airtime()
+
+    def bandwidth(self):
+        """
+        Width of the occupied tones in Hz
+        """
+        return self.occupied_tones * float(self.samp_rate) / self.fft_length
+
+    def __repr__(self):
+        return "ofdm_config(fft_length=%d, occupied_tones=%d, cp_length=%d, samp_rate=%g)" % \
+               (self.fft_length, self.occupied_tones, self.cp_length, self.samp_rate)
+
+
+def _shapes(bits, pkt_size):
+    """
+    Return [(bits per sample, fft_length, occupied_tones, cp_length)] for every
+    shape, computed once per modulation and packet size
+    """
+    key = (bits, pkt_size)
+    shapes = _shape_cache.get(key)
+    if shapes is None:
+        shapes = []
+        for fft_length in FFT_LENGTHS:
+            # keep an eighth of the FFT for the guard band edges
+            for tones in range(max(8, fft_length // 8), fft_length * 7 // 8 + 1, 8):
+                for n in CP_FRACTIONS:
+                    c = ofdm_config(fft_length, tones, fft_length // n, 1.0, pkt_size, bits)
+                    shapes.append((c.throughput(), fft_length, tones, fft_length // n))
+        _shape_cache[key] = shapes
+    return shapes
+
+def device_rates(clock, min_decim, max_decim):
+    """
+    Sorted sample rates clock / d for integer d in [min_decim, max_decim]
+    """
+    key = (clock, min_decim, max_decim)
+    rates = _rate_cache.get(key)
+    if rates is None:
+        rates = sorted([float(clock) / d for d in range(min_decim, max_decim + 1)])
+        _rate_cache[key] = rates
+    return rates
+
+def solve(target_bitrate, modulation='bpsk', bandwidth=6e6, pkt_size=400,
+          clock=100e6, min_decim=4, max_decim=512, max_samp_rate=10e6,
+          min_cp_time=0.0, count=5):
+    """
+    Find OFDM configurations that reach target_bitrate
+
+    @param target_bitrate: payload bits per second wanted
+    @param modulation: one of BITS_PER_SYMBOL
+    @param bandwidth: widest the occupied tones may be (Hz)
+    @param pkt_size: payload bytes per packet
+    @param clock: device master clock; the sample rates are clock / integer
+    @param min_decim: smallest decimation/interpolation the device supports
+    @param max_decim: largest one
+    @param max_samp_rate: fastest rate the host keeps up with
+    @param min_cp_time: shortest cyclic prefix (s), e.g. the delay spread
+    @param count: number of configurations to return
+    @returns list of ofdm_config, best first (empty if none reaches the target)
+    """
+    if modulation not in BITS_PER_SYMBOL:
+        raise ValueError, "unknown modulation %s" % (modulation,)
+    bits = BITS_PER_SYMBOL[modulation]
+    rates = device_rates(clock, min_decim, max_decim)
+    found = []
+    for (per_sample, fft_length, tones, cp_length) in _shapes(bits, pkt_size):
+        highest = min(max_samp_rate, bandwidth * fft_length / float(tones))
+        if min_cp_time > 0:
+            highest = min(highest, cp_length / float(min_cp_time))
+        i = bisect.bisect_left(rates, target_bitrate / per_sample)
+        if i == len(rates) or rates[i] > highest:
+            continue
+        c = ofdm_config(fft_length, tones, cp_length, rates[i], pkt_size, bits)
+        found.append(((c.samp_rate, round(c.overhead, 6), fft_length, tones, cp_length), c))
+    found.sort()
+    return [c for (key, c) in found[:count]]
+
+def apply_options(options, rate_attr):
+    """
+    With --target-bitrate, replace options.fft_length, occupied_tones,
+    cp_length and the sample rate (options.<rate_attr>) with the best solution.
+    Call before building the transmit or receive path; both ends have to be
+    given the same solver options to end up with the same configuration.
+
+    @returns the ofdm_config used, or None without --target-bitrate
+    """
+    if options.target_bitrate is None:
+        return None
+    configs = solve(options.target_bitrate, options.modulation, options.max_bandwidth,
+                    options.target_pkt_size, options.device_clock, options.min_decim,
+                    options.max_decim, options.max_samp_rate, options.min_cp_time, count=1)
+    if len(configs) == 0:
+        raise ValueError, "no OFDM configuration reaches %g b/s" % (options.target_bitrate,)
+    c = configs[0]
+    options.fft_length = c.fft_length
+    options.occupied_tones = c.occupied_tones
+    options.cp_length = c.cp_length
+    setattr(options, rate_attr, c.samp_rate)
+    print "OFDM for %g b/s: fft %d, %d tones, cp %d, %g S/s -> %g b/s, %.1f%% overhead" % \
+          (options.target_bitrate, c.fft_length, c.occupied_tones, c.cp_length,
+           c.samp_rate, c.throughput(), 100 * c.overhead)
+    return c
+
+def add_options(normal, expert):
+    """
+    Adds OFDM solver options to the Options Parser
+    """
+    normal.add_option("", "--target-bitrate", type="eng_float", default=None,
+                      help="choose fft-length, occupied-tones, cp-length and the sample rate for this bit rate [default=%default]")
+    expert.add_option("", "--target-pkt-size", type="int", default=400,
+                      help="payload bytes per packet to plan --target-bitrate for [default=%default]")
+    expert.add_option("", "--max-bandwidth", type="eng_float", default=6e6,
+                      help="widest the occupied tones may be for --target-bitrate [default=%default]")
+    expert.add_option("", "--device-clock", type="eng_float", default=100e6,
+                      help="device master clock; sample rates are this over an integer [default=%default]")
+    expert.add_option("", "--min-decim", type="int", default=4,
+                      help="smallest device decimation/interpolation [default=%default]")
+    expert.add_option("", "--max-decim", type="int", default=512,
+                      help="largest device decimation/interpolation [default=%default]")
+    expert.add_option("", "--max-samp-rate", type="eng_float", default=10e6,
+                      help="fastest sample rate the host keeps up with [default=%default]")
+    expert.add_option("", "--min-cp-time", type="eng_float", default=0,
+                      help="shortest cyclic prefix in seconds (the delay spread) [default=%default]")
+
+def main():
+    from gnuradio.eng_option import eng_option
+    parser = OptionParser(option_class=eng_option)
+    parser.add_option("-m", "--modulation", type="choice", choices=sorted(BITS_PER_SYMBOL.keys()),
+                      default='bpsk', help="modulation [default=%default]")
+    parser.add_option("-s", "--size", type="int", default=400,
+                      help="packet payload size [default=%default]")
+    parser.add_option("", "--count", type="int", default=10,
+                      help="configurations to list [default=%default]")
+    add_options(parser, parser)
+    (options, args) = parser.parse_args()
+    if options.target_bitrate is None:
+        parser.error("--target-bitrate is required")
+
+    configs = solve(options.target_bitrate, options.modulation, options.max_bandwidth,
+                    options.size, options.device_clock, options.min_decim, options.max_decim,
+                    options.max_samp_rate, options.min_cp_time, options.count)
+    print "%5s %6s %5s %10s %10s %10s %9s %9s %6s %8s %8s" % \
+          ("fft", "tones", "cp", "samp rate", "bandwidth", "throughput", "overhead",
+           "preamble", "cp", "framing", "padding")
+    for c in configs:
+        print "%5d %6d %5d %10g %10g %10g %8.1f%% %8.1f%% %5.1f%% %7.1f%% %7.1f%%" % \
+              (c.fft_length, c.occupied_tones, c.cp_length, c.samp_rate, c.bandwidth(),
+               c.throughput(), 100 * c.overhead, 100 * c.preamble, 100 * c.cp,
+               100 * c.framing, 100 * c.padding)
+    if len(configs) == 0:
+        print "no configuration reaches %g b/s" % (options.target_bitrate,)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
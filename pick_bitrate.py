@@ -19,6 +19,8 @@
 # Boston, MA 02110-1301, USA.
 # 
 
+import bisect
+
 _default_bitrate = 500e3
 
 _valid_samples_per_symbol = (2,3,4,5,6,7)
@@ -41,6 +43,8 @@ def _gen_rx_info(converter_rate):
     results.sort()
     return results
     
+_info_cache = {}
+
 def _filter_info(info, samples_per_symbol, xrate):
     if samples_per_symbol is not None:
         info = [x for x in info if x[1] == samples_per_symbol]
@@ -48,8 +52,22 @@ def _filter_info(info, samples_per_symbol, xrate):
         info = [x for x in info if x[2] == xrate]
     return info
 
-def _pick_best(target_bitrate, bits_per_symbol, info):
+def _get_info(gen_info, converter_rate, samples_per_symbol, xrate):
+    """
+    Return the (filtered, sorted) table for these constraints and the list of
+    its symbol rates, generating it only the first time it's asked for.
     """
+    key = (gen_info, converter_rate, samples_per_symbol, xrate)
+    entry = _info_cache.get(key)
+    if entry is None:
+        info = _filter_info(gen_info(converter_rate), samples_per_symbol, xrate)
+        entry = (info, [x[0] for x in info])
+        _info_cache[key] = entry
+    return entry
+
+def _pick_best(target_bitrate, bits_per_symbol, info, rates=None):
+    """
+    @param rates: the symbol rates in info (info is sorted by them)
     @returns tuple (bitrate, samples_per_symbol, interp_rate_or_decim_rate)
     """
     if len(info) == 0:
@@ -58,20 +76,25 @@ def _pick_best(target_bitrate, bits_per_symbol, info):
     if target_bitrate is None:     # return the fastest one
         return info[-1]
     
+    if rates is None:
+        rates = [x[0] for x in info]
+
     # convert bit rate to symbol rate
     target_symbolrate = target_bitrate / bits_per_symbol
     
-    # Find the closest matching symbol rate.
+    # Find the closest matching symbol rate: it's one of the two next to where
+    # the target would go.
     # In the event of a tie, the one with the lowest samples_per_symbol wins.
     # (We already sorted them, so the first one is the one we take)
 
-    best = info[0]
-    best_delta = abs(target_symbolrate - best[0])
-    for x in info[1:]:
-        delta = abs(target_symbolrate - x[0])
-        if delta < best_delta:
-            best_delta = delta
-            best = x
+    i = bisect.bisect_left(rates, target_symbolrate)
+    if i == len(rates) or (i > 0 and abs(target_symbolrate - rates[i-1]) <=
+                                     abs(target_symbolrate - rates[i])):
+        i -= 1
+    best_delta = abs(target_symbolrate - rates[i])
+    while i > 0 and abs(target_symbolrate - rates[i-1]) == best_delta:
+        i -= 1
+    best = info[i]
 
     # convert symbol rate back to bit rate
     return ((best[0] * bits_per_symbol),) + best[1:]
@@ -94,8 +117,8 @@ def _pick_bitrate(bitrate, bits_per_symbol, samples_per_symbol,
     # now we have a target bitrate and possibly an xrate or
     # samples_per_symbol constraint, but not both of them.
 
-    return _pick_best(bitrate, bits_per_symbol,
-                      _filter_info(gen_info(converter_rate), samples_per_symbol, xrate))
+    (info, rates) = _get_info(gen_info, converter_rate, samples_per_symbol, xrate)
+    return _pick_best(bitrate, bits_per_symbol, info, rates)
     
 # ---------------------------------------------------------------------------------------
 
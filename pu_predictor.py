@@ -0,0 +1,361 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Primary User Predictor
+#
+# FuNLab
+# University of Washington
+#
+# Learns when primaries come and go from the sensing history, so the MAC can
+# leave a channel (for a backup it has already checked) before the primary
+# shows up instead of after it has collided with it.
+#
+# Each channel keeps the lengths of the busy ("on") and idle ("off") runs it
+# has seen and the times primaries arrived. Run boundaries are placed halfway
+# between the two observations that disagree; a gap longer than max_gap
+# between observations (the MAC was on another channel) starts a new run whose
+# beginning is unknown. The MAC leaves a channel when a primary arrives, so it
+# rarely sees a whole idle run, but it does see arrivals each time it is back,
+# and the spacing of those gives the primary's period.
+#
+# If runs or arrival spacings are regular (small spread, like the fixed
+# --channel-interval of simulated_primary) they are modeled as Gaussian, which
+# predicts an arrival as the time nears. Otherwise the channel is treated as a
+# two-state Markov chain (exponential runs), which only gives the base rate.
+# /////////////////////////////////////////////////////////////////////////////
+
+import collections
+import math
+import random
+
+_prior_busy = 0.2          # for channels we haven't seen lately
+
+
+def _phi(x):
+    """
+    Standard normal CDF
+    """
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+def _stats(values):
+    """
+    @returns (mean, std, n) of a sequence
+    """
+    n = len(values)
+    if n == 0:
+        return (None, None, 0)
+    mean = sum(values) / float(n)
+    var = sum([(v - mean)**2 for v in values]) / n
+    return (mean, math.sqrt(var), n)
+
+def fit_period(gaps, min_period, periodic_cv, min_fits):
+    """
+    Find the period of a set of arrival spacings.
+
+    Visits that missed arrivals show up as multiples of the period and false
+    alarms as spacings that fit nothing, so the period is the candidate (a
+    spacing divided by 1..4) that the most spacings are a multiple of.
+
+    @returns (period, std, fits) where fits lists the indices of the spacings
+    that fit, or None if the spacings aren't regular
+    """
+    if len(gaps) < min_fits:
+        return None
+    best = None
+    for g in gaps:
+        for k in (1, 2, 3, 4):
+            p = g / k
+            if p <= min_period:
+                continue
+            fits = [i for (i, gap) in enumerate(gaps)
+                    if round(gap / p) >= 1 and
+                    abs(gap - round(gap / p)*p) < periodic_cv * p / 2]
+            if best is None or len(fits) > len(best[1]) or \
+               (len(fits) == len(best[1]) and p > best[0]):
+                best = (p, fits)
+    if best is None:
+        return None
+    (p, fits) = best
+    if len(fits) < min_fits or len(fits) * 2 <= len(gaps):
+        return None
+    (mean, std, n) = _stats([gaps[i] / round(gaps[i] / p) for i in fits])
+    return (mean, max(std, 0.02 * mean), fits)
+
+
+class channel_history(object):
+    """
+    Busy/idle runs and primary arrivals observed on one channel
+    """
+    def __init__(self, history=32, periodic_cv=0.25, min_runs=3, max_gap=1.0):
+        """
+        @param history: number of runs (and arrivals) of each kind to remember
+        @param periodic_cv: spreads with std/mean below this are treated as regular
+        @param min_runs: runs needed before the run statistics are trusted
+        @param max_gap: longest time (s) between observations within one run
+        """
+        self.periodic_cv = periodic_cv
+        self.min_runs = min_runs
+        self.max_gap = max_gap
+        self.state = None            # last observed state (True = busy)
+        self.since = None            # estimated start of the current run
+        self.last_seen = None        # time of the last observation
+        self._censored = True        # we didn't see the current run start
+        self.runs = {True: collections.deque(maxlen=history),
+                     False: collections.deque(maxlen=history)}
+        self.arrivals = collections.deque(maxlen=history)
+        self._busy_count = 0         # busy observations in the current busy run
+        self._idle_run = None        # (since, censored) of the idle run before it
+
+    def observe(self, busy, t):
+        busy = bool(busy)
+        if self.state is None or t - self.last_seen > self.max_gap:
+            self.state = busy
+            self.since = t
+            self._censored = True
+            self._busy_count = 0
+            self._idle_run = None
+        elif busy != self.state:
+            if not busy and self._busy_count == 1 and self._idle_run is not None:
+                # a lone busy reading between idle ones is a false alarm
+                self.arrivals.pop()
+                (self.since, self._censored) = self._idle_run
+                if not self._censored:
+                    self.runs[False].pop()
+                self._idle_run = None
+                self.state = False
+                self.last_seen = t
+                return
+            end = (self.last_seen + t) / 2.0
+            if busy:
+                self._idle_run = (self.since, self._censored)
+                self.arrivals.append(end)
+                self._busy_count = 0
+            if not self._censored:
+                self.runs[self.state].append(end - self.since)
+            self._censored = False
+            self.state = busy
+            self.since = end
+        if busy:
+            self._busy_count += 1
+        self.last_seen = t
+
+    def run_stats(self, busy):
+        """
+        @returns (mean, std, n) of the busy or idle run lengths
+        """
+        return _stats(self.runs[busy])
+
+    def arrival_gaps(self):
+        arrivals = self.arrivals
+        return [arrivals[i+1] - arrivals[i] for i in range(len(arrivals) - 1)]
+
+    def period(self, shared=None):
+        """
+        Return (period, std, anchor) of primary arrivals, or None if they
+        aren't regular. anchor is the latest arrival that fits the period.
+
+        @param shared: (period, std) to use if this channel has too few
+        arrivals of its own
+        """
+        fit = fit_period(self.arrival_gaps(), self.max_gap, self.periodic_cv,
+                         self.min_runs - 1)
+        if fit is not None:
+            (period, std, fits) = fit
+            return (period, std, self.arrivals[max(fits) + 1])
+        if shared is not None and len(self.arrivals) > 0:
+            return (shared[0], shared[1], self.arrivals[-1])
+        return None
+
+    def p_run_end(self, elapsed, window):
+        """
+        Probability that the current run, which has lasted elapsed seconds so
+        far, ends within the next window seconds (None if nothing is known).
+        """
+        (mean, std, n) = self.run_stats(self.state)
+        if n == 0 or mean <= 0:
+            return None
+        std = max(std, 0.05 * mean)
+        if n >= self.min_runs and std / mean < self.periodic_cv:
+            # regular runs: Gaussian run length, conditioned on having lasted elapsed
+            survive = 1.0 - _phi((elapsed - mean) / std)
+            if survive < 1e-9:
+                return 1.0
+            return (_phi((elapsed + window - mean) / std) - _phi((elapsed - mean) / std)) / survive
+        # irregular runs: memoryless
+        return 1.0 - math.exp(-window / mean)
+
+    def p_periodic_arrival(self, t0, t1, shared=None):
+        """
+        Probability that a periodic arrival falls in [t0, t1], given that
+        none came before t0 (None if the arrivals aren't regular).
+        """
+        p = self.period(shared)
+        if p is None:
+            return None
+        (period, std, anchor) = p
+        # the next expected arrival at or after t0 (allowing for our uncertainty)
+        k = max(1, math.ceil((t0 - anchor - 2*std) / period))
+        due = anchor + k * period
+        spread = std * math.sqrt(k)
+        survive = 1.0 - _phi((t0 - due) / spread)
+        if survive < 1e-9:
+            return 1.0
+        return max(0.0, _phi((t1 - due) / spread) - _phi((t0 - due) / spread)) / survive
+
+    def p_busy(self, t, horizon, shared=None):
+        """
+        Probability that the channel is (or becomes) busy by t + horizon
+
+        @param shared: (period, std) of the primaries on other channels
+        """
+        if self.state is None or t - self.last_seen > self.max_gap:
+            p = None
+            if len(self.arrivals) > 0:
+                p = self.p_periodic_arrival(t, t + horizon, shared)
+            if p is None:
+                return _prior_busy
+            return max(p, _prior_busy)
+        elapsed = self.last_seen - self.since
+        window = (t - self.last_seen) + horizon
+        p = self.p_run_end(elapsed, window)
+        if self.state:
+            if p is None:
+                return 1.0
+            return 1.0 - p
+        if len(self.arrivals) > 0:
+            q = self.p_periodic_arrival(self.last_seen, t + horizon, shared)
+            if q is not None:
+                p = max(p or 0.0, q)
+        return p or 0.0
+
+
+class pu_predictor(object):
+    """
+    Predicts primary arrivals per channel and keeps a validated backup channel.
+    """
+    def __init__(self, channels, horizon=1.0, threshold=0.5, backup_lifetime=5.0,
+                 history=32, max_gap=1.0, seed=None):
+        """
+        @param channels: list of channel center frequencies
+        @param horizon: how far ahead (s) to look for primary arrivals
+        @param threshold: arrival probability that triggers a proactive switch
+        @param backup_lifetime: how long (s) a validated backup stays trusted
+        @param history: number of runs remembered per channel and state
+        @param max_gap: longest time (s) between observations within one run
+        @param seed: seed for breaking ties between candidates
+        """
+        self.channels = list(channels)
+        self.horizon = horizon
+        self.threshold = threshold
+        self.backup_lifetime = backup_lifetime
+        self._history_len = history
+        self._max_gap = max_gap
+        self._history = {}
+        for c in self.channels:
+            self._history[c] = channel_history(history, max_gap=max_gap)
+        self._backup = None
+        self._backup_time = None
+        self._last_attempt = None
+        self._rng = random.Random(seed)
+        self._shared = None
+        self._shared_key = None
+
+    def history(self, freq):
+        if freq not in self._history:
+            self._history[freq] = channel_history(self._history_len, max_gap=self._max_gap)
+            self.channels.append(freq)
+        return self._history[freq]
+
+    def observe(self, freq, busy, t):
+        """
+        Record a sensing result
+        """
+        self.history(freq).observe(busy, t)
+        if busy and freq == self._backup:
+            self._backup = None
+
+    def shared_period(self):
+        """
+        Return (period, std) fitted to the arrival spacings of all channels
+        together, or None. Primaries often follow one schedule across
+        channels, and this lets a channel with a single arrival be predicted.
+        """
+        key = [(len(h.arrivals), h.arrivals and h.arrivals[-1])
+               for h in self._history.values()]
+        if key != self._shared_key:
+            gaps = []
+            for h in self._history.values():
+                gaps.extend(h.arrival_gaps())
+            h = self._history.values()[0]
+            fit = fit_period(gaps, h.max_gap, h.periodic_cv, h.min_runs - 1)
+            self._shared = fit and fit[:2]
+            self._shared_key = key
+        return self._shared
+
+    def p_busy(self, freq, t, horizon=None):
+        if horizon is None:
+            horizon = self.horizon
+        return self.history(freq).p_busy(t, horizon, self.shared_period())
+
+    def arrival_likely(self, freq, t):
+        """
+        True if a primary is likely to show up on freq within the horizon
+        """
+        return self.p_busy(freq, t) >= self.threshold
+
+    def candidate(self, t, exclude=()):
+        """
+        Return the channel least likely to be busy while it is our backup
+        (None if every channel is likely to be). Ties go to a random channel,
+        so channels nobody knows about get tried in turn.
+        """
+        best = []
+        best_p = None
+        for c in self.channels:
+            if c in exclude:
+                continue
+            p = self.p_busy(c, t, self.backup_lifetime)
+            if p >= self.threshold:
+                continue
+            if best_p is None or p < best_p - 1e-6:
+                best = [c]
+                best_p = p
+            elif p < best_p + 1e-6:
+                best.append(c)
+        if len(best) == 0:
+            return None
+        return self._rng.choice(best)
+
+    def should_validate(self, t):
+        """
+        True if there is no usable backup and we haven't tried to validate one
+        within the last horizon (so a busy band doesn't cost a validation every
+        quiet period).
+        """
+        if self.backup(t) is not None:
+            return False
+        if self._last_attempt is not None and t - self._last_attempt < self.horizon:
+            return False
+        self._last_attempt = t
+        return True
+
+    def set_backup(self, freq, t):
+        """
+        Remember freq as a backup that was sensed idle at time t
+        """
+        self._backup = freq
+        self._backup_time = t
+
+    def backup(self, t):
+        """
+        Return the validated backup channel if it is still fresh and not
+        expected to turn busy, else None
+        """
+        if self._backup is None:
+            return None
+        if t - self._backup_time > self.backup_lifetime or \
+           self.arrival_likely(self._backup, t):
+            self._backup = None
+            return None
+        return self._backup
+
+    def clear_backup(self):
+        self._backup = None
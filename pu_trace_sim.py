@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Primary User Trace Simulation
+#
+# FuNLab
+# University of Washington
+#
+# Replays a primary user trace against the quiet period channel switching of
+# qpcsmaca_mac, once reacting to primaries (sweep all channels when one is
+# detected) and once with pu_predictor (leave for a pre-validated backup
+# before the primary arrives).
+#
+# A trace has one "time frequency" line per channel change of the primary,
+# which is what simulated_primary.py --trace writes. Without --trace a
+# synthetic trace is generated the same way simulated_primary picks channels.
+#
+# For each policy this prints
+#   - collision time: time spent transmitting on a channel the primary is on
+#   - outage: time spent off the air sweeping, validating and retuning
+#   - the number of channel switches (proactive / after a detection)
+#
+# python pu_trace_sim.py --channel-interval=5 --duration=3600
+# python pu_trace_sim.py --trace=primary.trace
+# /////////////////////////////////////////////////////////////////////////////
+
+from optparse import OptionParser
+import bisect
+import random
+
+from pu_predictor import pu_predictor
+import channel_plan
+
+channels = list(channel_plan.DEFAULT_CHANNELS)
+
+
+def load_trace(filename):
+    """
+    Return the (times, freqs) of a primary trace, times starting at 0
+    """
+    times = []
+    freqs = []
+    f = open(filename, "r")
+    try:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 2 or line.startswith("#"):
+                continue
+            times.append(float(fields[0]))
+            freqs.append(int(float(fields[1])))
+    finally:
+        f.close()
+    if len(times) == 0:
+        raise ValueError, "empty trace %s" % (filename,)
+    t0 = times[0]
+    return ([t - t0 for t in times], freqs)
+
+def make_trace(chans, interval, duration, pattern="serial", jitter=0.0, rng=random):
+    """
+    Generate a trace like simulated_primary: a new channel every interval
+    seconds (+- jitter, as a fraction of interval), in order or at random.
+    """
+    times = []
+    freqs = []
+    t = 0.0
+    chan = 0
+    while t < duration:
+        times.append(t)
+        freqs.append(chans[chan])
+        t += interval * (1.0 + rng.uniform(-jitter, jitter))
+        if pattern == "random":
+            chan = rng.randint(0, len(chans) - 1)
+        else:
+            chan = (chan + 1) % len(chans)
+    return (times, freqs)
+
+
+class primary(object):
+    """
+    Where the primary is at any time, from a trace
+    """
+    def __init__(self, times, freqs):
+        self.times = times
+        self.freqs = freqs
+
+    def freq_at(self, t):
+        i = bisect.bisect_right(self.times, t) - 1
+        if i < 0:
+            return None
+        return self.freqs[i]
+
+    def overlap(self, freq, t0, t1):
+        """
+        Time in [t0, t1] the primary spends on freq
+        """
+        total = 0.0
+        i = max(0, bisect.bisect_right(self.times, t0) - 1)
+        while i < len(self.times) and self.times[i] < t1:
+            if self.freqs[i] == freq:
+                end = t1
+                if i + 1 < len(self.times):
+                    end = min(t1, self.times[i+1])
+                total += max(0.0, end - max(t0, self.times[i]))
+            i += 1
+        return total
+
+
+class node(object):
+    """
+    A secondary that transmits between quiet periods and senses in them
+    """
+    def __init__(self, pu, options, predictive, rng):
+        self.pu = pu
+        self.options = options
+        self.rng = rng
+        self.freq = channels[-1]
+        self.t = 0.0
+        self.collision = 0.0
+        self.outage = 0.0
+        self.airtime = 0.0
+        self.proactive = 0
+        self.reactive = 0
+        self.predictor = None
+        if predictive:
+            self.predictor = pu_predictor(channels, horizon=options.pu_horizon,
+                                          threshold=options.pu_threshold, seed=options.seed)
+
+    def detect(self, freq):
+        """
+        Sense freq now, with the configured detection and false alarm rates
+        """
+        if self.pu.freq_at(self.t) == freq:
+            return self.rng.random() < self.options.pd
+        return self.rng.random() < self.options.pfa
+
+    def spend(self, seconds):
+        self.t += seconds
+        self.outage += seconds
+
+    def sweep(self):
+        """
+        find_best_freq: sense every channel, then pick an idle one
+        """
+        idle = []
+        for c in channels:
+            self.spend(self.options.tune + self.options.sense_time)
+            busy = self.detect(c)
+            if self.predictor is not None:
+                self.predictor.observe(c, busy, self.t)
+            if not busy and c != self.freq:
+                idle.append(c)
+        if len(idle) > 0:
+            self.retune(self.rng.choice(idle))
+        else:
+            self.retune(self.freq)
+
+    def retune(self, freq):
+        self.spend(self.options.tune)
+        self.freq = freq
+
+    def validate_backup(self):
+        """
+        qpcsmaca_mac.validate_backup: sense the best candidate and come back
+        """
+        candidate = self.predictor.candidate(self.t, exclude=[self.freq])
+        if candidate is None:
+            return None
+        self.spend(2*self.options.tune + self.options.sense_time)
+        busy = self.detect(candidate)
+        self.predictor.observe(candidate, busy, self.t)
+        if busy:
+            return None
+        self.predictor.set_backup(candidate, self.t)
+        return candidate
+
+    def quiet_period(self):
+        self.t += self.options.sense_time
+        busy = self.detect(self.freq)
+        if self.predictor is None:
+            if busy:
+                self.sweep()
+                self.reactive += 1
+            return
+        # same decisions as qpcsmaca_mac.predict_and_switch
+        self.predictor.observe(self.freq, busy, self.t)
+        if busy:
+            backup = self.predictor.backup(self.t)
+            if backup is None:
+                self.sweep()
+            else:
+                self.retune(backup)
+            self.predictor.clear_backup()
+            self.reactive += 1
+        elif self.predictor.arrival_likely(self.freq, self.t):
+            backup = self.predictor.backup(self.t)
+            if backup is None and self.predictor.should_validate(self.t):
+                backup = self.validate_backup()
+            if backup is not None:
+                self.retune(backup)
+                self.predictor.clear_backup()
+                self.proactive += 1
+
+    def run(self, duration):
+        while self.t < duration:
+            end = self.t + self.options.qp_period
+            self.collision += self.pu.overlap(self.freq, self.t, end)
+            self.airtime += end - self.t
+            self.t = end
+            self.quiet_period()
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("", "--trace", type="string", default=None,
+                      help="primary trace file (see simulated_primary.py --trace) [default=%default]")
+    parser.add_option("", "--channel-plan", type="string", default=None,
+                      help="read the channels from a channel plan file [default=%default]")
+    parser.add_option("", "--start-freq", type="float", default=None,
+                      help="start of the band to cut into channels [default=%default]")
+    parser.add_option("", "--end-freq", type="float", default=None,
+                      help="end of the band to cut into channels [default=%default]")
+    parser.add_option("", "--chan-bandwidth", type="float", default=6e6,
+                      help="channel width [default=%default]")
+    parser.add_option("", "--channel-interval", type="float", default=5.0,
+                      help="synthetic trace: time between primary channel changes [default=%default]")
+    parser.add_option("", "--jitter", type="float", default=0.05,
+                      help="synthetic trace: interval jitter as a fraction [default=%default]")
+    parser.add_option("", "--random", action="store_true", default=False,
+                      help="synthetic trace: random instead of serial channel changes")
+    parser.add_option("", "--duration", type="float", default=3600.0,
+                      help="seconds to simulate [default=%default]")
+    parser.add_option("", "--qp-period", type="float", default=.1,
+                      help="time between quiet periods [default=%default]")
+    parser.add_option("", "--sense-time", type="float", default=.03,
+                      help="time to sense one channel [default=%default]")
+    parser.add_option("", "--tune", type="float", default=.01,
+                      help="time to retune [default=%default]")
+    parser.add_option("", "--pd", type="float", default=.95,
+                      help="probability of detecting a primary [default=%default]")
+    parser.add_option("", "--pfa", type="float", default=.01,
+                      help="false alarm probability [default=%default]")
+    parser.add_option("", "--pu-horizon", type="float", default=1.0,
+                      help="how far ahead to predict primary arrivals [default=%default]")
+    parser.add_option("", "--pu-threshold", type="float", default=.5,
+                      help="arrival probability that triggers a proactive switch [default=%default]")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    (options, args) = parser.parse_args()
+
+    rng = random.Random(options.seed)
+    channels[:] = channel_plan.make_plan(options.channel_plan, options.start_freq,
+                                         options.end_freq, options.chan_bandwidth).freqs
+    if options.trace:
+        (times, freqs) = load_trace(options.trace)
+        for f in freqs:
+            if f not in channels:
+                channels.append(f)
+        duration = min(options.duration, times[-1])
+    else:
+        pattern = options.random and "random" or "serial"
+        (times, freqs) = make_trace(channels, options.channel_interval, options.duration,
+                                    pattern, options.jitter, rng)
+        duration = options.duration
+    pu = primary(times, freqs)
+
+    print "%-11s %10s %10s %10s %10s" % ("policy", "collision", "outage", "proactive", "reactive")
+    print "%-11s %10s %10s %10s %10s" % ("", "(% air)", "(% time)", "switches", "switches")
+    for (name, predictive) in (("reactive", False), ("predictive", True)):
+        n = node(pu, options, predictive, random.Random(options.seed))
+        n.run(duration)
+        print "%-11s %10.3f %10.3f %10d %10d" % \
+              (name, 100*n.collision/n.airtime, 100*n.outage/n.t, n.proactive, n.reactive)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
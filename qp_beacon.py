@@ -0,0 +1,148 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Quiet Period Beacon
+#
+# FuNLab
+# University of Washington
+#
+# A shared quiet period schedule so that every node goes silent and senses in
+# the same window, instead of each node counting DIFS events on its own and
+# sensing while its neighbours may still be transmitting.
+#
+# One node (--qp-beacon=master) owns the schedule and broadcasts it to the
+# reserved address 'z' after each quiet window. The beacon body is
+#
+#   seq       H    beacon sequence number
+#   interval  I    time between quiet windows, in us
+#   length    I    length of a quiet window, in us
+#   offset    I    time from sending this beacon to the next window, in us
+#
+# Followers (--qp-beacon=follower) place the next window at the time they
+# received the beacon plus offset, less their receive latency, so no clock
+# synchronization is needed. Between beacons every node runs the schedule on
+# its own clock; the guard time kept on both sides of each window covers the
+# drift and the receive jitter.
+# /////////////////////////////////////////////////////////////////////////////
+
+import math
+import struct
+
+BEACON_ADDRESS = 'z'
+
+_beacon = struct.Struct("!HIII")
+
+
+def encode_beacon(seq, interval, length, offset):
+    """
+    @param seq: beacon sequence number
+    @param interval: time between quiet windows (s)
+    @param length: quiet window length (s)
+    @param offset: time from now to the start of the next window (s)
+    @returns beacon body (without the addresses)
+    """
+    return _beacon.pack(seq & 0xffff, int(round(interval * 1e6)),
+                        int(round(length * 1e6)), max(0, int(round(offset * 1e6))))
+
+def decode_beacon(data):
+    """
+    @returns (seq, interval, length, offset), times in seconds
+    """
+    if len(data) != _beacon.size:
+        raise ValueError, "beacon is %d bytes, expected %d" % (len(data), _beacon.size)
+    (seq, interval, length, offset) = _beacon.unpack(data)
+    return (seq, interval / 1e6, length / 1e6, offset / 1e6)
+
+
+class qp_schedule(object):
+    """
+    Quiet windows of length seconds every interval seconds, on the local clock
+    """
+    def __init__(self, interval, length, guard=0.0, anchor=None):
+        """
+        @param interval: time between the starts of quiet windows (s)
+        @param length: quiet window length (s)
+        @param guard: silence kept on either side of each window to cover timing errors (s)
+        @param anchor: local time of the start of some window (None until known)
+        """
+        self.interval = interval
+        self.length = length
+        self.guard = guard
+        self.anchor = anchor
+        self.seq = 0                 # last beacon sent or heard
+        self.last_beacon = None      # local time the schedule was last set
+
+    def synced(self):
+        return self.anchor is not None
+
+    def next_start(self, now):
+        """
+        Return the start of the first window that hasn't ended by now
+        """
+        k = math.floor((now - self.anchor - self.length) / self.interval) + 1
+        return self.anchor + k * self.interval
+
+    def quiet(self, now):
+        """
+        True during a window or the guard time on either side of it
+        """
+        start = self.next_start(now - self.guard)
+        return start - self.guard <= now < start + self.length + self.guard
+
+    def time_to_quiet(self, now):
+        """
+        Return how long we may still transmit (0 if we're in a window or its guard)
+        """
+        if self.quiet(now):
+            return 0.0
+        return self.next_start(now) - self.guard - now
+
+    def resume_time(self, now):
+        """
+        Return when we may transmit again after the current (or next) window
+        """
+        return self.next_start(now - self.guard) + self.length + self.guard
+
+    def beacon(self, now):
+        """
+        Return the body of a beacon sent now (master only)
+        """
+        self.seq = (self.seq + 1) & 0xffff
+        start = self.next_start(now)
+        if start < now:
+            # sent from inside a window, point at the one after it
+            start += self.interval
+        return encode_beacon(self.seq, self.interval, self.length, start - now)
+
+    def heard(self, data, now, latency=0.0):
+        """
+        Adopt the schedule in a received beacon (follower only)
+
+        @param data: beacon body
+        @param now: local time the beacon was received
+        @param latency: how long after the end of the frame on air it gets here
+        @returns True if the beacon was valid
+        """
+        try:
+            (seq, interval, length, offset) = decode_beacon(data)
+        except (ValueError, struct.error):
+            return False
+        self.seq = seq
+        self.interval = interval
+        self.length = length
+        self.anchor = now - latency + offset
+        self.last_beacon = now
+        return True
+
+
+def add_options(normal, expert):
+    """
+    Adds quiet period beacon options to the Options Parser
+    """
+    expert.add_option("", "--qp-beacon", type="choice", choices=("none", "master", "follower"),
+                      default="none",
+                      help="share a quiet period schedule: none, master (sends it) or follower [default=%default]")
+    expert.add_option("", "--qp-period", type="eng_float", default=.5,
+                      help="time between network-wide quiet periods [default=%default]")
+    expert.add_option("", "--qp-guard", type="eng_float", default=.002,
+                      help="silence kept on either side of each quiet period for timing errors [default=%default]")
+    expert.add_option("", "--beacon-latency", type="eng_float", default=0,
+                      help="receive latency subtracted from beacon arrival times [default=%default]")
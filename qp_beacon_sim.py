@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Quiet Period Beacon Simulation
+#
+# FuNLab
+# University of Washington
+#
+# Compares quiet periods counted locally by each node (what qpcsmaca_mac does
+# without --qp-beacon) with network-wide quiet periods on the schedule of a
+# qp_beacon master.
+#
+# Every node has its own clock (offset and drift). The master sends a beacon
+# after each quiet window; followers hear it after a latency with some jitter,
+# or not at all, and otherwise run the schedule on their own clocks.
+#
+# The nodes share one channel carrying RTS/CTS/data/ACK exchanges from random
+# nodes. A node doesn't start an exchange that would run into its own quiet
+# window (or the guard time around a scheduled one). A quiet period is
+# clean if no other node transmitted during it; a node that senses while a
+# neighbour transmits sees the neighbour instead of the primary.
+#
+# For each configuration this prints
+#   - how far the followers' windows were from the master's (mean, 99th
+#     percentile and max, in us)
+#   - the fraction of clean quiet periods
+#   - the fraction of the time the channel carried data (throughput)
+#
+# python qp_beacon_sim.py --drift=20 --jitter=.0002 --loss=.05
+# /////////////////////////////////////////////////////////////////////////////
+
+from optparse import OptionParser
+import bisect
+import random
+
+import qp_beacon
+
+
+class clock(object):
+    """
+    A node's clock: local = true * (1 + drift) + offset
+    """
+    def __init__(self, drift, offset):
+        self.drift = drift
+        self.offset = offset
+
+    def local(self, t):
+        return t * (1.0 + self.drift) + self.offset
+
+    def true(self, local):
+        return (local - self.offset) / (1.0 + self.drift)
+
+
+def beacon_windows(options, length, rng):
+    """
+    Run the beacon protocol and return each node's quiet windows as a sorted
+    list of true start times (node 0 is the master).
+    """
+    clocks = [clock(0.0, 0.0)]
+    for i in range(1, options.nodes):
+        clocks.append(clock(rng.uniform(-options.drift, options.drift) * 1e-6,
+                            rng.uniform(0, 1000.0)))
+    scheds = [qp_beacon.qp_schedule(options.interval, length, options.guard)
+              for i in range(options.nodes)]
+    scheds[0].anchor = options.interval
+    windows = [[] for i in range(options.nodes)]
+
+    t = 0.0
+    while t < options.duration:
+        start = scheds[0].next_start(t)
+        windows[0].append(start)
+        for i in range(1, options.nodes):
+            if scheds[i].synced():
+                local_start = scheds[i].next_start(clocks[i].local(start - options.interval / 2))
+                windows[i].append(clocks[i].true(local_start))
+        # the master's beacon after the window
+        sent = start + length
+        body = scheds[0].beacon(sent)
+        for i in range(1, options.nodes):
+            if rng.random() < options.loss:
+                continue
+            heard = sent + options.airtime + options.latency + rng.gauss(0, options.jitter)
+            scheds[i].heard(body, clocks[i].local(heard), options.latency + options.airtime)
+        t = start + length + 1e-9
+    return windows
+
+def local_windows(options, length, rng):
+    """
+    Quiet windows counted locally: every interval on average, at each node's
+    own phase and with the jitter of counting DIFS events.
+    """
+    windows = []
+    for i in range(options.nodes):
+        w = []
+        t = rng.uniform(0, options.interval)
+        while t < options.duration:
+            w.append(t)
+            t += options.interval * rng.uniform(0.5, 1.5)
+        windows.append(w)
+    return windows
+
+def _quiet_until(starts, guard, length, t0, t1):
+    """
+    If [t0, t1) runs into one of the windows (or the guard around it), return
+    the end of that window's guard, else None
+    """
+    i = bisect.bisect_left(starts, t0 - length - guard)
+    while i < len(starts) and starts[i] - guard < t1:
+        if starts[i] + length + guard > t0:
+            return starts[i] + length + guard
+        i += 1
+    return None
+
+def traffic(options, windows, length, guard, rng):
+    """
+    Exchanges on the shared channel, as sorted (start, end, node)
+    """
+    exchanges = []
+    gap = options.exchange * (1.0 - options.load) / options.load
+    t = 0.0
+    while t < options.duration:
+        start = t + rng.expovariate(1.0 / gap)
+        node = rng.randrange(options.nodes)
+        while True:
+            end = _quiet_until(windows[node], guard, length, start, start + options.exchange)
+            if end is None:
+                break
+            start = end
+        exchanges.append((start, start + options.exchange, node))
+        t = start + options.exchange
+    return exchanges
+
+def evaluate(options, windows, exchanges, length):
+    starts = [e[0] for e in exchanges]
+    clean = 0
+    total = 0
+    for (node, w) in enumerate(windows):
+        for s in w:
+            if s + length > options.duration:
+                continue
+            total += 1
+            blinded = False
+            i = max(0, bisect.bisect_left(starts, s - options.exchange))
+            while i < len(exchanges) and exchanges[i][0] < s + length:
+                (t0, t1, sender) = exchanges[i]
+                if sender != node and t1 > s:
+                    blinded = True
+                    break
+                i += 1
+            if not blinded:
+                clean += 1
+    busy = sum([min(e[1], options.duration) - e[0] for e in exchanges if e[0] < options.duration])
+    return (clean / float(max(1, total)), busy / options.duration)
+
+def timing_errors(windows):
+    """
+    Return the followers' window start errors against the master, in seconds
+    """
+    errors = []
+    master = windows[0]
+    for w in windows[1:]:
+        for s in w:
+            i = bisect.bisect_left(master, s)
+            near = [abs(s - master[j]) for j in (i - 1, i) if 0 <= j < len(master)]
+            errors.append(min(near))
+    errors.sort()
+    return errors
+
+def main():
+    parser = OptionParser()
+    parser.add_option("", "--nodes", type="int", default=5,
+                      help="number of nodes [default=%default]")
+    parser.add_option("", "--interval", type="float", default=.5,
+                      help="time between quiet periods [default=%default]")
+    parser.add_option("", "--lengths", type="string", default=".03,.01",
+                      help="comma-separated quiet period lengths to try [default=%default]")
+    parser.add_option("", "--guard", type="float", default=.002,
+                      help="guard time around scheduled quiet periods [default=%default]")
+    parser.add_option("", "--exchange", type="float", default=.1606,
+                      help="length of an RTS/CTS/data/ACK exchange (4*ctl + 3*sifs) [default=%default]")
+    parser.add_option("", "--load", type="float", default=.6,
+                      help="offered load on the channel [default=%default]")
+    parser.add_option("", "--drift", type="float", default=20,
+                      help="max clock drift in ppm [default=%default]")
+    parser.add_option("", "--latency", type="float", default=.002,
+                      help="mean beacon receive latency (compensated) [default=%default]")
+    parser.add_option("", "--jitter", type="float", default=.0002,
+                      help="std of the beacon receive latency [default=%default]")
+    parser.add_option("", "--airtime", type="float", default=.005,
+                      help="beacon airtime [default=%default]")
+    parser.add_option("", "--loss", type="float", default=.05,
+                      help="probability a follower misses a beacon [default=%default]")
+    parser.add_option("", "--duration", type="float", default=300.0,
+                      help="seconds to simulate [default=%default]")
+    parser.add_option("", "--seed", type="int", default=0,
+                      help="random seed [default=%default]")
+    (options, args) = parser.parse_args()
+
+    print "%-10s %7s %7s %10s %10s %10s %8s %10s" % \
+          ("schedule", "length", "guard", "err mean", "err 99%", "err max", "clean", "throughput")
+    print "%-10s %7s %7s %10s %10s %10s %8s %10s" % \
+          ("", "(ms)", "(ms)", "(us)", "(us)", "(us)", "(%)", "(%)")
+    for length in [float(l) for l in options.lengths.split(",")]:
+        for mode in ("local", "beacon"):
+            rng = random.Random(options.seed)
+            if mode == "local":
+                windows = local_windows(options, length, rng)
+                guard = 0.0
+                err = "%10s %10s %10s" % ("-", "-", "-")
+            else:
+                windows = beacon_windows(options, length, rng)
+                guard = options.guard
+                e = timing_errors(windows)
+                err = "%10.1f %10.1f %10.1f" % (1e6*sum(e)/len(e), 1e6*e[int(.99*(len(e) - 1))],
+                                                1e6*e[-1])
+            exchanges = traffic(options, windows, length, guard, rng)
+            (clean, busy) = evaluate(options, windows, exchanges, length)
+            print "%-10s %7.1f %7.1f %s %8.1f %10.1f" % \
+                  (mode, length*1e3, guard*1e3, err, 100*clean, 100*busy)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -14,7 +14,8 @@
 # apended to the end of the packet. I'm reserving 
 # the characters 'x', 'y', and 'z' for special functions.
 # 'x' is a broadcast packet (all packets are broadcast for now
-# 'y', and 'z' are for future applications
+# 'y' carries cooperative sensing reports (see coop_sense.py)
+# 'z' carries the quiet period schedule beacon (see qp_beacon.py)
 #
 # ToDo:
 # I'm using RTS/CTS with broadcast packets, that can't work with more than 2 nodes
@@ -25,6 +26,11 @@ import time #for delay timing
 import random #for random backoff
 import threading #for main_loop
 from sense_path import * #for spectrum sensing
+from pu_predictor import pu_predictor #for proactive channel switching
+import channel_plan #for the default channel list
+import coop_sense #for sharing sensing results
+import qp_beacon #for network-wide quiet periods
+import spectrum_history #for remembering the band across runs
 
 # /////////////////////////////////////////////////////////////////////////////
 #                           Carrier Sense MAC
@@ -71,6 +77,19 @@ class cs_mac(threading.Thread):
         self.DIFS_time = 2*options.backoff + options.sifs #options.difs
         self.ctl_pkt_time = options.ctl
         self.backoff_time_unit = options.backoff
+        #time the waits for CTS/data/ACK from when our frame left the modulator
+        self.tx_complete = options.tx_complete
+        self.tx_finished = threading.Event()
+        self.tx_wait = 0 #how long to wait once it has
+        self.tx_seq = 0 #which frame we're waiting for
+        self.tx_timeout = 5*self.ctl_pkt_time #in case we never hear that it has
+        #send CTS/ACK SIFS after the end of the frame they answer
+        self.timed_response = options.timed_response
+        self.rx_at = 0 #when the last frame was handed to us
+        self.rx_end = None #when it ended on the air (--rx-metadata)
+        self.links = {} #sender -> [packets, SNR sum, packets with an SNR, last CFO]
+        self.tx_lead = 0 #how long a control frame takes to get out of the transmit path
+        self.response_gaps = [] #end of the received frame to our answer being out
         
         #spectrum sense parameters
         self.txrx_rate = options.samp_rate #transmit and receive bandwidth
@@ -84,6 +103,42 @@ class cs_mac(threading.Thread):
         self.qp_interval = options.qp_interval
         self.qp_counter = 0 #keep track of when we're at the qp interval
         self.old_freq = 0
+        #sense the current channel alongside the receiver (no valve or rate change)
+        self.concurrent_sense = options.concurrent_sense
+        if self.concurrent_sense:
+            self.channel_rate = self.txrx_rate
+        self.qp_outages = [] #time the receiver was cut off during each quiet period
+        #predict primary arrivals and move to a pre-validated backup channel
+        self.predict_pu = options.predict_pu
+        self.pu_horizon = options.pu_horizon
+        self.pu_threshold = options.pu_threshold
+        self.predictor = None #built in set_flow_graph, once we know the channels
+        self.proactive_switches = 0
+        self.reactive_switches = 0
+        #share sensing reports with the other nodes and fuse theirs with ours
+        self.coop = None
+        self.coop_schedule = None #built in set_flow_graph, once we know the channels
+        self.coop_options = options
+        if options.coop_sense != "none":
+            self.coop = coop_sense.occupancy_view(self.thresh_primary, options.coop_sense,
+                                                  options.coop_k, options.coop_max_age)
+        self.last_level = None #power (dB) seen in the last quiet period
+        #quiet periods on a schedule shared by beacon instead of counted locally
+        self.qp_beacon = options.qp_beacon
+        self.qp_sched = None
+        if self.qp_beacon != "none":
+            self.qp_sched = qp_beacon.qp_schedule(options.qp_period, self.sense_time,
+                                                  options.qp_guard)
+        self.beacon_latency = options.beacon_latency
+        self.exchange_time = 4*self.ctl_pkt_time + 3*self.SIFS_time #RTS, CTS, data, ACK
+        self.qp_sensed = None #start of the last scheduled quiet period we sensed in
+        self.qp_late = [] #how late we started sensing in each scheduled quiet period
+        self.beacons = 0 #beacons sent (master) or heard (follower)
+        #record sensing results on disk and pick the first channel from them
+        self.history = None
+        if options.history_db is not None:
+            self.history = spectrum_history.spectrum_history(options.history_db)
+        self.history_min_obs = options.history_min_obs
         
         #used in calculating the avg power in dB
         self.k = 0
@@ -110,6 +165,9 @@ class cs_mac(threading.Thread):
             last_sense = time.clock()
             last_call = time.clock()
             #i = 0
+            if self.qp_beacon == "master":
+                #the first network-wide quiet period
+                self.qp_sched.anchor = time.time() + self.qp_sched.interval
             #do this until we get stopped by the host
             while not self.stopped(): # or len(self.tx_queue) > 0:
                 #last_call = time.clock()
@@ -117,6 +175,10 @@ class cs_mac(threading.Thread):
                 #times.append(time.clock() - last_call)
                 
                 #i += 1
+                if self.qp_sched is not None and self.qp_sched.synced():
+                    if self.scheduled_quiet_period():
+                        times.append(time.clock() - last_sense)
+                        last_sense = time.clock()
                 if self.next_call == "QP":
                     #it's time to sense the spectrum
                     self.next_call = self.sense_time
@@ -124,14 +186,15 @@ class cs_mac(threading.Thread):
                     #test code (measure time between senses)
                     times.append(time.clock() - last_sense)
                     last_sense = time.clock()
-                    
-                    occupied = self.sense_current_freq()
-                    if occupied == 1: #one means a primary is using the channel
-                        #change channels
-                        new_freq = self.find_best_freq()
+                    self.run_quiet_period()
                     while self.next_call != "NOW" and (time.clock() - last_call < self.next_call):
                         #if sensing didn't take a long as we thought it would, wait for a while
                         pass
+                if self.next_call == "TX" and (self.tx_finished.isSet() or
+                                               time.clock() - last_call > self.tx_timeout):
+                    #our frame is out, time the wait for the answer from now
+                    self.next_call = self.tx_wait
+                    last_call = time.clock()
                 if self.next_call == "NOW" or (self.next_call != 0 and 
                                                time.clock() - last_call > self.next_call):
                     #run the MAC state machine
@@ -150,10 +213,88 @@ class cs_mac(threading.Thread):
                 variance += (value - mean)**2
             variance = variance/(len(times) - 1)
             print "variance of sensing periods:  ", variance
+            if len(self.qp_outages) > 0:
+                print "avg rx outage per quiet period: ", sum(self.qp_outages)/len(self.qp_outages)
+                print "max rx outage per quiet period: ", max(self.qp_outages)
+            if self.predictor is not None:
+                print "channel switches: %d proactive, %d after a primary showed up" % \
+                      (self.proactive_switches, self.reactive_switches)
+            if len(self.response_gaps) > 0:
+                gaps = sorted(self.response_gaps)
+                mean = sum(gaps)/len(gaps)
+                print "avg/std/99th response gap: ", mean, \
+                      math.sqrt(sum([(g - mean)**2 for g in gaps])/len(gaps)), \
+                      gaps[min(len(gaps) - 1, int(.99*len(gaps)))]
+            for sender in sorted(self.links.keys()):
+                (n, snr_sum, snr_n, cfo) = self.links[sender]
+                print "link from %s: %d packets, avg SNR %s dB, last CFO %s Hz" % \
+                      (sender, n, snr_n > 0 and "%.1f" % (snr_sum/snr_n) or "-",
+                       cfo is not None and "%.0f" % cfo or "-")
+            if len(self.qp_late) > 0:
+                print "scheduled quiet periods: %d, beacons %s: %d" % \
+                      (len(self.qp_late), self.qp_beacon == "master" and "sent" or "heard",
+                       self.beacons)
+                print "avg/max quiet period start lateness: ", \
+                      sum(self.qp_late)/len(self.qp_late), max(self.qp_late)
+            if self.history is not None:
+                self.history.close()
+            self.tb.radio.print_stats()
             self._done = True
         except KeyboardInterrupt:
             self._done = True
                 
+    def run_quiet_period(self):
+        """
+        Sense the current channel (and share the result) and change channels if
+        a primary is, or soon will be, using it.
+        """
+        outage = self.tb.radio.rx_outage_time()
+        
+        occupied = self.sense_current_freq()
+        if self.coop is not None:
+            self.share_sensing()
+        if self.predictor is not None:
+            self.predict_and_switch(occupied)
+        elif occupied == 1 and self.coop is not None:
+            self.coop_best_freq()
+        elif occupied == 1: #one means a primary is using the channel
+            #change channels
+            new_freq = self.find_best_freq()
+        self.qp_outages.append(self.tb.radio.rx_outage_time() - outage)
+
+    def scheduled_quiet_period(self):
+        """
+        Run the quiet period if the shared schedule says one has started, stay
+        quiet until its end and (master) send the next beacon.
+        
+        @returns True if there was a quiet period
+        """
+        now = time.time()
+        start = self.qp_sched.next_start(now)
+        if now < start or start == self.qp_sensed:
+            return False
+        self.qp_sensed = start
+        self.qp_late.append(now - start)
+        self.run_quiet_period()
+        #stay off the air until everyone is done sensing
+        remaining = start + self.qp_sched.length + self.qp_sched.guard - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+        if self.qp_beacon == "master":
+            self.tb.txpath.send_pkt(qp_beacon.BEACON_ADDRESS + self.address +
+                                    self.qp_sched.beacon(time.time()))
+            self.beacons += 1
+        return True
+
+    def clear_to_send(self):
+        """
+        False if an RTS/CTS/data/ACK exchange started now would run into the
+        next scheduled quiet period
+        """
+        if self.qp_sched is None or not self.qp_sched.synced():
+            return True
+        return self.qp_sched.time_to_quiet(time.time()) >= self.exchange_time
+
     def stop(self):
         """
         Called from an outside process to stop the state machine.
@@ -187,6 +328,15 @@ class cs_mac(threading.Thread):
         for tap in mywindow:
             power += tap*tap		
         self.k = -20*math.log10(self.tb.sense.fft_size)-10*math.log10(power/self.tb.sense.fft_size)
+        if self.predict_pu:
+            self.predictor = pu_predictor(self.tb.sense.channels, horizon=self.pu_horizon,
+                                          threshold=self.pu_threshold)
+        if self.coop is not None:
+            o = self.coop_options
+            self.coop_schedule = coop_sense.sense_schedule(self.tb.sense.channels, o.coop_index,
+                                                           o.coop_nodes, o.coop_share)
+        # RTS to broadcast; the other control frames are cached the first time they go out
+        self.tb.txpath.precompute_ctl(["x" + self.address + "RTS"])
     
     def set_error_array(self, array):
     	self.err_array = array
@@ -209,34 +359,28 @@ class cs_mac(threading.Thread):
         @param hold_freq: determines whether the PHY will switch channels as it senses.
         """
         #set frequency hold
-        self.old_freq = self.tb.u_snk.get_center_freq()
+        self.old_freq = self.tb.radio.center_freq()
         #print self.old_freq
         if not hold_freq:
             self.tb.sense.current_chan = self.tb.sense.num_channels
         #    self.tb.sense.next_freq = self.tb.sense.channels[0] #min_center_freq
         self.tb.sense.set_hold_freq(hold_freq)
-        #stop rcving
-        self.tb.rx_valve.set_enabled(False)
-        #set rate
-        self.tb.set_rate(self.channel_rate)
-        #flush the queue
-        self.tb.sense.msgq.flush()
-        #start the spectrum sense
-        self.tb.sense_valve.set_enabled(True)
+        if self.concurrent_sense and hold_freq:
+            #in-channel sense: tap the stream the receiver is already using
+            self.tb.radio.switch_mode("sense", self.txrx_rate, rx_enabled=True,
+                                      sense_enabled=True, flush=self.tb.sense.msgq)
+            return
+        #stop rcving, set rate, flush the queue and start the spectrum sense
+        self.tb.radio.switch_mode("sense", self.channel_rate, rx_enabled=False,
+                                  sense_enabled=True, flush=self.tb.sense.msgq)
     
     def prep_to_txrx(self):
         """
         Prepare the PHY to transmit and receive data
         """
-        #done sensing
-        self.tb.sense_valve.set_enabled(False)
-        #flush the queue
-        #self.tb.sense.msgq.flush()
-        
-        #reset rate
-        self.tb.set_rate(self.txrx_rate)
-        #start rcving
-        self.tb.rx_valve.set_enabled(True)
+        #done sensing, reset rate and start rcving
+        self.tb.radio.switch_mode("txrx", self.txrx_rate, rx_enabled=True,
+                                  sense_enabled=False)
         
     def find_best_freq(self):
         """
@@ -265,6 +409,14 @@ class cs_mac(threading.Thread):
                 for item in m.data:
                     temp_list.append(10*math.log10(item) + self.k)
                 fft_sum_db = sum(temp_list)/m.vlen
+                #which channel of the plan this was (None if it's in none of them)
+                chan = self.tb.sense.plan.index_of(m.center_freq)
+                if self.predictor is not None and chan is not None:
+                    self.predictor.observe(self.tb.sense.channels[chan],
+                                           fft_sum_db > self.thresh_primary, time.time())
+                if self.history is not None and chan is not None:
+                    self.history.add(self.tb.sense.channels[chan], fft_sum_db,
+                                     fft_sum_db > self.thresh_primary)
                 
                 #print m.center_freq, fft_sum_db
                 
@@ -275,10 +427,10 @@ class cs_mac(threading.Thread):
                 #    pass
                 #else: #elif fft_sum_db < best_freq[1] or best_freq[1] == 0:
                 
-                #the >200MHz thing is because sometimes m.center_freq is returned 
-                #as 0 for some reason (bug somewhere?)
-                if fft_sum_db < self.thresh_primary and m.center_freq > 200000000:
-                    frequencies.append(m.center_freq)#= frequencies + "0"#
+                #the plan lookup also drops the messages where m.center_freq
+                #is returned as 0 for some reason (bug somewhere?)
+                if fft_sum_db < self.thresh_primary and chan is not None:
+                    frequencies.append(self.tb.sense.channels[chan])#= frequencies + "0"#
                     power_levels.append(fft_sum_db)
                 #else:
                 #    frequencies = frequencies + "1"
@@ -287,14 +439,15 @@ class cs_mac(threading.Thread):
         #log_file = open('sense_log.dat', 'a')
         #log_file.write(frequencies)
         #log_file.close()                
-        #TODO: stop cheating
-        if self.old_freq == self.tb.sense.channels[1]:
-            best_freq = self.tb.sense.channels[4]
+        if self.tb.sense.channels == channel_plan.DEFAULT_CHANNELS:
+            #TODO: stop cheating
+            if self.old_freq == self.tb.sense.channels[1]:
+                best_freq = self.tb.sense.channels[4]
+            else:
+                best_freq = self.tb.sense.channels[1]
         else:
-            best_freq = self.tb.sense.channels[1]
-        #TODO: this is what it should be
-        #best_freq = power_levels.index(min(power_levels)) #choose the best frequency
-        #best_freq = frequencies[best_freq]
+            #a real channel plan, pick from what we sensed
+            best_freq = self.pick_channel(frequencies, power_levels)
         
         print "\nchoosing frequency ", best_freq, " at time ", time.strftime("%X")
         #print 
@@ -302,9 +455,54 @@ class cs_mac(threading.Thread):
         self.prep_to_txrx()
         return best_freq
 		
-    def sense_current_freq(self):
+    def autoselect_freq(self):
         """
-        sense the current channel and look for a primary user
+        Pick the first channel. With a spectrum history this is the channel
+        that has been idlest at this hour of day, checked with a single sense;
+        a full sweep (find_best_freq) is only needed without history or if a
+        primary is there now.
+        """
+        if self.history is not None:
+            exclude = []
+            while len(exclude) < 2:
+                freq = self.history.quietest(self.tb.sense.channels, time.time(),
+                                             self.history_min_obs, exclude)
+                if freq is None:
+                    break
+                self.switch_freq(freq)
+                if self.sense_current_freq() != 1:
+                    return freq
+                exclude.append(freq)
+        return self.find_best_freq()
+
+    def pick_channel(self, frequencies, power_levels):
+        """
+        Choose the quietest idle channel, staying off the channel we left and
+        the ones next to it (the primary leaks into those).
+        
+        @param frequencies: channels sensed idle
+        @param power_levels: their average power in dB
+        @returns the channel, or self.old_freq if none was sensed idle
+        """
+        if len(frequencies) == 0:
+            return self.old_freq
+        plan = self.tb.sense.plan
+        avoid = set()
+        old_chan = plan.index_of(self.old_freq)
+        if old_chan is not None:
+            avoid.add(plan[old_chan])
+            for j in plan.adjacent(old_chan):
+                avoid.add(plan[j])
+        best = None
+        for (freq, level) in zip(frequencies, power_levels):
+            key = (freq in avoid, level)
+            if best is None or key < best[0]:
+                best = (key, freq)
+        return best[1]
+		
+    def sense_level(self):
+        """
+        sense the channel the radio is tuned to and return its average power in dB
         """
         self.prep_to_sense(True)
         #do the sensing
@@ -316,6 +514,19 @@ class cs_mac(threading.Thread):
         fft_sum_db = sum(temp_list)/m.vlen
         #print fft_sum_db
         
+        self.prep_to_txrx()
+        return fft_sum_db
+		
+    def sense_current_freq(self):
+        """
+        sense the current channel and look for a primary user
+        """
+        fft_sum_db = self.sense_level()
+        self.last_level = fft_sum_db
+        if self.history is not None:
+            self.history.add(self.tb.radio.center_freq(), fft_sum_db,
+                             fft_sum_db > self.thresh_primary)
+        
         #do threshold comparisons
         ret_val = 0
         if fft_sum_db > self.thresh_primary:
@@ -326,16 +537,113 @@ class cs_mac(threading.Thread):
         elif fft_sum_db > self.thresh_qp:
             ret_val = 3
         
-        self.prep_to_txrx()
-        
         return ret_val
 
-    def phy_rx_callback(self, ok, payload):
+    def sense_freq(self, freq):
+        """
+        sense another channel, then tune back to the current one
+        
+        @param freq: channel to sense
+        @returns average power in dB
+        """
+        home = self.tb.radio.center_freq()
+        self.tb.set_freq(freq)
+        fft_sum_db = self.sense_level()
+        self.tb.set_freq(home)
+        if self.history is not None:
+            self.history.add(freq, fft_sum_db, fft_sum_db > self.thresh_primary)
+        return fft_sum_db
+
+    def switch_freq(self, freq):
+        """
+        move to a channel without sweeping
+        """
+        print "\nchoosing frequency ", freq, " at time ", time.strftime("%X")
+        self.tb.set_freq(freq)
+
+    def validate_backup(self, now):
+        """
+        sense the channel the predictor likes best and keep it as the backup
+        if it is idle.
+        
+        @returns the backup frequency or None
+        """
+        current = self.tb.radio.center_freq()
+        candidate = self.predictor.candidate(now, exclude=[current])
+        if candidate is None:
+            return None
+        busy = self.sense_freq(candidate) > self.thresh_primary
+        self.predictor.observe(candidate, busy, time.time())
+        if busy:
+            return None
+        self.predictor.set_backup(candidate, now)
+        return candidate
+
+    def share_sensing(self):
+        """
+        sense this node's share of the other channels, add them and the quiet
+        period result to the fused view, and broadcast them to the other nodes
+        """
+        current = self.tb.radio.center_freq()
+        measurements = [(current, self.last_level, time.time())]
+        for freq in self.coop_schedule.next():
+            if freq != current:
+                measurements.append((freq, self.sense_freq(freq), time.time()))
+        for (freq, level, t) in measurements:
+            self.coop.add(self.address, freq, level, t)
+        self.tb.txpath.send_pkt(coop_sense.REPORT_ADDRESS + self.address +
+                                coop_sense.encode_report(measurements, time.time()))
+
+    def coop_best_freq(self):
+        """
+        move to the quietest channel the fused view says is idle, sweeping
+        only if it doesn't know of one
+        """
+        self.old_freq = self.tb.radio.center_freq()
+        idle = self.coop.idle_channels(self.tb.sense.channels, time.time())
+        frequencies = [freq for (level, freq) in idle if freq != self.old_freq]
+        if len(frequencies) == 0:
+            return self.find_best_freq()
+        power_levels = [level for (level, freq) in idle if freq != self.old_freq]
+        best_freq = self.pick_channel(frequencies, power_levels)
+        self.switch_freq(best_freq)
+        return best_freq
+
+    def predict_and_switch(self, occupied):
+        """
+        feed the quiet period result to the primary predictor and change channels
+        before the primary arrives if it is likely to. Falls back to a sweep
+        (find_best_freq) if a primary is here and there is no backup.
+        
+        @param occupied: result of sense_current_freq
+        """
+        now = time.time()
+        current = self.tb.radio.center_freq()
+        self.predictor.observe(current, occupied == 1, now)
+        if occupied == 1:
+            backup = self.predictor.backup(now)
+            if backup is None:
+                self.find_best_freq()
+            else:
+                self.switch_freq(backup)
+            self.predictor.clear_backup()
+            self.reactive_switches += 1
+        elif self.predictor.arrival_likely(current, now):
+            backup = self.predictor.backup(now)
+            if backup is None and self.predictor.should_validate(now):
+                backup = self.validate_backup(now)
+            if backup is not None:
+                self.switch_freq(backup)
+                self.predictor.clear_backup()
+                self.proactive_switches += 1
+
+    def phy_rx_callback(self, ok, payload, meta=None):
         """
         Invoked by thread associated with PHY to pass received packet up.
 
         @param ok: bool indicating whether payload CRC was OK
         @param payload: contents of the packet (string)
+        @param meta: rx_metadata of the packet (--rx-metadata), or None
         """
         #if the rcvd packet is empty or from this node, ignore it completely
         if len(payload) == 0 or (payload[1] == self.address):
@@ -353,7 +661,35 @@ class cs_mac(threading.Thread):
             
         if ok:
             #the packet probably isn't corrupted and it's not from this node
-            self.sender = payload[1]
+            if payload[0] == coop_sense.REPORT_ADDRESS: #another node's sensing report
+                #not for us to answer, so it leaves sender and the timing below alone
+                if self.coop is not None:
+                    self.coop.add_report(payload[1], payload[2:], time.time())
+                return
+            sender = payload[1]
+            rx_at = time.time()
+            rx_end = None
+            if meta is not None:
+                rx_end = meta.rx_time
+                link = self.links.setdefault(sender, [0, 0.0, 0, None])
+                link[0] += 1
+                if meta.snr is not None:
+                    link[1] += meta.snr
+                    link[2] += 1
+                link[3] = meta.cfo
+            if payload[0] == qp_beacon.BEACON_ADDRESS: #the quiet period schedule
+                #from the beacon master, not for us to answer either
+                heard_at = rx_end
+                if heard_at is None:
+                    heard_at = rx_at
+                if self.qp_beacon == "follower" and \
+                   self.qp_sched.heard(payload[2:], heard_at, self.beacon_latency):
+                    self.beacons += 1
+                return
+            #who a CTS/ACK goes to, and the end of the frame it answers
+            self.sender = sender
+            self.rx_at = rx_at
+            self.rx_end = rx_end
             payload = payload[2:]
             if self.verbose:
                 print "RX: ", payload, ", State: ", self.state, ", backoff: ", self.backoff, ", next call: ", self.next_call
@@ -383,6 +719,68 @@ class cs_mac(threading.Thread):
             #as soon as possible.
             self.next_call = "NOW"
     
+    def send_and_wait(self, pkt, wait, ctl=False):
+        """
+        Send a frame and run the state machine again wait seconds later. With
+        --tx-complete the wait starts when the frame has left the modulator
+        instead of when it was handed to the transmit path, so frames queued
+        ahead of it don't eat into the time the other node has to answer.
+
+        @param ctl: pkt is a control frame (RTS/CTS), see txpath.send_ctl
+        """
+        if ctl:
+            send = self.tb.txpath.send_ctl
+        else:
+            send = self.tb.txpath.send_pkt
+        if not self.tx_complete:
+            send(pkt)
+            self.next_call = wait
+            return
+        self.tx_finished.clear()
+        self.tx_wait = wait
+        self.tx_seq += 1
+        seq = self.tx_seq
+        self.next_call = "TX"
+        send(pkt, callback=lambda t: self.tx_done(seq, t))
+
+    def respond(self, pkt):
+        """
+        Send a control frame (CTS/ACK) SIFS after the frame it answers ended
+        on the air (--timed-response). The end comes from the receive path's
+        samples (--rx-metadata, --rx-timestamps) if it has one for this frame,
+        otherwise it's when the frame was handed to us. The send is timed to
+        the microsecond, earlier by how long control frames have been taking
+        to get out.
+        """
+        end = self.rx_end
+        if end is None:
+            end = self.tb.rxpath.last_frame_end()
+        if end is None or end > self.rx_at or self.rx_at - end > self.ctl_pkt_time:
+            end = self.rx_at
+        deadline = end + self.SIFS_time - self.tx_lead
+        remaining = deadline - time.time()
+        if remaining > .002:
+            time.sleep(remaining - .002)
+        while time.time() < deadline:
+            pass
+        sent = time.time()
+        self.tb.txpath.send_ctl(pkt, callback=lambda t: self.response_out(sent, end, t))
+
+    def response_out(self, sent, end, t):
+        """
+        Called by the transmit path when a frame sent by respond is out
+        """
+        self.tx_lead = min(.9*self.tx_lead + .1*(t - sent), self.SIFS_time)
+        self.response_gaps.append(t - end)
+
+    def tx_done(self, seq, t):
+        """
+        Called by the transmit path when a frame sent by send_and_wait is out
+        (ignored if we have given up on it and sent another one since)
+        """
+        if seq == self.tx_seq:
+            self.tx_finished.set()
+
     def state_machine(self):
         """
         State machine for qpCSMA/CA MAC.
@@ -420,9 +818,13 @@ class cs_mac(threading.Thread):
                          log_file = open('csma_ca_mac_log.dat', 'w')
                          log_file.write("TX:" + self.sender + self.address + "CTS")
                          log_file.close()
-                    self.tb.txpath.send_pkt(self.sender + self.address + "CTS")
                     self.state = 6
-                    self.next_call = self.SIFS_time + self.ctl_pkt_time
+                    if self.timed_response:
+                        self.respond(self.sender + self.address + "CTS")
+                        self.next_call = self.SIFS_time + self.ctl_pkt_time
+                    else:
+                        self.send_and_wait(self.sender + self.address + "CTS",
+                                           self.SIFS_time + self.ctl_pkt_time, ctl=True)
             elif len(self.tx_queue) > 0: #nobody wants to send to us and we want to send
                 if not self.tb.carrier_sensed() and self.tx_tries < self.packet_lifetime:
                     self.state = 2
@@ -451,7 +853,7 @@ class cs_mac(threading.Thread):
                     #TODO: Make sure this way of dealing with backoff and qp fits Chitto's algorithm
                 #    self.backoff = self.backoff - self.quiet_period
                 self.state = 3
-                if self.qp_counter == 0:
+                if self.qp_counter == 0 and (self.qp_sched is None or not self.qp_sched.synced()):
                     self.next_call = "QP"
                 else:
                     self.next_call = self.backoff_time_unit
@@ -461,16 +863,21 @@ class cs_mac(threading.Thread):
         elif self.state == 3: #backoff state
             if cb and not self.tb.carrier_sensed(): #we're still ok, so keep backing off
                 self.backoff -= 1
-                if self.backoff <= 0:
+                if self.backoff <= 0 and not self.clear_to_send():
+                    #the exchange wouldn't finish before the network goes quiet, wait it out
+                    self.backoff = 0
+                    self.next_call = self.qp_sched.resume_time(time.time()) - time.time() + \
+                                     self.backoff_time_unit
+                elif self.backoff <= 0:
                     #self.ready_to_backoff = 0
                     if self.log_mac:
                         log_file = open('csma_ca_mac_log.dat', 'w')
                         log_file.write("TX:" + self.tx_queue[0][0] + self.address + "RTS")
                         log_file.close()
-                    self.tb.txpath.send_pkt(self.tx_queue[0][0] + self.address + "RTS")
                     self.tx_tries += 1
                     self.state = 4
-                    self.next_call = self.SIFS_time + self.ctl_pkt_time
+                    self.send_and_wait(self.tx_queue[0][0] + self.address + "RTS",
+                                       self.SIFS_time + self.ctl_pkt_time, ctl=True)
                 else:
                     #if self.ready_to_backoff != 0:
                         #self.backoff_times.append(time.clock() - self.ready_to_backoff)
@@ -491,9 +898,8 @@ class cs_mac(threading.Thread):
                     log_file = open('csma_ca_mac_log.dat', 'w')
                     log_file.write("TX:" + self.tx_queue[0])
                     log_file.close()
-                self.tb.txpath.send_pkt(self.tx_queue[0])
                 self.state = 5
-                self.next_call = self.SIFS_time + self.ctl_pkt_time
+                self.send_and_wait(self.tx_queue[0], self.SIFS_time + self.ctl_pkt_time)
         elif self.state == 5: #data sent, wait for ACK
             if self.ACK_rcvd == True:
                 #awesome, we're done
@@ -505,7 +911,12 @@ class cs_mac(threading.Thread):
             self.state = 0
             self.next_call = "NOW"
         elif self.state == 6: #RTS rcvd, sent CTS
-            if self.DAT_rcvd:
+            if self.DAT_rcvd and self.timed_response:
+                #answer now, respond waits out the SIFS
+                self.DAT_rcvd = False
+                self.state = 7
+                self.next_call = "NOW"
+            elif self.DAT_rcvd:
                 self.DAT_rcvd = False
                 self.state = 7
                 self.next_call = self.SIFS_time
@@ -518,7 +929,10 @@ class cs_mac(threading.Thread):
                     log_file = open('csma_ca_mac_log.dat', 'w')
                     log_file.write("TX:" + self.sender + self.address + "ACK")
                     log_file.close()
-                self.tb.txpath.send_pkt(self.sender + self.address + "ACK")
+                if self.timed_response:
+                    self.respond(self.sender + self.address + "ACK")
+                else:
+                    self.tb.txpath.send_ctl(self.sender + self.address + "ACK")
             self.state = 0
             self.next_call = "NOW"
         else:
@@ -539,6 +953,10 @@ class cs_mac(threading.Thread):
         #                  help="set DIFS time [default=%default]")
         expert.add_option("", "--ctl", type="eng_float", default=.04,
                           help="set control packet time [default=%default]")
+        expert.add_option("", "--tx-complete", action="store_true", default=False,
+                          help="time CTS/data/ACK waits from when our frame left the modulator [default=%default]")
+        expert.add_option("", "--timed-response", action="store_true", default=False,
+                          help="send CTS/ACK SIFS after the end of the frame they answer [default=%default]")
         expert.add_option("", "--backoff", type="eng_float", default=.005,
                           help="set backoff time [default=%default]")
         expert.add_option("", "--packet-lifetime", type="int", default=5,
@@ -559,5 +977,16 @@ class cs_mac(threading.Thread):
                           help="set quiet period length in seconds [default=%default]") 
         expert.add_option("", "--qp-interval", type="int", default=1,
                           help="set number of DIFS between qp [default=%default]") 
+        expert.add_option("", "--concurrent-sense", action="store_true", default=False,
+                          help="sense the current channel at the TX/RX rate without stopping the receiver [default=%default]")
+        coop_sense.add_options(normal, expert)
+        qp_beacon.add_options(normal, expert)
+        spectrum_history.add_options(normal, expert)
+        expert.add_option("", "--predict-pu", action="store_true", default=False,
+                          help="predict primary arrivals and switch to a pre-validated backup channel [default=%default]")
+        expert.add_option("", "--pu-horizon", type="eng_float", default=1.0,
+                          help="how far ahead in seconds to predict primary arrivals [default=%default]")
+        expert.add_option("", "--pu-threshold", type="eng_float", default=.5,
+                          help="arrival probability that triggers a proactive switch [default=%default]")
     # Make a static method to call before instantiation
     add_options = staticmethod(add_options)
\ No newline at end of file
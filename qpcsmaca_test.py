@@ -25,6 +25,7 @@ import time
 import struct
 import sys
 import os
+import copy
 
 # from current dir
 from transmit_path import transmit_path
@@ -33,6 +34,8 @@ from receive_path import receive_path
 from qpcsmaca_mac import *
 #spectrum sense code
 from sense_path import *
+from radio_state import radio_state
+import iq_replay
     
 
 # /////////////////////////////////////////////////////////////////////////////
@@ -57,15 +60,33 @@ class usrp_graph(gr.top_block):
         #    sys.stderr.write("-f FREQ or --freq FREQ or --rx-freq FREQ must be specified\n")
         #    raise SystemExit
 
-        # Set up USRP sink and source
-        self._setup_usrp_sink()
-        self._setup_usrp_source()
+        # Set up USRP sink and source (or play back captures)
+        if options.replay is not None:
+            self.u_snk = iq_replay.null_usrp_sink()
+            self.u_snk.set_samp_rate(self._samp_rate)
+            self.u_src = iq_replay.make_source(options)
+            self.u_src.set_samp_rate(self._samp_rate)
+        else:
+            self._setup_usrp_sink()
+            self._setup_usrp_source()
 
         self.txpath = transmit_path(options)
         self.rxpath = receive_path(callback, options)
         self.rx_valve = gr.copy(gr.sizeof_gr_complex)
+        self.sense_valve = gr.copy(gr.sizeof_gr_complex)
+
+        # all rate, frequency and valve changes go through here so that
+        # mode switches only touch the settings that actually change
+        self.radio = radio_state(self.u_src, self.u_snk, self.rx_valve, self.sense_valve,
+                                 samp_rate=self._samp_rate)
                 
-        self.sense = sense_path(self.set_freq, options)
+        if options.concurrent_sense:
+            # the sense branch runs at the TX/RX rate next to the receive path
+            sense_options = copy.copy(options)
+            sense_options.channel_rate = self._samp_rate
+            self.sense = sense_path(self.set_freq, sense_options)
+        else:
+            self.sense = sense_path(self.set_freq, options)
         
         # Set center frequency of USRP
         ok = self.set_freq(self.sense.channels[0]) #self._tx_freq)
@@ -73,13 +94,12 @@ class usrp_graph(gr.top_block):
             print "Failed to set Tx frequency to %s" % (eng_notation.num_to_str(self.sense.channels[0]),)
             raise ValueError
         
-        self.sense_valve = gr.copy(gr.sizeof_gr_complex)
-        
-        self.rx_valve.set_enabled(True)
-        self.sense_valve.set_enabled(False)
+        self.radio.set_valves(rx_enabled=True, sense_enabled=False)
 
         self.connect(self.txpath, self.u_snk)
         self.connect(self.u_src, self.rx_valve, self.rxpath)
+        # with --concurrent-sense the sense valve only gates the sense branch
+        # (so bin_statistics doesn't block on a full queue between quiet periods)
         self.connect(self.u_src, self.sense_valve, self.sense)
         
         if options.verbose:
@@ -99,8 +119,7 @@ class usrp_graph(gr.top_block):
         """
         Set the sample rate of the USRP
         """
-        self.u_src.set_samp_rate(rate)
-        self.u_snk.set_samp_rate(rate)
+        self.radio.set_rate(rate)
 
     def _setup_usrp_sink(self):
         """
@@ -144,12 +163,10 @@ class usrp_graph(gr.top_block):
         the result of that operation and our target_frequency to
         determine the value for the digital up converter.
         """
-        r_snk = self.u_snk.set_center_freq(target_freq, 0)
-        r_src = self.u_src.set_center_freq(target_freq, 0)
-        if r_snk and r_src:
-            return True
-
-        return False
+        if target_freq != self.radio.center_freq():
+            # the noise floor on the new channel may be different (--auto-threshold)
+            self.rxpath.reset_noise_floor()
+        return self.radio.set_freq(target_freq)
 
     def add_options(normal, expert):
         """
@@ -173,6 +190,7 @@ class usrp_graph(gr.top_block):
                           help="print min and max Tx gain available")
         expert.add_option("", "--snr", type="eng_float", default=30,
                           help="set the SNR of the Rx channel in dB [default=%default]")
+        iq_replay.add_options(normal, expert)
     # Make a static method to call before instantiation
     add_options = staticmethod(add_options)
 
@@ -250,7 +268,8 @@ def main():
                       help="set the time between sending each packet (s) [default=%default]")
     parser.add_option("", "--pkt-padding", type="int", default=1000,
                       help="pad packet with pkt-padding number of extra chars [default=%default]")
-    parser.add_option("","--autoselect-freq", action="store_true", default=False)
+    parser.add_option("","--autoselect-freq", action="store_true", default=False,
+                      help="pick the first channel (from --history-db if there is one) before starting [default=%default]")
     parser.add_option("", "--test-time", type="int", default=500,
                       help="number of seconds to run the test for [default=%default]")
 
@@ -317,8 +336,10 @@ def main():
 
     tb.start()    # Start executing the flow graph (runs in separate threads)
 
+    tb.rxpath.calibrate_noise_floor(options.calibrate_time)    # --auto-threshold
+
     if options.autoselect_freq:
-        new_freq = mac.find_best_freq()
+        new_freq = mac.autoselect_freq()
         raw_input("Press Enter to begin transmitting") 
 
     #n = 0
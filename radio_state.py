@@ -0,0 +1,192 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Radio State Cache
+#
+# FuNLab
+# University of Washington
+#
+# Keeps track of what was last pushed to the USRP source/sink pair and to the
+# rx/sense valves. Every quiet period the MAC switches between TX/RX and sense
+# mode, and some of what those switches ask for (the frequency, a valve) is
+# already in place. UHD calls are slow (a rate change can take milliseconds),
+# so only the settings that actually change are sent. The sample rate changes
+# on every such switch though, so that is where the time goes; only sensing at
+# the TX/RX rate (--concurrent-sense) avoids it.
+#
+# Mode switches are timed so the cost of a quiet period can be measured.
+# /////////////////////////////////////////////////////////////////////////////
+
+import time
+
+
+class radio_state(object):
+    """
+    Caches the sample rate, center frequency and valve settings of a
+    USRP source/sink pair and skips calls that would not change anything.
+    """
+    def __init__(self, u_src, u_snk, rx_valve=None, sense_valve=None,
+                 samp_rate=None, center_freq=None):
+        """
+        @param u_src: uhd.usrp_source (or mock_uhd.usrp_source)
+        @param u_snk: uhd.usrp_sink (or mock_uhd.usrp_sink)
+        @param rx_valve: gr.copy feeding the receive path, or None
+        @param sense_valve: gr.copy feeding the sense path, or None
+        @param samp_rate: rate already set on both devices, or None if unknown
+        @param center_freq: frequency already set on both devices, or None if unknown
+        """
+        self.u_src = u_src
+        self.u_snk = u_snk
+        self.rx_valve = rx_valve
+        self.sense_valve = sense_valve
+
+        self._samp_rate = samp_rate
+        self._center_freq = center_freq
+        self._rx_enabled = None
+        self._sense_enabled = None
+
+        #bookkeeping
+        self.calls_made = 0
+        self.calls_skipped = 0
+        self.switch_times = {}     # mode name -> list of switch durations (s)
+        self._rx_outage = 0.0      # total time the rx valve has been closed (s)
+        self._rx_closed_at = None
+
+    def samp_rate(self):
+        return self._samp_rate
+
+    def center_freq(self):
+        """
+        Return the cached center frequency (asks the sink only if unknown)
+        """
+        if self._center_freq is None:
+            self._center_freq = self.u_snk.get_center_freq()
+        return self._center_freq
+
+    def invalidate(self):
+        """
+        Forget everything cached, e.g. after the devices were changed directly.
+        """
+        self._samp_rate = None
+        self._center_freq = None
+        self._rx_enabled = None
+        self._sense_enabled = None
+
+    def set_rate(self, rate):
+        """
+        Set the sample rate of the source and sink if it differs from the cache.
+
+        @returns True if the devices were touched
+        """
+        if rate == self._samp_rate:
+            self.calls_skipped += 2
+            return False
+        self.u_src.set_samp_rate(rate)
+        self.u_snk.set_samp_rate(rate)
+        self.calls_made += 2
+        self._samp_rate = rate
+        return True
+
+    def set_freq(self, target_freq):
+        """
+        Tune source and sink to target_freq unless they are already there.
+
+        @param target_freq: frequency in Hz
+        @rtype: bool
+        """
+        if target_freq == self._center_freq:
+            self.calls_skipped += 2
+            return True
+        r_snk = self.u_snk.set_center_freq(target_freq, 0)
+        r_src = self.u_src.set_center_freq(target_freq, 0)
+        self.calls_made += 2
+        if r_snk and r_src:
+            self._center_freq = target_freq
+            return True
+
+        # we don't know where the devices ended up
+        self._center_freq = None
+        return False
+
+    def set_valves(self, rx_enabled=None, sense_enabled=None):
+        """
+        Open or close the rx/sense valves. None leaves a valve alone.
+        """
+        if rx_enabled is not None and self.rx_valve is not None:
+            if rx_enabled != self._rx_enabled:
+                self.rx_valve.set_enabled(rx_enabled)
+                self._rx_enabled = rx_enabled
+                self.calls_made += 1
+                if not rx_enabled:
+                    self._rx_closed_at = time.time()
+                elif self._rx_closed_at is not None:
+                    self._rx_outage += time.time() - self._rx_closed_at
+                    self._rx_closed_at = None
+            else:
+                self.calls_skipped += 1
+        if sense_enabled is not None and self.sense_valve is not None:
+            if sense_enabled != self._sense_enabled:
+                self.sense_valve.set_enabled(sense_enabled)
+                self._sense_enabled = sense_enabled
+                self.calls_made += 1
+            else:
+                self.calls_skipped += 1
+
+    def rx_enabled(self):
+        return self._rx_enabled
+
+    def rx_outage_time(self):
+        """
+        Return the total time (s) the receive path has been cut off so far
+        """
+        if self._rx_closed_at is not None:
+            return self._rx_outage + time.time() - self._rx_closed_at
+        return self._rx_outage
+
+    def switch_mode(self, mode, rate, rx_enabled, sense_enabled, flush=None):
+        """
+        Apply a whole mode change in one go.
+
+        Valves that are being closed are closed first so no path sees samples
+        at the wrong rate, then the rate is changed, the (optional) message
+        queue is flushed and finally the valves being opened are opened.
+
+        @param mode: name the switch duration is recorded under
+        @param rate: sample rate for this mode
+        @param rx_enabled: state of the rx valve in this mode
+        @param sense_enabled: state of the sense valve in this mode
+        @param flush: gr.msg_queue to flush before opening valves, or None
+        @returns the time the switch took in seconds
+        """
+        start = time.time()
+        if not rx_enabled:
+            self.set_valves(rx_enabled=False)
+        if not sense_enabled:
+            self.set_valves(sense_enabled=False)
+        self.set_rate(rate)
+        if flush is not None:
+            flush.flush()
+        if rx_enabled:
+            self.set_valves(rx_enabled=True)
+        if sense_enabled:
+            self.set_valves(sense_enabled=True)
+        duration = time.time() - start
+        self.switch_times.setdefault(mode, []).append(duration)
+        return duration
+
+    def switch_stats(self, mode):
+        """
+        @returns tuple (count, mean, max) of switch durations for mode
+        """
+        times = self.switch_times.get(mode, [])
+        if len(times) == 0:
+            return (0, 0.0, 0.0)
+        return (len(times), sum(times)/len(times), max(times))
+
+    def print_stats(self):
+        """
+        Prints the mode-switch latencies and how many UHD calls were saved
+        """
+        for mode in sorted(self.switch_times.keys()):
+            (n, mean, worst) = self.switch_stats(mode)
+            print "switch to %-8s n = %5d  avg = %8.3f ms  max = %8.3f ms" % \
+                  (mode, n, mean*1e3, worst*1e3)
+        print "radio calls made: %d, skipped: %d" % (self.calls_made, self.calls_skipped)
@@ -24,10 +24,20 @@ from gnuradio import gr, gru, blks2
 #from gnuradio import usrp
 from gnuradio import eng_notation
 import copy
+import math
 import sys
+import threading
+import time
+
+import numpy
 
 # from current dir
 from pick_bitrate import pick_rx_bitrate
+from rx_timing import rx_timer, rx_metadata
+import cca
+import iq_recorder
+import noise_floor
+import ofdm_solver
 
 # /////////////////////////////////////////////////////////////////////////////
 #                              receive path
@@ -47,9 +57,21 @@ class receive_path(gr.hier_block2):
         self._log         = options.log
         self._rx_callback = rx_callback      # this callback is fired when there's a packet available
 
-        # receiver
+        # receiver; with --rx-metadata the packets go through _deliver, which
+        # adds what we know about them
+        callback = self._rx_callback
+        if options.rx_metadata:
+            callback = self._deliver
+        # --log records the input (iq_recorder.py); when it only records
+        # around events, a packet that fails its CRC is one
+        self.recorder = None
+        if self._log:
+            self.recorder = iq_recorder.make_recorder(options, "rxpath")
+            if self.recorder.triggered():
+                self._log_next = callback
+                callback = self._log_crc
         self.ofdm_rx = \
-                     blks2.ofdm_demod(options, callback=self._rx_callback)
+                     blks2.ofdm_demod(options, callback=callback)
 
         # Carrier Sensing Blocks
         alpha = 0.001
@@ -58,6 +80,56 @@ class receive_path(gr.hier_block2):
 
         self.connect(self, self.ofdm_rx)
         self.connect(self.ofdm_rx, self.probe)
+        if self.recorder is not None:
+            self.connect(self, self.recorder)
+
+        # fast carrier sense (cca.py)
+        self.cca = None
+        if options.cca:
+            self.cca = cca.cca(options.fft_length, options.cp_length, thresh,
+                               options.cca_corr_thresh, options.cca_window)
+            self._cca_probe = gr.probe_signal_f()
+            self.connect(self.ofdm_rx, self.cca, self._cca_probe)
+
+        # carrier threshold from the noise floor (noise_floor.py)
+        self.noise = None
+        if options.auto_threshold:
+            block = 128
+            self.noise = noise_floor.noise_floor(options.threshold_margin,
+                                                 on_change=self.set_carrier_threshold)
+            self._noise_q = gr.msg_queue()
+            self.connect(self.ofdm_rx, gr.complex_to_mag_squared(),
+                         gr.moving_average_ff(block, 1.0 / block, 4000),
+                         gr.keep_one_in_n(gr.sizeof_float, block),
+                         gr.message_sink(gr.sizeof_float, self._noise_q, False))
+            watcher = threading.Thread(target=self._watch_noise)
+            watcher.setDaemon(True)
+            watcher.start()
+
+        # find where frames end in the samples (needs options.samp_rate)
+        self.timer = None
+        if options.rx_timestamps or options.rx_metadata:
+            step = 8
+            self.timer = rx_timer(options.samp_rate, thresh, step)
+            self._power_q = gr.msg_queue()
+            self.connect(self, gr.complex_to_mag_squared(),
+                         gr.single_pole_iir_filter_ff(0.25),
+                         gr.keep_one_in_n(gr.sizeof_float, step),
+                         gr.message_sink(gr.sizeof_float, self._power_q, False))
+            watcher = threading.Thread(target=self._watch_power)
+            watcher.setDaemon(True)
+            watcher.start()
+
+        if options.rx_metadata:
+            # the OFDM receiver's fine frequency offset estimate, held from the
+            # last preamble (the NCO turns it into -2/fft_length rad/sample)
+            recv = self.ofdm_rx.ofdm_recv
+            self._cfo_probe = gr.probe_signal_f()
+            recv.connect((recv.ofdm_sync, 0), self._cfo_probe)
+            self._cfo_scale = options.samp_rate / (math.pi * options.fft_length)
+            self._symbol_len = options.fft_length + options.cp_length
+            self._occupied_tones = options.occupied_tones
+            self._bits_per_symbol = ofdm_solver.BITS_PER_SYMBOL[options.modulation]
 
         # Display some information about the setup
         if self._verbose:
@@ -68,8 +140,87 @@ class receive_path(gr.hier_block2):
         Return True if we think carrier is present.
         """
         #return self.probe.level() > X
+        if self.cca is not None:
+            return self._cca_probe.level() > 0
         return self.probe.unmuted()
 
+    def _watch_power(self):
+        while True:
+            msg = self._power_q.delete_head()
+            self.timer.power(numpy.fromstring(msg.to_string(), numpy.float32), time.time())
+
+    def _watch_noise(self):
+        while True:
+            msg = self._noise_q.delete_head()
+            self.noise.add(numpy.fromstring(msg.to_string(), numpy.float32))
+
+    def calibrate_noise_floor(self, seconds):
+        """
+        Measure the noise floor for a while (the flow graph has to be running)
+        and set the carrier threshold from it; the threshold keeps following
+        the floor after that (--auto-threshold)
+
+        Does nothing without --auto-threshold.
+
+        @returns the noise floor in dB, or None if there were too few samples
+        """
+        if self.noise is None:
+            return None
+        self.noise.reset()
+        time.sleep(seconds)
+        floor = self.noise.floor()
+        if floor is None:
+            print "Noise floor: not enough samples, keeping the carrier sense threshold"
+        else:
+            self.set_carrier_threshold(floor + self.noise.margin_db)
+            print "Noise floor:", "%.1f" % floor, "dB, carrier sense threshold:", \
+                  "%.1f" % (floor + self.noise.margin_db), "dB"
+        return floor
+
+    def reset_noise_floor(self):
+        """
+        Start the noise floor over, after a gain or frequency change
+        """
+        if self.noise is not None:
+            self.noise.reset()
+
+    def _log_crc(self, ok, payload):
+        """
+        Record around packets that fail the CRC (--log with a trigger)
+        """
+        if not ok:
+            self.recorder.trigger()
+        self._log_next(ok, payload)
+
+    def _deliver(self, ok, payload):
+        """
+        Pass a packet up with its rx_metadata (--rx-metadata)
+        """
+        meta = rx_metadata(time.time())
+        meta.cfo = self._cfo_probe.level() * self._cfo_scale
+        frame = self.timer.last_frame()
+        if frame is not None:
+            (start, end, snr) = frame
+            rx_time = self.timer.clock.time_of(end)
+            if rx_time <= meta.time:
+                meta.rx_time = rx_time
+                meta.start = start
+                meta.end = end
+                meta.snr = snr
+                expected = ofdm_solver.frame_symbols(len(payload), self._occupied_tones,
+                                                     self._bits_per_symbol) * self._symbol_len
+                meta.timing_offset = end - start - expected
+        self._rx_callback(ok, payload, meta)
+
+    def last_frame_end(self):
+        """
+        Host time the last frame ended on the air, from the samples
+        (None without --rx-timestamps or before the first frame)
+        """
+        if self.timer is None:
+            return None
+        return self.timer.last_frame_end()
+
     def carrier_threshold(self):
         """
         Return current setting in dB.
@@ -84,6 +235,10 @@ class receive_path(gr.hier_block2):
         @type threshold_in_db:  float (dB)
         """
         self.probe.set_threshold(threshold_in_db)
+        if self.cca is not None:
+            self.cca.set_threshold(threshold_in_db)
+        if self.timer is not None:
+            self.timer.set_threshold(threshold_in_db)
     
         
     def add_options(normal, expert):
@@ -93,6 +248,13 @@ class receive_path(gr.hier_block2):
         normal.add_option("-v", "--verbose", action="store_true", default=False)
         expert.add_option("", "--log", action="store_true", default=False,
                           help="Log all parts of flow graph to files (CAUTION: lots of data)")
+        iq_recorder.add_options(normal, expert)
+        expert.add_option("", "--rx-timestamps", action="store_true", default=False,
+                          help="find when received frames ended from the samples [default=%default]")
+        cca.add_options(normal, expert)
+        noise_floor.add_options(normal, expert)
+        expert.add_option("", "--rx-metadata", action="store_true", default=False,
+                          help="pass the arrival time, SNR and frequency offset of each packet to the callback [default=%default]")
 
     # Make a static method to call before instantiation
     add_options = staticmethod(add_options)
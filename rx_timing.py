@@ -0,0 +1,195 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Receive Timing
+#
+# FuNLab
+# University of Washington
+#
+# Tells the MAC when the last frame it received ended on the air, from the
+# samples rather than from when the demodulator got around to calling back.
+#
+# receive_path taps the power of every step-th input sample (averaged over a
+# few samples) and hands it to rx_timer in the chunks gr.message_sink makes.
+# The frame ends where the power drops below the carrier threshold (with some
+# hysteresis). Its sample index is turned into host time by rx_clock: every
+# chunk arrives at the host some time after its last sample was taken, never
+# before, so the smallest (arrival time - sample index / sample rate) over the
+# last chunks is the best estimate of when sample 0 was taken. The window is
+# restarted when the stream stops and starts again (quiet periods close the
+# receive valve).
+#
+# The demodulator's callback comes after the frame has been through the USRP,
+# the bus and the OFDM receiver, a delay that varies with how the samples were
+# chunked; the frame end from rx_timer doesn't carry that delay.
+#
+# rx_timer also averages the power during each frame and while the channel is
+# idle, which gives the frame's SNR. With --rx-metadata receive_path puts that
+# together with the frame's start, end and host time, and the OFDM receiver's
+# frequency offset estimate, in an rx_metadata record for every packet.
+# /////////////////////////////////////////////////////////////////////////////
+
+import collections
+import math
+import threading
+
+import numpy
+
+
+class rx_clock(object):
+    """
+    Maps sample indices of the receive stream to host time
+    """
+    def __init__(self, samp_rate, window=64, gap=10e-3):
+        """
+        @param window: chunks the estimate is taken over
+        @param gap: restart when a chunk is this much later than expected (s)
+        """
+        self.samp_rate = float(samp_rate)
+        self.gap = gap
+        self._offsets = collections.deque(maxlen=window)
+        self._offset = None
+
+    def arrived(self, index, t):
+        """
+        Samples up to index (exclusive) had arrived at host time t
+        """
+        offset = t - index / self.samp_rate
+        if self._offset is not None and offset - self._offset > self.gap:
+            self._offsets.clear()
+        self._offsets.append(offset)
+        self._offset = min(self._offsets)
+
+    def time_of(self, index):
+        """
+        Host time sample index was taken at (None before the first chunk)
+        """
+        if self._offset is None:
+            return None
+        return self._offset + index / self.samp_rate
+
+
+class rx_timer(object):
+    """
+    Finds where frames end in the tapped power and when that was
+    """
+    def __init__(self, samp_rate, threshold_db, step=8, hysteresis_db=3.0):
+        """
+        @param samp_rate: rate of the receive stream before the tap
+        @param threshold_db: carrier threshold (same scale as the probe's)
+        @param step: the tap keeps one power value out of step
+        """
+        self.step = step
+        self.clock = rx_clock(samp_rate)
+        self.hysteresis_db = hysteresis_db
+        self.set_threshold(threshold_db)
+        self._index = 0              # tapped values seen so far
+        self._busy = False
+        self._start = None           # sample index the current/last frame started at
+        self._end = None             # sample index the last frame ended at
+        self._sum = 0.0              # power summed over the current frame
+        self._count = 0
+        self._snr = None             # of the last frame (dB)
+        self._noise = None           # average idle power
+        self._lock = threading.Lock()
+
+    def set_threshold(self, threshold_db):
+        self._on = math.pow(10.0, threshold_db / 10.0)
+        self._off = math.pow(10.0, (threshold_db - self.hysteresis_db) / 10.0)
+
+    def power(self, values, t):
+        """
+        The next tapped power values, which arrived at host time t
+        """
+        n = len(values)
+        if n == 0:
+            return
+        self._lock.acquire()
+        # walk the threshold crossings only, not every value
+        above = numpy.flatnonzero(values >= self._on)
+        below = numpy.flatnonzero(values < self._off)
+        i = 0
+        while i < n:
+            if self._busy:
+                j = numpy.searchsorted(below, i)
+                if j == len(below):
+                    k = n
+                else:
+                    k = below[j]
+                self._sum += float(values[i:k].sum())
+                self._count += k - i
+                if k < n:
+                    self._busy = False
+                    self._end = (self._index + k) * self.step
+                    self._frame_done()
+            else:
+                j = numpy.searchsorted(above, i)
+                if j == len(above):
+                    k = n
+                else:
+                    k = above[j]
+                if k > i:
+                    idle = float(values[i:k].mean())
+                    if self._noise is None:
+                        self._noise = idle
+                    else:
+                        self._noise += .1 * (idle - self._noise)
+                if k < n:
+                    self._busy = True
+                    self._start = (self._index + k) * self.step
+                    self._sum = 0.0
+                    self._count = 0
+            i = k
+        self._index += n
+        self.clock.arrived(self._index * self.step, t)
+        self._lock.release()
+
+    def _frame_done(self):
+        self._snr = None
+        if self._noise is not None and self._noise > 0 and self._count > 0:
+            signal = self._sum / self._count - self._noise
+            if signal > 0:
+                self._snr = 10 * math.log10(signal / self._noise)
+
+    def last_frame_end(self):
+        """
+        Host time the last frame ended at (None if none has yet, or if the
+        channel is busy: the frame being asked about may not have come
+        through the tap yet)
+        """
+        frame = self.last_frame()
+        if frame is None:
+            return None
+        return self.clock.time_of(frame[1])
+
+    def last_frame(self):
+        """
+        (start, end, snr) of the last frame: its first and last sample index
+        and its SNR in dB (None if there was no idle power to compare with).
+        None if no frame has ended yet or the channel is busy.
+        """
+        self._lock.acquire()
+        try:
+            if self._end is None or self._busy:
+                return None
+            return (self._start, self._end, self._snr)
+        finally:
+            self._lock.release()
+
+
+class rx_metadata(object):
+    """
+    What the receive path knows about a packet besides its payload
+    """
+    __slots__ = ('time', 'rx_time', 'start', 'end', 'snr', 'cfo', 'timing_offset')
+
+    def __init__(self, t):
+        self.time = t                # host time the packet was handed over
+        self.rx_time = None          # host time the frame ended on the air
+        self.start = None            # sample index of its first sample
+        self.end = None              # and of its end
+        self.snr = None              # dB, from the power during and between frames
+        self.cfo = None              # fine carrier frequency offset (Hz)
+        self.timing_offset = None    # measured - expected frame length (samples)
+
+    def __repr__(self):
+        return "rx_metadata(rx_time=%r, start=%r, end=%r, snr=%r, cfo=%r, timing_offset=%r)" % \
+               (self.rx_time, self.start, self.end, self.snr, self.cfo, self.timing_offset)
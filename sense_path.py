@@ -26,6 +26,10 @@ from gnuradio.eng_option import eng_option
 import sys, struct
 import math
 
+# from current dir
+import welch
+import channel_plan
+
 
 
 class tune(gr.feval_dd):
@@ -83,18 +87,14 @@ class sense_path(gr.hier_block2):
             
         self.threshold = options.threshold
         
-        #self.freq_step = options.chan_bandwidth
-        #self.min_freq = options.start_freq
-        #self.max_freq = options.end_freq
         self.hold_freq = False
         
-        
-        self.channels = [600000000, 620000000, 625000000, 640000000, 645000000, 650000000]
+        # channels come from --channel-plan, --start-freq/--end-freq or the defaults
+        self.plan = channel_plan.make_plan(options.channel_plan, options.start_freq,
+                                           options.end_freq, options.chan_bandwidth)
+        self.channels = self.plan.freqs
         self.current_chan = 0
-        self.num_channels = len(self.channels) #(self.max_freq - self.min_freq)/self.freq_step
-
-        #if self.min_freq > self.max_freq:
-        #    self.min_freq, self.max_freq = self.max_freq, self.min_freq   # swap them
+        self.num_channels = len(self.plan)
             
         self.fft_size = options.sense_fft_size
 
@@ -111,33 +111,58 @@ class sense_path(gr.hier_block2):
                 print "Note: failed to enable realtime scheduling"
 
         # build graph
-        s2v = gr.stream_to_vector(gr.sizeof_gr_complex, self.fft_size)
-
         mywindow = window.blackmanharris(self.fft_size)
-        fft = gr.fft_vcc(self.fft_size, True, mywindow)
         power = 0
         for tap in mywindow:
             power += tap*tap
-            
-        c2mag = gr.complex_to_mag_squared(self.fft_size)
+
+        # Welch PSD: self.branches FFTs on copies of the stream delayed by a
+        # fraction of fft_size give overlapped frames, which are interleaved
+        # and averaged by a single pole IIR (alpha chosen so the variance
+        # matches a plain average of sense_averages frames).
+        self.overlap = options.sense_overlap
+        self.averages = max(1, options.sense_averages)
+        self.branches = welch.branches(self.overlap)
+        self.hop = int(round(self.fft_size / float(self.branches)))
+
+        c2mags = []
+        for i in range(self.branches):
+            s2v = gr.stream_to_vector(gr.sizeof_gr_complex, self.fft_size)
+            fft = gr.fft_vcc(self.fft_size, True, mywindow)
+            c2mag = gr.complex_to_mag_squared(self.fft_size)
+            if i == 0:
+                self.connect(self, s2v)
+            else:
+                self.connect(self, gr.delay(gr.sizeof_gr_complex, i*self.hop), s2v)
+            self.connect(s2v, fft, c2mag)
+            c2mags.append(c2mag)
+
+        if self.branches > 1:
+            psd = gr.interleave(gr.sizeof_float*self.fft_size)
+            for i in range(self.branches):
+                self.connect(c2mags[i], (psd, i))
+        else:
+            psd = c2mags[0]
+
+        if self.averages > 1:
+            alpha = welch.iir_alpha(self.averages)
+            avg = gr.single_pole_iir_filter_ff(alpha, self.fft_size)
+            self.connect(psd, avg)
+            psd = avg
+            # let the average forget the previous channel after a retune
+            settle_frames = int(math.ceil(5.0 / alpha))
+        else:
+            settle_frames = 0
 
         # FIXME the log10 primitive is dog slow
         log = gr.nlog10_ff(10, self.fft_size,
                            -20*math.log10(self.fft_size)-10*math.log10(power/self.fft_size))
         
-        # Set the freq_step to 75% of the actual data throughput.
-        # This allows us to discard the bins on both ends of the spectrum.
-
-        #changed on 2011 May 31, MR -- maybe change back at some point
-        
-        #self.min_center_freq = self.min_freq + self.freq_step/2
-        #nsteps = math.ceil((self.max_freq - self.min_freq) / self.freq_step)
-        #self.max_center_freq = self.min_center_freq + (nsteps * self.freq_step)
-
         self.next_freq = self.channels[self.current_chan] #self.min_center_freq
         
-        tune_delay  = max(0, int(round(options.tune_delay * self.usrp_rate / self.fft_size)))  # in fft_frames
-        dwell_delay = max(1, int(round(options.dwell_delay * self.usrp_rate / self.fft_size))) # in fft_frames
+        frames_per_sec = self.usrp_rate / float(self.hop)
+        tune_delay  = max(0, int(round(options.tune_delay * frames_per_sec))) + settle_frames # in fft_frames
+        dwell_delay = max(1, int(round(options.dwell_delay * frames_per_sec))) # in fft_frames
 
         self.msgq = gr.msg_queue(16)
         self._tune_callback = tune(self)        # hang on to this to keep it from being GC'd
@@ -146,7 +171,11 @@ class sense_path(gr.hier_block2):
 
         # FIXME leave out the log10 until we speed it up
         #self.connect(self, s2v, fft, c2mag, log, stats)
-        self.connect(self, s2v, fft, c2mag, self.stats)
+        self.connect(psd, self.stats)
+
+        if options.verbose:
+            print "sense PSD:", welch.summary(mywindow, self.overlap, self.averages,
+                                              self.usrp_rate)
 
         
     def set_next_freq(self):
@@ -155,9 +184,7 @@ class sense_path(gr.hier_block2):
             
         target_freq = self.next_freq
         self.current_chan = (self.current_chan + 1) % self.num_channels
-        self.next_freq = self.channels[self.current_chan] #self.next_freq + self.freq_step
-        #if self.next_freq >= self.max_center_freq:
-        #    self.next_freq = self.min_center_freq
+        self.next_freq = self.channels[self.current_chan]
             
         if not self.set_freq(target_freq):
             print "Failed to set frequency to", target_freq
@@ -201,14 +228,15 @@ class sense_path(gr.hier_block2):
                           help="specify number of FFT bins [default=%default]")
         normal.add_option("", "--threshold", type="eng_float", default=-54, 
                           help="set detection threshold [default=%default]")
+        normal.add_option("", "--sense-overlap", type="eng_float", default=0,
+                          help="overlap between sense FFT frames, 0 <= OVERLAP < 1 [default=%default]")
+        normal.add_option("", "--sense-averages", type="int", default=1,
+                          help="number of sense FFT frames averaged into each PSD estimate [default=%default]")
         expert.add_option("", "--real-time", action="store_true", default=False,
                           help="Attempt to enable real-time scheduling")
         normal.add_option("", "--num-tests", type="intx", default=1,
                           help="set the number of times to test the frequency band [default=%default]")
-        #normal.add_option("", "--start-freq", type="eng_float", default="631M",
-        #                  help="set the start of the frequency band to sense over [default=%default]")
-        #normal.add_option("", "--end-freq", type="eng_float", default="671M",
-        #                  help="set the end of the frequency band to sense over [default=%default]")
+        channel_plan.add_options(normal, expert)
         expert.add_option("", "--chan-bandwidth", type="eng_float", default=6000000,
                           help="set the sample rate of each 6MHz channel [default=%default]")
     # Make a static method to call before instantiation
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# /////////////////////////////////////////////////////////////////////////////
+#                           Sharded Capture Decoder
+#
+# FuNLab
+# University of Washington
+#
+# Decodes a long IQ capture (iq_capture.py) on every core. The capture is
+# memory-mapped and cut into shards of about --shard-size samples; each cut is
+# moved to the quietest stretch within an eighth of a shard of where it would
+# fall, so it lands in a gap between bursts rather than in a frame. A pool of
+# --jobs processes runs batch_demod (ofdm_batch.py) over the shards. Every
+# shard is read with some of its neighbours on both sides, so a frame across
+# a cut is still decoded whole; a shard only passes up the frames that start
+# in it. The packets from all the shards are merged by the sample they start
+# at, and a frame found twice near a cut is only kept once.
+#
+# Workers map the capture themselves and send back only the packets, so the
+# shards never go through a pipe and the work spreads across cores.
+#
+# python shard_decode.py --jobs=8 field.dat
+# /////////////////////////////////////////////////////////////////////////////
+
+from gnuradio import blks2
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+
+import multiprocessing
+import time
+
+# from current dir
+import iq_capture
+import ofdm_batch
+
+
+# the worker's demodulator and capture, set up once per process
+_demod = None
+_capture = None
+
+def _init_worker(demod, filename):
+    global _demod, _capture
+    _demod = demod
+    _capture = iq_capture.iq_capture(filename)
+
+def _decode_shard(shard):
+    (start, stop, chunk) = shard
+    return list(_demod.demodulate_capture(_capture, chunk, start, stop))
+
+
+def quiet_cuts(capture, shard_size, search=None, block=256):
+    """
+    Where to cut a capture into shards
+
+    @param capture: iq_capture
+    @param shard_size: samples per shard, about
+    @param search: samples either side of each cut to look for a quiet block in
+    @param block: samples the power is averaged over
+    @returns [0, cut, ..., len(capture)]
+    """
+    n = len(capture)
+    if search is None:
+        search = shard_size // 8
+    cuts = [0]
+    target = shard_size
+    # the last shard gets the remainder rather than a sliver of its own
+    while target < n - shard_size // 2:
+        first = max(cuts[-1] + block, target - search)
+        x = capture.samples(first, min(n, target + search))
+        nblocks = len(x) // block
+        if nblocks == 0:
+            cut = target
+        else:
+            x = x[:nblocks * block].reshape(nblocks, block)
+            power = (x.real ** 2 + x.imag ** 2).mean(axis=1)
+            cut = first + power.argmin() * block + block // 2
+        cuts.append(cut)
+        target = cut + shard_size
+    cuts.append(n)
+    return cuts
+
+def merge(shards, spacing):
+    """
+    Merge the packets of every shard by the sample they start at
+
+    @param shards: a list of [(start, ok, payload)] per shard
+    @param spacing: frames that start closer together than this are the same
+    frame; a good CRC is kept over a bad one
+    @returns [(start, ok, payload)]
+    """
+    packets = []
+    for frame in sorted(f for frames in shards for f in frames):
+        if packets and frame[0] - packets[-1][0] < spacing:
+            if frame[1] and not packets[-1][1]:
+                packets[-1] = frame
+            continue
+        packets.append(frame)
+    return packets
+
+
+class shard_decoder(object):
+    """
+    Decode a capture with batch_demod in a pool of processes
+    """
+    def __init__(self, options, jobs=None, shard_size=1 << 23, chunk=1 << 21):
+        """
+        @param options: the ofdm_mod options the capture was sent with
+        @param jobs: processes (default one per core)
+        @param shard_size: samples per shard, about
+        @param chunk: samples a worker demodulates at once
+        """
+        self.demod = ofdm_batch.batch_demod(options)
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.shard_size = shard_size
+        self.chunk = chunk
+
+    def shards(self, capture):
+        """
+        @returns [(start, stop)] of the shards of capture
+        """
+        cuts = quiet_cuts(capture, self.shard_size)
+        return zip(cuts[:-1], cuts[1:])
+
+    def decode(self, filename):
+        """
+        @returns [(start, ok, payload)] of every frame in the capture
+        """
+        capture = iq_capture.iq_capture(filename)
+        work = [(start, stop, self.chunk) for (start, stop) in self.shards(capture)]
+        if self.jobs == 1 or len(work) == 1:
+            _init_worker(self.demod, filename)
+            results = map(_decode_shard, work)
+        else:
+            pool = multiprocessing.Pool(self.jobs, _init_worker, (self.demod, filename))
+            try:
+                # one shard at a time, so a slow shard doesn't hold up a batch
+                results = pool.map(_decode_shard, work, 1)
+            finally:
+                pool.close()
+                pool.join()
+        return merge(results, self.demod.symbol_len)
+
+    def add_options(normal, expert):
+        """
+        Adds sharded decoding options to an optparse parser
+        """
+        normal.add_option("-j", "--jobs", type="int", default=None,
+                          help="processes to decode with [default=one per core]")
+        expert.add_option("", "--shard-size", type="eng_float", default=1 << 23,
+                          help="samples per shard, about [default=%default]")
+        expert.add_option("", "--chunk", type="eng_float", default=1 << 21,
+                          help="samples a worker demodulates at once [default=%default]")
+    # Make a static method to call before instantiation
+    add_options = staticmethod(add_options)
+
+
+def main():
+    parser = OptionParser(option_class=eng_option, conflict_handler="resolve",
+                          usage="%prog [options] capture")
+    expert_grp = parser.add_option_group("Expert")
+    parser.add_option("-v", "--verbose", action="store_true", default=False,
+                      help="print every packet demodulated [default=%default]")
+    shard_decoder.add_options(parser, expert_grp)
+    blks2.ofdm_mod.add_options(parser, expert_grp)
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.print_help()
+        raise SystemExit, 1
+
+    decoder = shard_decoder(options, options.jobs, int(options.shard_size), int(options.chunk))
+    capture = iq_capture.iq_capture(args[0])
+    started = time.time()
+    packets = decoder.decode(args[0])
+    elapsed = time.time() - started
+    nok = 0
+    for (start, ok, payload) in packets:
+        nok += ok
+        if options.verbose:
+            print "%12d %-4s %5d" % (start, ok and "ok" or "bad", len(payload))
+    print "%d packets, %d ok, %d samples in %.2f s with %d processes (%.1f MS/s)" % \
+          (len(packets), nok, len(capture), elapsed, decoder.jobs, 1e-6 * len(capture) / elapsed)
+    if capture.duration() > 0:
+        print "%.1f times real time" % (capture.duration() / elapsed,)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
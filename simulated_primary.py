@@ -37,6 +37,8 @@ import time, struct, sys, random
 # from current dir
 from transmit_path import transmit_path
 from pick_bitrate import pick_tx_bitrate
+import channel_plan
+import ofdm_framing
 #import fusb_options
 
 class my_top_block(gr.top_block):
@@ -169,17 +171,17 @@ def main():
                       help="set the time between channel changes [default=%default]")
     #parser.add_option("","--num-channels", type="int", default=1,
     #                  help="set number of (contiguous) occupied channels [default=%default]")
-    #parser.add_option("", "--start-freq", type="eng_float", default="631M",
-    #                      help="set the start of the frequency band to sense over [default=%default]")
-    #parser.add_option("", "--end-freq", type="eng_float", default="671M",
-    #                      help="set the end of the frequency band to sense over [default=%default]")
     parser.add_option("", "--random", action="store_true", default=False,
                           help="enable random frequency selection")
     parser.add_option("", "--channel_rate", type="eng_float", default=6e6,
                           help="Set bandwidth of an expected channel [default=%default]")
+    parser.add_option("", "--trace", type="string", default=None,
+                          help="log the time and frequency of every channel change to FILE (for pu_trace_sim.py) [default=%default]",
+                          metavar="FILE")
      
                       
     my_top_block.add_options(parser, expert_grp)
+    channel_plan.add_options(parser, expert_grp)
     transmit_path.add_options(parser, expert_grp)
     blks2.ofdm_mod.add_options(parser, expert_grp)
     blks2.ofdm_demod.add_options(parser, expert_grp)
@@ -189,7 +191,11 @@ def main():
 
     total_samp_rate = options.rate #*options.num_channels
 
-    channels = [600000000, 620000000, 625000000, 640000000, 645000000, 650000000]
+    # the channels to hop between (the same plan the secondaries sense)
+    channels = channel_plan.make_plan(options.channel_plan, options.start_freq,
+                                      options.end_freq, options.channel_rate)
+    if options.tx_freq is None:
+        options.tx_freq = channels[0]
 
     # build the graph
     tb = my_top_block(options)
@@ -210,15 +216,20 @@ def main():
     last_change = time.clock()
     
     print "\nstarting frequency: ", options.tx_freq, " at time: ", time.strftime("%X")
+    trace = None
+    if options.trace:
+        trace = open(options.trace, "w")
+        trace.write("%.6f %d\n" % (time.time(), options.tx_freq))
     
-    current_chan = 0
+    current_chan = channels.index_of(options.tx_freq) or 0
     while n < nbytes:
         if time.clock() - last_change < options.channel_interval:
-            #pktno % 65535 to account for sending very large amounts of data
-            send_pkt(struct.pack('!H', pktno % 65535) + (pkt_size - 2) * chr(pktno & 0xff))
+            # a packet at a time, so the channel changes on time
+            tb.txpath.send_pkts(ofdm_framing.numbered_payloads(pkt_size, 1, pktno))
             n += pkt_size
             sys.stderr.write('.')
-            if options.discontinuous and pktno % 5 == 1:
+            if options.discontinuous and pktno % 5 == 4:
+                # bursts of 5
                 time.sleep(1)
             pktno += 1
         else:
@@ -240,7 +251,12 @@ def main():
             last_change = time.clock()
             print "\nchanging frequencies to ", new_freq, " at time ", time.strftime("%X")
             tb.set_freq(new_freq)
+            if trace:
+                trace.write("%.6f %d\n" % (time.time(), new_freq))
+                trace.flush()
         
+    if trace:
+        trace.close()
     send_pkt(eof=True)
     tb.wait()                       # wait for it to finish
 
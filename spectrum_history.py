@@ -0,0 +1,212 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Spectrum History
+#
+# FuNLab
+# University of Washington
+#
+# Keeps every sensing result in an SQLite file so that what the nodes learned
+# about the band survives a restart. There are two tables:
+#
+#   obs     (t, freq, level, busy)             one row per measurement
+#   hourly  (hour, freq, n, busy, level_sum)   running totals per hour of day
+#
+# hourly is updated in the same transaction as obs, and it is small (24 rows
+# per channel), so it is read into memory when the file is opened and queries
+# like "quietest channel at this hour" never touch the disk. obs is kept for
+# offline analysis and to rebuild hourly.
+#
+# Measurements are buffered and written in batches (every flush_every rows,
+# and on flush/close), so recording costs the MAC nothing measurable.
+#
+# python qpcsmaca_test.py ... --history-db=band.db --autoselect-freq
+# /////////////////////////////////////////////////////////////////////////////
+
+import sqlite3
+import time
+
+_schema = """
+CREATE TABLE IF NOT EXISTS obs (
+    t REAL NOT NULL,
+    freq INTEGER NOT NULL,
+    level REAL NOT NULL,
+    busy INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hourly (
+    hour INTEGER NOT NULL,
+    freq INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    busy INTEGER NOT NULL,
+    level_sum REAL NOT NULL,
+    PRIMARY KEY (hour, freq)
+);
+"""
+
+
+def hour_of_day(t):
+    """
+    Local hour of day (0-23) of time t (seconds since the epoch)
+    """
+    return time.localtime(t).tm_hour
+
+
+class spectrum_history(object):
+    """
+    Sensing results on disk, with per hour of day totals in memory
+    """
+    def __init__(self, filename, flush_every=256):
+        """
+        @param filename: SQLite file (created if it doesn't exist), or ":memory:"
+        @param flush_every: write buffered measurements after this many
+        """
+        self.filename = filename
+        self.flush_every = flush_every
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.executescript(_schema)
+        self._pending = []
+        self._hourly = {}            # (hour, freq) -> [n, busy, level_sum]
+        self._totals = {}            # freq -> [n, busy, level_sum] over all hours
+        for (hour, freq, n, busy, level_sum) in self._db.execute(
+                "SELECT hour, freq, n, busy, level_sum FROM hourly"):
+            self._count(hour, freq, n, busy, level_sum)
+
+    def _count(self, hour, freq, n, busy, level_sum):
+        for (table, key) in ((self._hourly, (hour, freq)), (self._totals, freq)):
+            s = table.setdefault(key, [0, 0, 0.0])
+            s[0] += n
+            s[1] += busy
+            s[2] += level_sum
+
+    def add(self, freq, level, busy, t=None):
+        """
+        Record a measurement
+
+        @param freq: channel center frequency (Hz)
+        @param level: average power (dB)
+        @param busy: True if a primary was detected
+        @param t: time of the measurement (default now)
+        """
+        if t is None:
+            t = time.time()
+        freq = int(round(freq))
+        busy = busy and 1 or 0
+        self._count(hour_of_day(t), freq, 1, busy, level)
+        self._pending.append((t, freq, level, busy))
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered measurements to disk
+        """
+        if len(self._pending) == 0:
+            return
+        totals = {}
+        for (t, freq, level, busy) in self._pending:
+            s = totals.setdefault((hour_of_day(t), freq), [0, 0, 0.0])
+            s[0] += 1
+            s[1] += busy
+            s[2] += level
+        db = self._db
+        db.executemany("INSERT INTO obs (t, freq, level, busy) VALUES (?, ?, ?, ?)",
+                       self._pending)
+        rows = [(hour, freq) + tuple(s) for ((hour, freq), s) in totals.items()]
+        db.executemany("INSERT OR IGNORE INTO hourly VALUES (?, ?, 0, 0, 0.0)",
+                       [r[:2] for r in rows])
+        db.executemany("UPDATE hourly SET n = n + ?, busy = busy + ?, level_sum = level_sum + ? "
+                       "WHERE hour = ? AND freq = ?",
+                       [(n, busy, level_sum, hour, freq)
+                        for (hour, freq, n, busy, level_sum) in rows])
+        db.commit()
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def rebuild(self):
+        """
+        Recompute the hourly totals from obs (after editing obs by hand)
+        """
+        self.flush()
+        db = self._db
+        db.execute("DELETE FROM hourly")
+        hours = {}
+        for (t, freq, level, busy) in db.execute("SELECT t, freq, level, busy FROM obs"):
+            s = hours.setdefault((hour_of_day(t), freq), [0, 0, 0.0])
+            s[0] += 1
+            s[1] += busy
+            s[2] += level
+        db.executemany("INSERT INTO hourly VALUES (?, ?, ?, ?, ?)",
+                       [key + tuple(s) for (key, s) in hours.items()])
+        db.commit()
+        self._hourly = {}
+        self._totals = {}
+        for ((hour, freq), (n, busy, level_sum)) in hours.items():
+            self._count(hour, freq, n, busy, level_sum)
+
+    def observations(self):
+        """
+        Total number of measurements recorded
+        """
+        return sum([s[0] for s in self._totals.values()])
+
+    def stats(self, freq, hour=None):
+        """
+        @param freq: channel center frequency
+        @param hour: hour of day, or None for all hours
+        @returns (n, busy fraction, mean level in dB), or None if there is no data
+        """
+        freq = int(round(freq))
+        if hour is None:
+            s = self._totals.get(freq)
+        else:
+            s = self._hourly.get((hour, freq))
+        if s is None or s[0] == 0:
+            return None
+        return (s[0], s[1] / float(s[0]), s[2] / s[0])
+
+    def ranked(self, channels, t=None, min_obs=5):
+        """
+        Rank channels by how idle they have been at this hour of day: lowest
+        busy fraction first, then lowest mean level. Channels with fewer than
+        min_obs measurements at this hour are ranked by their totals over all
+        hours, and channels without any history come last.
+
+        @returns list of (busy fraction, mean level, freq); busy fraction and
+                 level are None for channels without history
+        """
+        if t is None:
+            t = time.time()
+        hour = hour_of_day(t)
+        known = []
+        unknown = []
+        for freq in channels:
+            s = self.stats(freq, hour)
+            if s is None or s[0] < min_obs:
+                s = self.stats(freq) or s
+            if s is None:
+                unknown.append((None, None, freq))
+            else:
+                known.append((s[1], s[2], freq))
+        known.sort()
+        return known + unknown
+
+    def quietest(self, channels, t=None, min_obs=5, exclude=()):
+        """
+        Return the channel that has been idlest at this hour of day, or None
+        if none of them has any history
+        """
+        for (busy, level, freq) in self.ranked(channels, t, min_obs):
+            if busy is not None and freq not in exclude:
+                return freq
+        return None
+
+
+def add_options(normal, expert):
+    """
+    Adds spectrum history options to the Options Parser
+    """
+    expert.add_option("", "--history-db", type="string", default=None,
+                      help="record sensing results in this SQLite file and use them to pick channels [default=%default]")
+    expert.add_option("", "--history-min-obs", type="int", default=5,
+                      help="measurements of a channel at this hour needed before trusting them [default=%default]")
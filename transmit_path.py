@@ -25,6 +25,16 @@ from gnuradio import eng_notation
 
 import copy
 import sys
+import threading
+import time
+
+# from current dir
+import ofdm_framing
+import ofdm_solver
+from tx_tracker import tx_tracker
+from ctl_cache import ctl_cache
+import burst_tx
+import iq_recorder
 
 # /////////////////////////////////////////////////////////////////////////////
 #                              transmit path
@@ -45,8 +55,10 @@ class transmit_path(gr.hier_block2):
         self._verbose      = options.verbose         # turn verbose mode on/off
         self._tx_amplitude = options.tx_amplitude    # digital amplitude sent to USRP
 
+        self._queue_depth = options.tx_queue_depth
         self.ofdm_tx = \
-                     blks2.ofdm_mod(options, msgq_limit=4, pad_for_usrp=False)
+                     blks2.ofdm_mod(options, msgq_limit=self._queue_depth, pad_for_usrp=False)
+        self._msgq = self.ofdm_tx._pkt_input.msgq()
 
         self.amp = gr.multiply_const_cc(1)
         self.set_tx_amplitude(self._tx_amplitude)
@@ -55,10 +67,57 @@ class transmit_path(gr.hier_block2):
         if self._verbose:
             self._print_verbage()
 
+        self._occupied_tones = options.occupied_tones
+        self._bits_per_symbol = ofdm_solver.BITS_PER_SYMBOL[options.modulation]
+        self._symbol_len = options.fft_length + options.cp_length
+
         # Create and setup transmit path flow graph
-        self.connect(self.ofdm_tx, self.amp, self)
+        self.ctl = None
+        self.burst = None
+        self._mod_q = None
+        if options.ctl_cache:
+            self.ctl = ctl_cache(options)
+        if options.burst:
+            self.burst = burst_tx.burst_marker()
+        if self.ctl is not None or self.burst is not None:
+            # the modulator's output goes through a message queue that the
+            # cached control frames can be put into as well, and that the
+            # burst trigger is made from
+            self._mod_q = gr.msg_queue()
+            self._out_q = gr.msg_queue(8)
+            self._data_samples = 0       # samples of the frames sent to the modulator
+            self.connect(self.ofdm_tx, gr.message_sink(gr.sizeof_gr_complex, self._mod_q, False))
+            src = gr.message_source(gr.sizeof_gr_complex, self._out_q)
+            if self.burst is not None:
+                self._trigger_q = gr.msg_queue(8)
+                tagger = burst_tx.make_tagger()
+                self.connect(src, (tagger, 0))
+                self.connect(gr.message_source(gr.sizeof_short, self._trigger_q), (tagger, 1))
+                src = tagger
+            self.connect(src, self.amp, self)
+            forwarder = threading.Thread(target=self._forward)
+            forwarder.setDaemon(True)
+            forwarder.start()
+        else:
+            self.connect(self.ofdm_tx, self.amp, self)
+
+        # count the OFDM symbols leaving the modulator (one sample per symbol)
+        # so we know when each frame is done
+        self.tracker = tx_tracker()
+        self._symbol_q = gr.msg_queue()
+        self.connect(self.amp,
+                     gr.keep_one_in_n(gr.sizeof_gr_complex, options.fft_length + options.cp_length),
+                     gr.message_sink(gr.sizeof_gr_complex, self._symbol_q, False))
+        watcher = threading.Thread(target=self._watch_symbols)
+        watcher.setDaemon(True)
+        watcher.start()
         #self.connect(self.ofdm_tx, gr.file_sink(gr.sizeof_gr_complex, "ofdm_tx.dat"))
-        #self.connect(self.amp, gr.file_sink(gr.sizeof_gr_complex, "amp.dat"))
+
+        # --log records what goes to the USRP (iq_recorder.py)
+        self.recorder = None
+        if options.log:
+            self.recorder = iq_recorder.make_recorder(options, "txpath")
+            self.connect(self.amp, self.recorder)
 
     def set_tx_amplitude(self, ampl):
         """
@@ -68,11 +127,132 @@ class transmit_path(gr.hier_block2):
         self._tx_amplitude = max(0.0, min(ampl, 1.0))
         self.amp.set_k(self._tx_amplitude)
         
-    def send_pkt(self, payload='', eof=False):
+    def _forward(self):
+        """
+        Move the modulator's output into the TX stream (--ctl-cache, --burst).
+        The end of file goes in once everything sent before it is through.
+        """
+        forwarded = 0
+        eof = False
+        while True:
+            msg = self._mod_q.delete_head()
+            if msg.type() == 1:
+                eof = True
+            else:
+                n = msg.length() // gr.sizeof_gr_complex
+                forwarded += n
+                self._output(msg, n)
+            if eof and forwarded >= self._data_samples:
+                if self.burst is not None:
+                    self._trigger_q.insert_tail(gr.message(1))
+                self._out_q.insert_tail(gr.message(1))
+                return
+
+    def _output(self, msg, nsamples):
+        if self.burst is not None:
+            trigger = self.burst.trigger(nsamples)
+            self._trigger_q.insert_tail(gr.message_from_string(trigger.tostring()))
+        self._out_q.insert_tail(msg)
+
+    def _watch_symbols(self):
+        while True:
+            msg = self._symbol_q.delete_head()
+            self.tracker.sent(msg.length() // gr.sizeof_gr_complex, time.time())
+
+    def _frame_symbols(self, payload_len):
+        return ofdm_solver.frame_symbols(payload_len, self._occupied_tones, self._bits_per_symbol)
+
+    def send_pkt(self, payload='', eof=False, callback=None):
         """
-        Calls the transmitter method to send a packet
+        Calls the transmitter method to send a packet. Blocks while the
+        modulator's queue (--tx-queue-depth frames) is full.
+
+        @param callback: called with the time the frame left the modulator
         """
+        if not eof:
+            self._queued(self._frame_symbols(len(payload)), callback)
+        elif self._mod_q is not None:
+            self._mod_q.insert_tail(gr.message(1))
         return self.ofdm_tx.send_pkt(payload, eof)
+
+    def _queued(self, nsymbols, callback=None):
+        self.tracker.queued(nsymbols, callback)
+        if self._mod_q is not None:
+            self._data_samples += nsymbols * self._symbol_len
+        if self.burst is not None:
+            self.burst.queued(nsymbols * self._symbol_len)
+        if self.recorder is not None and self.recorder.triggered():
+            self.recorder.trigger()
+
+    def send_ctl(self, payload, callback=None):
+        """
+        Send a control frame (RTS/CTS/ACK). With --ctl-cache its samples are
+        modulated once and put straight into the TX stream after that, skipping
+        the modulator. Frames still in the transmit path go out first, so then
+        this is send_pkt, as it is the first time (and without --ctl-cache).
+
+        @param callback: called with the time the frame left the transmit path
+        """
+        samples = None
+        if self.ctl is not None and self.tracker.in_flight() == 0:
+            samples = self.ctl.get(payload)
+        if samples is None:
+            return self.send_pkt(payload, callback=callback)
+        self.tracker.queued(self._frame_symbols(len(payload)), callback)
+        nsamples = len(samples) // gr.sizeof_gr_complex
+        if self.burst is not None:
+            self.burst.queued(nsamples)
+        self._output(gr.message_from_string(samples), nsamples)
+
+    def precompute_ctl(self, payloads):
+        """
+        Modulate control frames ahead of time (--ctl-cache only)
+        """
+        if self.ctl is not None:
+            self.ctl.precompute(payloads)
+
+    def try_send(self, payload, callback=None):
+        """
+        Send a packet if there is room in the modulator's queue, without
+        blocking. Assumes the caller is the only thread sending.
+
+        @param callback: called with the time the frame left the modulator
+        @returns False if the queue was full (nothing was sent)
+        """
+        if self._msgq.full_p():
+            return False
+        self.send_pkt(payload, callback=callback)
+        return True
+
+    def queue_full(self):
+        return self._msgq.full_p()
+
+    def in_flight(self):
+        """
+        Number of frames sent that haven't left the modulator yet
+        """
+        return self.tracker.in_flight()
+
+    def send_pkts(self, payloads, eof=False):
+        """
+        Frames payloads in bulk (see ofdm_framing.py) and queues them for the
+        modulator. Blocks while the modulator's queue is full, like send_pkt.
+
+        @param payloads: iterable of payload strings, or a uint8 array with one
+                         payload per row (ofdm_framing.numbered_payloads)
+        @param eof: send the end of file message after them
+        @returns number of packets queued
+        """
+        n = 0
+        for pkt in ofdm_framing.frame_packets(payloads):
+            self._queued(self._frame_symbols(len(pkt) - ofdm_solver.FRAMING_BYTES))
+            self._msgq.insert_tail(gr.message_from_string(pkt))
+            n += 1
+        if eof:
+            if self._mod_q is not None:
+                self._mod_q.insert_tail(gr.message(1))
+            self._msgq.insert_tail(gr.message(1))
+        return n
         
     def add_options(normal, expert):
         """
@@ -81,8 +261,15 @@ class transmit_path(gr.hier_block2):
         normal.add_option("", "--tx-amplitude", type="eng_float", default=.8, metavar="AMPL",
                           help="set transmitter digital amplitude: 0 <= AMPL < 1.0 [default=%default]")
         normal.add_option("-v", "--verbose", action="store_true", default=False)
+        expert.add_option("", "--tx-queue-depth", type="int", default=4,
+                          help="frames the modulator queues before send_pkt blocks [default=%default]")
+        expert.add_option("", "--ctl-cache", action="store_true", default=False,
+                          help="send RTS/CTS/ACK from pre-modulated samples [default=%default]")
+        expert.add_option("", "--burst", action="store_true", default=False,
+                          help="tag each frame as a burst (tx_sob/tx_eob) for the USRP sink [default=%default]")
         expert.add_option("", "--log", action="store_true", default=False,
                           help="Log all parts of flow graph to file (CAUTION: lots of data)")
+        iq_recorder.add_options(normal, expert)
 
     # Make a static method to call before instantiation
     add_options = staticmethod(add_options)
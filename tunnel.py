@@ -48,6 +48,7 @@ import os
 # from current dir
 from transmit_path import transmit_path
 from receive_path import receive_path
+import ofdm_solver
 #import fusb_options
 
 #print os.getpid()
@@ -258,12 +259,13 @@ class cs_mac(object):
     def set_flow_graph(self, tb):
         self.tb = tb
 
-    def phy_rx_callback(self, ok, payload):
+    def phy_rx_callback(self, ok, payload, meta=None):
         """
         Invoked by thread associated with PHY to pass received packet up.
 
         @param ok: bool indicating whether payload CRC was OK
         @param payload: contents of the packet (string)
+        @param meta: rx_metadata of the packet (--rx-metadata), or None
         """
         if self.verbose:
             print "Rx: ok = %r  len(payload) = %4d" % (ok, len(payload))
@@ -322,6 +324,7 @@ def main():
     receive_path.add_options(parser, expert_grp)
     blks2.ofdm_mod.add_options(parser, expert_grp)
     blks2.ofdm_demod.add_options(parser, expert_grp)
+    ofdm_solver.add_options(parser, expert_grp)
 
     (options, args) = parser.parse_args ()
     if len(args) != 0:
@@ -333,6 +336,9 @@ def main():
         parser.print_help(sys.stderr)
         sys.exit(1)
 
+    # pick the OFDM parameters and rate for --target-bitrate
+    ofdm_solver.apply_options(options, "samp_rate")
+
     # open the TUN/TAP interface
     (tun_fd, tun_ifname) = open_tun_interface(options.tun_device_filename)
 
@@ -381,6 +387,8 @@ def main():
 
     tb.start()    # Start executing the flow graph (runs in separate threads)
 
+    tb.rxpath.calibrate_noise_floor(options.calibrate_time)    # --auto-threshold
+
     mac.main_loop()    # don't expect this to return...
 
     tb.stop()     # but if it does, tell flow graph to stop.
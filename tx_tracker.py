@@ -0,0 +1,68 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Transmit Tracker
+#
+# FuNLab
+# University of Washington
+#
+# Tells transmit_path when each frame has left the modulator.
+#
+# Every frame blks2.ofdm_mod sends is a whole number of OFDM symbols (one
+# preamble symbol plus the data symbols, see ofdm_solver.frame_symbols), so
+# transmit_path taps one sample per symbol off the modulator's output and
+# counts them. The tracker keeps the symbol index each queued frame ends at;
+# when the count passes it, the frame is done and its callback runs.
+#
+# The time passed to the callbacks is when the last symbol left the
+# modulator. The samples still buffered between there and the antenna (at
+# most a few blocks' worth) are not included.
+# /////////////////////////////////////////////////////////////////////////////
+
+import collections
+import threading
+
+
+class tx_tracker(object):
+    """
+    Matches the symbols coming out of the modulator with the frames queued
+    """
+    def __init__(self):
+        self._pending = collections.deque()  # (symbol index the frame ends at, callback)
+        self._queued = 0                     # symbols in all the frames queued so far
+        self._sent = 0                       # symbols that have left the modulator
+        self._lock = threading.Lock()
+
+    def queued(self, nsymbols, callback=None):
+        """
+        Register a frame; call this before handing the frame to the modulator
+
+        @param nsymbols: OFDM symbols in the frame
+        @param callback: called with the time the frame was done, or None
+        """
+        self._lock.acquire()
+        self._queued += nsymbols
+        self._pending.append((self._queued, callback))
+        self._lock.release()
+
+    def sent(self, nsymbols, now):
+        """
+        Count symbols that left the modulator and run the callbacks of the
+        frames they completed
+
+        @returns number of frames completed
+        """
+        done = []
+        self._lock.acquire()
+        self._sent += nsymbols
+        while len(self._pending) > 0 and self._pending[0][0] <= self._sent:
+            done.append(self._pending.popleft()[1])
+        self._lock.release()
+        for callback in done:
+            if callback is not None:
+                callback(now)
+        return len(done)
+
+    def in_flight(self):
+        """
+        Number of frames queued that haven't left the modulator yet
+        """
+        return len(self._pending)
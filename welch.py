@@ -0,0 +1,112 @@
+# /////////////////////////////////////////////////////////////////////////////
+#                           Welch PSD Statistics
+#
+# FuNLab
+# University of Washington
+#
+# How much an overlapped, averaged (Welch) power spectrum reduces the per-bin
+# variance of the sense path's estimate, and how long a dwell that takes.
+#
+# For Gaussian noise the periodograms of two windowed frames that start d
+# samples apart have a correlation of rho(d)^2, with
+#
+#   rho(d) = sum(w[n] w[n+d]) / sum(w[n]^2)
+#
+# so overlapping frames are not independent and each one is worth less than a
+# fresh frame. The functions below give the per-bin variance relative to a
+# single periodogram (1.0 = no improvement).
+#
+# Only math is used here so the numbers can be checked without GNU Radio.
+# /////////////////////////////////////////////////////////////////////////////
+
+import math
+
+
+def blackmanharris(ntaps):
+    """
+    4-term Blackman-Harris window, same as gnuradio.window.blackmanharris
+    """
+    a0, a1, a2, a3 = 0.35875, 0.48829, 0.14128, 0.01168
+    M = ntaps - 1
+    return [a0 - a1*math.cos(2*math.pi*n/M) + a2*math.cos(4*math.pi*n/M)
+            - a3*math.cos(6*math.pi*n/M) for n in range(ntaps)]
+
+def overlap_correlation(window, lag):
+    """
+    Return rho(lag)^2, the correlation between the periodograms of two frames
+    lag samples apart.
+    """
+    n = len(window)
+    if lag >= n:
+        return 0.0
+    power = sum([w*w for w in window])
+    cross = sum([window[i]*window[i+lag] for i in range(n - lag)])
+    return (cross / power)**2
+
+def branches(overlap):
+    """
+    Return the number of interleaved FFT branches (frames per fft_size
+    samples) used for a given overlap fraction.
+    """
+    if overlap < 0 or overlap >= 1:
+        raise ValueError, "overlap must be in [0, 1)"
+    return max(1, int(round(1.0 / (1.0 - overlap))))
+
+def iir_alpha(averages):
+    """
+    Return the single pole IIR constant whose variance matches a block
+    average of averages frames.
+    """
+    return 2.0 / (averages + 1)
+
+def block_variance_ratio(window, hop, nframes):
+    """
+    Per-bin variance of a plain average of nframes frames spaced hop samples
+    apart, relative to a single periodogram.
+    """
+    total = 1.0
+    lag = 1
+    while lag < nframes and lag*hop < len(window):
+        total += 2 * (1.0 - float(lag)/nframes) * overlap_correlation(window, lag*hop)
+        lag += 1
+    return total / nframes
+
+def iir_variance_ratio(window, hop, alpha):
+    """
+    Per-bin variance of the single pole IIR average (constant alpha) of frames
+    spaced hop samples apart, relative to a single periodogram.
+    """
+    total = 1.0
+    lag = 1
+    while lag*hop < len(window):
+        total += 2 * (1.0 - alpha)**lag * overlap_correlation(window, lag*hop)
+        lag += 1
+    return alpha / (2.0 - alpha) * total
+
+def dwell_for_ratio(window, hop, target_ratio, samp_rate, max_frames=100000):
+    """
+    Return (seconds, frames) of the shortest block Welch average whose per-bin
+    variance ratio is at most target_ratio.
+    """
+    nframes = 1
+    while block_variance_ratio(window, hop, nframes) > target_ratio:
+        nframes += 1
+        if nframes > max_frames:
+            raise ValueError, "target variance ratio can't be reached"
+    return (((nframes - 1)*hop + len(window)) / float(samp_rate), nframes)
+
+def summary(window, overlap, averages, samp_rate):
+    """
+    Return a one line description of the variance reduction of a
+    configuration.
+    """
+    k = branches(overlap)
+    hop = int(round(len(window) / float(k)))
+    if averages > 1:
+        ratio = iir_variance_ratio(window, hop, iir_alpha(averages))
+    else:
+        ratio = 1.0
+    frame_time = hop / float(samp_rate)
+    return ("overlap %.2f (%d branches), %d averages: variance x%.3f "
+            "(%.1f equivalent frames), one estimate per %.3g ms" %
+            (1.0 - float(hop)/len(window), k, averages, ratio, 1.0/ratio, frame_time*1e3))